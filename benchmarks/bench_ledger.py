@@ -0,0 +1,71 @@
+"""
+Lookup speed of the SQLite invoice ledger as it grows.
+
+Usage (from the repository root):
+    python benchmarks/bench_ledger.py
+    python benchmarks/bench_ledger.py --sizes 1000 10000 100000 --lines 5
+
+For every size a throw-away ledger is filled with that many invoices spread
+over 500 recipients and three years, then the typical queries are timed:
+one invoice by number, one recipient's invoices for a year, and the total
+billed to that recipient. With the indexes all of them stay in the
+sub-millisecond range independent of the ledger size.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line  # noqa: E402
+from invoicing.ledger import Ledger  # noqa: E402
+
+RECIPIENTS = 500
+
+
+def fill(ledger, size, lines_per_invoice, rng):
+    first_day = date(2023, 1, 1)
+    ledger.record_many(dict(
+        invoice_number=number,
+        customer_name=f"Member {rng.randrange(RECIPIENTS)}",
+        invoice_date=first_day + timedelta(days=rng.randrange(3 * 365)),
+        lines=[make_line(f"Item {i}", rng.randint(1, 5), rng.randint(1, 5000) / 100)
+               for i in range(lines_per_invoice)],
+    ) for number in range(1, size + 1))
+
+
+def time_ms(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time ledger lookups at growing sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lines", type=int, default=3, help="lines per invoice")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    print(f"{'invoices':>9} {'fill s':>8} {'by number ms':>13} {'member year ms':>15} {'total billed ms':>16}")
+    for size in args.sizes:
+        rng = random.Random(size)
+        with tempfile.TemporaryDirectory() as directory, Ledger(os.path.join(directory, 'ledger.sqlite3')) as ledger:
+            start = time.perf_counter()
+            fill(ledger, size, args.lines, rng)
+            filled = time.perf_counter() - start
+            by_number = time_ms(lambda: ledger.get_invoice(rng.randint(1, size)), args.repeat)
+            member_year = time_ms(lambda: ledger.invoices_for(f"Member {rng.randrange(RECIPIENTS)}",
+                                                              "2025-01-01", "2026-01-01"), args.repeat)
+            total = time_ms(lambda: ledger.total_billed(f"Member {rng.randrange(RECIPIENTS)}",
+                                                        "2025-01-01", "2026-01-01"), args.repeat)
+        print(f"{size:9d} {filled:8.2f} {by_number:13.3f} {member_year:15.3f} {total:16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Memory and time of the LineStore against the old list of line dicts.
+
+Usage (from the repository root):
+    python benchmarks/bench_lines.py
+    python benchmarks/bench_lines.py --lines 1000 10000 100000
+
+For each size the lines are added one by one, added in bulk, totalled and
+written out as rows (what the PDF and CSV writers consume). Memory is the
+tracemalloc peak while building the container in bulk.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line  # noqa: E402
+from invoicing.lines import LineStore, line_rows  # noqa: E402
+
+
+def measure(build):
+    """(result, ms, peak MB); timed separately since tracemalloc slows allocation down."""
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    lines = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return lines, elapsed * 1000, peak / 1e6
+
+
+def time_ms(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare LineStore with a list of line dicts.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args(argv)
+
+    print(f"{'lines':>7} {'container':10} {'append ms':>10} {'bulk ms':>8} {'MB':>7} {'total ms':>9} {'rows ms':>8}")
+    for size in args.lines:
+        items = [(f"Participant {i}", i % 4, 7.5 + i % 10) for i in range(size)]
+
+        def append_dicts():
+            lines = []
+            for item in items:
+                lines.append(make_line(*item))
+            return lines
+
+        def append_store():
+            lines = LineStore()
+            for item in items:
+                lines.append(*item)
+            return lines
+
+        for label, one_by_one, bulk, total in (
+            ("dicts", append_dicts, lambda: [make_line(*item) for item in items],
+             lambda lines: sum(line['amount'] for line in lines)),
+            ("LineStore", append_store, lambda: LineStore(items), lambda lines: lines.total),
+        ):
+            _, append_ms, _ = measure(one_by_one)
+            lines, bulk_ms, megabytes = measure(bulk)
+            total_ms = time_ms(lambda: total(lines))
+            rows_ms = time_ms(lambda: list(line_rows(lines)))
+            print(f"{size:7d} {label:10} {append_ms:10.1f} {bulk_ms:8.1f} {megabytes:7.2f} {total_ms:9.3f} {rows_ms:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
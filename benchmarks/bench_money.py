@@ -0,0 +1,69 @@
+"""
+Speed and exactness of invoice totals: float loop against integer cents.
+
+Usage (from the repository root):
+    python benchmarks/bench_money.py
+    python benchmarks/bench_money.py --lines 10000 100000 1000000
+
+"float loop" is what the renderer used to do (total += line['amount'] over
+float amounts). "cents sum" sums the array('q') amount column of a
+LineStore, "numpy cents" the same column as an int64 array, as the importer
+produces it. The drift column is how far the float total is from the exact
+one, in cents.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.money import line_amount_cents, to_cents  # noqa: E402
+
+
+def time_ms(function, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare float and integer-cent invoice totals.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args(argv)
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    print(f"{'lines':>8} {'float loop ms':>14} {'cents sum ms':>13} {'numpy cents ms':>15} {'float drift (cents)':>20}")
+    for size in args.lines:
+        rng = random.Random(size)
+        items = [(rng.randint(1, 4), rng.choice([0.1, 0.07, 7.35, 12.45, 19.99])) for _ in range(size)]
+        float_lines = [{'amount': float(quantity) * float(price)} for quantity, price in items]
+        cents = array('q', (line_amount_cents(quantity, to_cents(price)) for quantity, price in items))
+
+        def float_loop():
+            total = 0
+            for line in float_lines:
+                total += line['amount']
+            return total
+
+        float_total, float_ms = time_ms(float_loop)
+        exact_cents, cents_ms = time_ms(lambda: sum(cents))
+        numpy_ms = float('nan')
+        if np is not None:
+            column = np.frombuffer(cents, dtype=np.int64)
+            _, numpy_ms = time_ms(lambda: int(column.sum()))
+        drift = float_total * 100 - exact_cents
+        print(f"{size:8d} {float_ms:14.2f} {cents_ms:13.2f} {numpy_ms:15.3f} {drift:20.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Rendering time and memory of long, multi-page invoices.
+
+Usage (from the repository root):
+    python benchmarks/bench_pagination.py
+    python benchmarks/bench_pagination.py --lines 10 100 1000 10000 --repeat 3
+
+Each invoice is rendered into memory from a generator, so the line items
+themselves never exist as a list, and so the render cache (which only
+takes lists and LineStores) never serves a repeat. For every size the
+script prints the page count, the best wall time, the time per line (flat
+when rendering scales linearly) and the tracemalloc peak. The peak grows only with the
+finished document that fpdf keeps in memory until output, not with state
+held by the table renderer.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line, render_pdf  # noqa: E402
+
+
+def lines(count):
+    for i in range(count):
+        yield make_line(f"Participant {i}", 1 + i % 3, 7.5 + i % 10)
+
+
+def render(count):
+    output = BytesIO()
+    render_pdf(output, lines(count), "Benchmark Member", 1, "", "en", 14, "Benchmark",
+               datetime(2025, 1, 1))
+    return output.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time paginated invoice rendering at growing sizes.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    render(1)  # compile the template and load fonts and logo outside the measurements
+    print(f"{'lines':>7} {'pages':>6} {'best s':>8} {'ms/line':>8} {'peak MB':>8}")
+    for count in args.lines:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pdf = render(count)
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        render(count)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        pages = len(re.findall(rb'/Type\s*/Page\b(?!s)', pdf))
+        print(f"{count:7d} {pages:6d} {best:8.3f} {best * 1000 / count:8.3f} {peak / 1e6:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Overhead of the profiling hooks.
+
+Usage (from the repository root):
+    python benchmarks/bench_profiling.py
+    python benchmarks/bench_profiling.py --lines 10 100 --repeat 20
+
+Prints the cost of one stage() marker outside a profiled invoice (what
+every render pays when profiling is off), then the best render_pdf time
+into memory with profiling off, with stage timers only and with the
+cProfile and tracemalloc captures.
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import render_pdf  # noqa: E402
+from invoicing.lines import LineStore  # noqa: E402
+from invoicing.profiling import Profiler, stage  # noqa: E402
+from invoicing.render_cache import configure_render_cache  # noqa: E402
+
+
+def best_render_ms(lines, profiler, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with profiler.invoice(len(lines)):
+            render_pdf(BytesIO(), lines, "Benchmark Customer", 1)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the overhead of invoice profiling.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+    # The same LineStore is rendered --repeat times; all but the first would be cache hits
+    configure_render_cache(memory_bytes=0, disk_dir=None)
+
+    def disabled_marker():
+        with stage('bench'):
+            pass
+
+    calls = 1_000_000
+    print(f"stage() when not profiling: {timeit(disabled_marker, number=calls) / calls * 1e9:.0f} ns per marker")
+
+    profilers = (
+        ("off", Profiler(enabled=False)),
+        ("timers", Profiler()),
+        ("cprofile", Profiler(cprofile=True)),
+        ("tracemalloc", Profiler(tracemalloc=True)),
+    )
+    render_pdf(BytesIO(), LineStore([("Warm-up", 1, 1.0)]), "Benchmark Customer", 1)
+    print(f"{'lines':>6} " + " ".join(f"{label + ' ms':>15}" for label, _ in profilers))
+    for size in args.lines:
+        lines = LineStore((f"Participant {i}", 1 + i % 3, 7.5 + i % 10) for i in range(size))
+        timings = [best_render_ms(lines, profiler, args.repeat) for _, profiler in profilers]
+        print(f"{size:6d} " + " ".join(f"{ms:15.2f}" for ms in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Reconciliation speed and accuracy of invoicing.reconcile on a synthetic year.
+
+Usage (from the repository root):
+    python benchmarks/bench_reconcile.py
+    python benchmarks/bench_reconcile.py --invoices 20000 --formats camt mt940
+
+Fills a temporary ledger with --invoices invoices (900 recipients, a
+handful of distinct amounts, so amounts alone rarely identify an invoice)
+and writes a year of incoming payments for them as a CAMT.053, an MT940 and
+a CSV statement, plus some unrelated transfers and outgoing payments.
+The payments are a mix of:
+    the invoice number in the text, some with O for 0 or a missing keyword
+    two invoices paid in one transfer
+    partial payments
+    no number, only the recipient's name (as the account holder spells it)
+    payments nobody can place
+Each format is reconciled against a fresh index and the time, the
+transactions per second and the share of payments put on the invoice they
+were made for are printed. Accuracy below 99% of the placeable payments,
+or any payment put on the wrong invoice, makes the exit status 1.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line  # noqa: E402
+from invoicing.ledger import Ledger  # noqa: E402
+from invoicing.reconcile import InvoiceIndex, read_statement, reconcile  # noqa: E402
+
+PRICES = (25.0, 32.5, 45.0, 60.0, 75.0)
+START = date(2025, 1, 1)
+
+
+def recipient(number):
+    return f"Member {number % 900} Jansen"
+
+
+def price(number):
+    return PRICES[number % len(PRICES)]
+
+
+def fill_ledger(path, count):
+    with Ledger(path) as ledger:
+        ledger.record_many(dict(
+            invoice_number=number, customer_name=recipient(number),
+            invoice_date=START + timedelta(days=number * 365 // count),
+            lines=[make_line("Ice time", 1, price(number))],
+        ) for number in range(1, count + 1))
+
+
+def placed_right(match, numbers):
+    """
+    True when match put the payment on the invoices it was made for. A
+    payment by name alone settles the oldest open invoice of that recipient
+    and amount, which is just as right when the recipient has several.
+    """
+    if match.invoices == numbers:
+        return bool(numbers)
+    return (match.method in ('name', 'amount') and len(match.invoices) == len(numbers) == 1
+            and recipient(match.invoices[0]) == recipient(numbers[0]) and price(match.invoices[0]) == price(numbers[0]))
+
+
+def synthetic_payments(count, seed=1):
+    """(booked, cents, payer, text, expected invoice numbers) tuples, in booking order."""
+    rng = random.Random(seed)
+    payments = []
+    paid_along = set()
+    for number in range(1, count + 1):
+        if number in paid_along:
+            continue
+        cents = int(price(number) * 100)
+        booked = START + timedelta(days=number * 365 // count + rng.randint(3, 20))
+        payer = recipient(number)
+        kind = rng.random()
+        if kind < 0.6:
+            payments.append((booked, cents, payer, f"Factuur {number} contributie", (number,)))
+        elif kind < 0.7:
+            payments.append((booked, cents, payer.upper(), f"fact.nr. {str(number).replace('0', 'O')}", (number,)))
+        elif kind < 0.75:
+            payments.append((booked, cents, payer, f"{number} ijstijd", (number,)))
+        elif kind < 0.8 and number + 900 <= count:
+            paid_along.add(number + 900)
+            total = cents + int(price(number + 900) * 100)
+            payments.append((booked, total, payer, f"Facturen {number} en {number + 900}", (number, number + 900)))
+        elif kind < 0.85:
+            payments.append((booked, cents // 2, payer, f"Invoice {number} first half", (number,)))
+        elif kind < 0.9:
+            first, _, rest = payer.partition(' ')
+            payments.append((booked, cents, f"{rest}, {first}", "contributie", (number,)))
+        elif kind < 0.95:
+            payments.append((booked, cents, payer.replace("Jansen", "Janssen"), "contributie", (number,)))
+        else:
+            payments.append((booked, cents + 123, f"Somebody {number}", "donation", ()))
+    payments.sort(key=lambda payment: payment[0])
+    return payments
+
+
+def write_camt053(path, payments):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>\n')
+        for i, (booked, cents, payer, text, _) in enumerate(payments):
+            f.write(f'<Ntry><NtryRef>{i}</NtryRef><Amt Ccy="EUR">{cents / 100:.2f}</Amt>'
+                    f'<CdtDbtInd>CRDT</CdtDbtInd><Sts>BOOK</Sts><BookgDt><Dt>{booked}</Dt></BookgDt>'
+                    f'<AcctSvcrRef>CAMT{i:08d}</AcctSvcrRef><NtryDtls><TxDtls><RltdPties><Dbtr><Nm>{escape(payer)}</Nm>'
+                    f'</Dbtr><DbtrAcct><Id><IBAN>NL{i % 97:02d}BANK0{i:09d}</IBAN></Id></DbtrAcct></RltdPties>'
+                    f'<RmtInf><Ustrd>{escape(text)}</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>\n')
+            if i % 10 == 0:
+                f.write(f'<Ntry><Amt Ccy="EUR">{12.5 + i % 40:.2f}</Amt><CdtDbtInd>DBIT</CdtDbtInd>'
+                        f'<BookgDt><Dt>{booked}</Dt></BookgDt><AcctSvcrRef>OUT{i:08d}</AcctSvcrRef></Ntry>\n')
+        f.write('</Stmt></BkToCstmrStmt></Document>\n')
+
+
+def write_mt940(path, payments):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("ABNANL2A\n940\nABNANL2A\n:20:ABN AMRO BANK NV\n:25:123456789\n:28:1/1\n:60F:C250101EUR0,00\n")
+        for i, (booked, cents, payer, text, _) in enumerate(payments):
+            amount = f"{cents // 100},{cents % 100:02d}"
+            f.write(f":61:{booked:%y%m%d}{booked:%m%d}C{amount}N654NONREF//MT{i:08d}\n")
+            details = (f"/TRTP/SEPA OVERBOEKING/IBAN/NL{i % 97:02d}BANK0{i:09d}/BIC/BANKNL2A"
+                       f"/NAME/{payer}/REMI/{text}/EREF/NOTPROVIDED")
+            f.write(":86:" + "\n".join(details[j:j + 65] for j in range(0, len(details), 65)) + "\n")
+            if i % 10 == 0:
+                f.write(f":61:{booked:%y%m%d}{booked:%m%d}D12,50N422NONREF\n"
+                        f":86:/TRTP/INCASSO/NAME/Ice rink/REMI/rent\n")
+        f.write(":62F:C251231EUR0,00\n-\n")
+
+
+def write_csv(path, payments):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write("Datum;Naam tegenpartij;Tegenrekening;Af Bij;Bedrag;Omschrijving\n")
+        for i, (booked, cents, payer, text, _) in enumerate(payments):
+            f.write(f"{booked:%d-%m-%Y};{payer};NL{i % 97:02d}BANK0{i:09d};Bij;"
+                    f"{cents // 100},{cents % 100:02d};{text}\n")
+            if i % 10 == 0:
+                f.write(f"{booked:%d-%m-%Y};Ice rink;NL00RINK0000000001;Af;12,50;rent\n")
+
+
+WRITERS = {'camt': ('statement.xml', write_camt053), 'mt940': ('statement.sta', write_mt940),
+           'csv': ('statement.csv', write_csv)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and check bank statement reconciliation.")
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--formats", nargs="+", choices=sorted(WRITERS), default=['camt', 'mt940', 'csv'])
+    args = parser.parse_args(argv)
+
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        ledger_path = os.path.join(workdir, "ledger.sqlite3")
+        fill_ledger(ledger_path, args.invoices)
+        payments = synthetic_payments(args.invoices)
+        placeable = sum(1 for *_, numbers in payments if numbers)
+        print(f"{args.invoices} invoices, {len(payments)} payments ({placeable} placeable)")
+
+        for name in args.formats:
+            filename, writer = WRITERS[name]
+            path = os.path.join(workdir, filename)
+            writer(path, payments)
+            with Ledger(ledger_path) as ledger:
+                index = InvoiceIndex.from_ledger(ledger)
+            start = time.perf_counter()
+            matches = list(reconcile(read_statement(path), index))
+            seconds = time.perf_counter() - start
+            right = wrong = 0
+            # Every format lists the incoming payments in the order they were written
+            for match, (*_, numbers) in zip(matches, payments):
+                if placed_right(match, numbers):
+                    right += 1
+                elif match.invoices:
+                    wrong += 1
+            print(f"{name:>6}: {len(matches):6d} transactions in {seconds:6.2f}s "
+                  f"({len(matches) / seconds:8.0f}/s, {os.path.getsize(path) / 2 ** 20:5.1f} MB), "
+                  f"{right / placeable:7.2%} placed right, {wrong} wrong")
+            if right < 0.99 * placeable or wrong:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
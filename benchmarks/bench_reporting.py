@@ -0,0 +1,97 @@
+"""
+Load and report times of invoicing.reporting on a synthetic ledger.
+
+Usage (from the repository root):
+    python benchmarks/bench_reporting.py
+    python benchmarks/bench_reporting.py --invoices 10000 --lines 8 --repeat 5
+
+Fills a temporary ledger with --invoices invoices of --lines lines each,
+spread over two years and 50 descriptions, and prints the best time of:
+    load (no cache)     load_history(cache=False), the whole ledger
+    load (first)        the first load, which also writes the Parquet cache
+    load (cached)       a load with nothing new
+    load (+10 new)      a load after 10 more invoices were recorded
+    revenue_by_month, outstanding and totals_by_description over everything
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line  # noqa: E402
+from invoicing.ledger import Ledger  # noqa: E402
+from invoicing.reporting import load_history, outstanding, revenue_by_month, totals_by_description  # noqa: E402
+
+
+def synthetic_invoices(first, count, lines_per_invoice):
+    start = date.today() - timedelta(days=730)
+    for number in range(first, first + count):
+        invoice_date = start + timedelta(days=number * 730 // max(count, 1) % 730)
+        yield dict(
+            invoice_number=number, customer_name=f"Member {number % 900}", invoice_date=invoice_date,
+            due_date=invoice_date + timedelta(days=14),
+            lines=[make_line(f"Item {(number + i) % 50}", 1 + i % 3, 7.5 + (number + i) % 20)
+                   for i in range(lines_per_invoice)],
+        )
+
+
+def best_ms(function, repeat, setup=None):
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the invoice reports.")
+    parser.add_argument("--invoices", type=int, default=6250)
+    parser.add_argument("--lines", type=int, default=8, help="Lines per invoice (default: 8)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ledger_path = os.path.join(workdir, "ledger.sqlite3")
+        with Ledger(ledger_path) as ledger:
+            ledger.record_many(synthetic_invoices(1, args.invoices, args.lines))
+        print(f"{args.invoices} invoices, {args.invoices * args.lines} lines")
+
+        cache_dir = os.path.join(workdir, "report_cache")
+
+        def drop_cache():
+            for name in ("invoices.parquet", "lines.parquet"):
+                if os.path.exists(os.path.join(cache_dir, name)):
+                    os.remove(os.path.join(cache_dir, name))
+
+        next_number = [args.invoices + 1]
+
+        def record_more():
+            with Ledger(ledger_path) as ledger:
+                ledger.record_many(synthetic_invoices(next_number[0], 10, args.lines))
+            next_number[0] += 10
+
+        timings = [
+            ("load (no cache)", best_ms(lambda: load_history(ledger_path, cache=False), args.repeat)),
+            ("load (first)", best_ms(lambda: load_history(ledger_path), args.repeat, drop_cache)),
+            ("load (cached)", best_ms(lambda: load_history(ledger_path), args.repeat)),
+            ("load (+10 new)", best_ms(lambda: load_history(ledger_path), args.repeat, record_more)),
+        ]
+        history = load_history(ledger_path)
+        timings += [
+            ("revenue_by_month", best_ms(lambda: revenue_by_month(history.invoices), args.repeat)),
+            ("outstanding", best_ms(lambda: outstanding(history.invoices), args.repeat)),
+            ("totals_by_description", best_ms(lambda: totals_by_description(history.lines), args.repeat)),
+        ]
+    for label, ms in timings:
+        print(f"{label:22} {ms:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
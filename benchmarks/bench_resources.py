@@ -0,0 +1,80 @@
+"""
+Per-invoice cost of font registration and logo embedding, with and without
+the invoicing.resources cache.
+
+Usage (from the repository root):
+    python benchmarks/bench_resources.py
+    python benchmarks/bench_resources.py --runs 100 --font /path/regular.ttf --bold-font /path/bold.ttf
+
+Each run builds a one-page document with both fonts, a line of text and
+the logo, and writes it to memory, so the timings include pdf.output().
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fpdf import FPDF  # noqa: E402
+
+from invoicing import resources  # noqa: E402
+
+
+def render_uncached(font, bold_font, logo):
+    pdf = FPDF()
+    pdf.add_font('Tahoma', '', font)
+    pdf.add_font('Tahoma', 'B', bold_font)
+    pdf.add_page('P', 'A4')
+    pdf.set_font('Tahoma', 'B', 16)
+    pdf.cell(190, 10, 'INVOICE', 0, 1, 'C')
+    pdf.image(logo, x=90, y=250, w=30)
+    pdf.output(BytesIO())
+
+
+def render_cached(font, bold_font, logo):
+    pdf = FPDF()
+    resources.add_font(pdf, 'Tahoma', '', font)
+    resources.add_font(pdf, 'Tahoma', 'B', bold_font)
+    pdf.add_page('P', 'A4')
+    pdf.set_font('Tahoma', 'B', 16)
+    pdf.cell(190, 10, 'INVOICE', 0, 1, 'C')
+    resources.image(pdf, logo, x=90, y=250, w=30)
+    pdf.output(BytesIO())
+
+
+def time_per_call(func, runs, *args):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(*args)
+    return (time.perf_counter() - start) / runs
+
+
+def main(argv=None):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--font", default=r'C:\Windows\Fonts\tahoma.ttf')
+    parser.add_argument("--bold-font", default=r'C:\Windows\Fonts\tahomabd.ttf')
+    parser.add_argument("--logo", default=os.path.join(root, 'elslogo.png'))
+    args = parser.parse_args(argv)
+
+    fonts = (args.font, args.bold_font, args.logo)
+    resources.reset_resource_cache()
+    start = time.perf_counter()
+    render_cached(*fonts)  # fills the cache
+    warmup = time.perf_counter() - start
+
+    uncached = time_per_call(render_uncached, args.runs, *fonts)
+    cached = time_per_call(render_cached, args.runs, *fonts)
+
+    print(f"runs per variant:   {args.runs}")
+    print(f"first cached render: {warmup * 1000:8.1f} ms (loads the cache)")
+    print(f"uncached:            {uncached * 1000:8.1f} ms/invoice")
+    print(f"cached:              {cached * 1000:8.1f} ms/invoice")
+    print(f"saving:              {(uncached - cached) * 1000:8.1f} ms/invoice ({uncached / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Import cost of the desktop and web front ends, measured with python -X importtime.
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10
+
+Every scenario runs in a fresh interpreter. The reported time is the
+median over all runs of the cumulative import time of its top-level
+imports. The script also lists which heavy libraries each scenario pulls
+in. "before" scenarios reproduce the imports the front ends used to do at
+module load (pandas and fpdf up front), so the difference is what lazy
+loading saves on every start.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'fpdf', 'PIL', 'fontTools')
+
+SCENARIOS = [
+    ("desktop before (dearpygui + pandas + fpdf)", "import dearpygui.dearpygui, pandas, fpdf"),
+    ("desktop now (import main)", "import main"),
+    ("web before (streamlit + pandas + fpdf)", "import streamlit, pandas, fpdf"),
+    ("web now (streamlit + invoicing)", "import streamlit, invoicing"),
+]
+
+PROBE = (
+    "import sys\n"
+    "{code}\n"
+    "print(','.join(m for m in {heavy!r} if m in sys.modules))\n"
+)
+
+
+def import_time_ms(code):
+    """Run code in a fresh interpreter; return (top-level import ms, heavy modules loaded)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(code=code, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # top-level entries only; nested ones are included
+            total_us += int(cumulative)
+    loaded = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+    return total_us / 1000, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure front-end import time.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'scenario':48} {'median ms':>10}  heavy modules loaded")
+    for label, code in SCENARIOS:
+        try:
+            samples = [import_time_ms(code) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as e:
+            print(f"{label:48} {'n/a':>10}  ({e.stderr.strip().splitlines()[-1]})")
+            continue
+        median = statistics.median(ms for ms, _ in samples)
+        print(f"{label:48} {median:10.1f}  {samples[-1][1] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
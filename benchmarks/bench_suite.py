@@ -0,0 +1,281 @@
+"""
+Benchmark suite for the invoice generation hot paths, with a JSON baseline.
+
+Usage (from the repository root):
+    python benchmarks/bench_suite.py                          # run and compare with baseline.json
+    python benchmarks/bench_suite.py --save-baseline          # run and overwrite baseline.json
+    python benchmarks/bench_suite.py --json results.json      # also write this run's results
+    python benchmarks/bench_suite.py --only generate_pdf --repeat 20
+    python benchmarks/bench_suite.py --tolerance 0.25         # exit 1 if a case is >25% slower
+    python benchmarks/bench_suite.py --no-checks              # timings only
+
+Cases:
+    add_line              InvoiceManager.add_line, 1000 lines into an empty store
+    generate_pdf[N]       InvoiceManager.generate_pdf to a file, N = 1, 10, 100, 1000 lines
+    save_to_csv           InvoiceManager.save_to_csv, 1000 lines
+    import_frame          the clipboard path (resolve_columns + extend_store) for a 10000-row DataFrame
+    config_load           load_config
+    config_save           save_config
+    web_generate_pdf      webapp.generate_pdf into the session's artefact directory, 10 lines
+    cached_pdf[100]       render_pdf of an unchanged 100-line invoice, served by the render cache
+
+Apart from cached_pdf the render cache is off, so the generate_pdf cases
+measure rendering.
+
+The lines are synthetic, cycling through the items InvoiceManager.generate_test_data
+uses. Everything runs offline in a temporary folder, so the real config,
+ledger and invoices are never touched. web_generate_pdf imports webapp.py
+outside `streamlit run`, as check_reproducible.py does.
+
+The fonts come from core.font_setup: Tahoma when INVOICE_FONT_DIR (by
+default C:\\Windows\\Fonts) holds tahoma.ttf and tahomabd.ttf, otherwise the
+built-in Helvetica. Embedding Tahoma makes every PDF case several times
+slower, so the font is recorded with the results and a comparison against
+a baseline made with the other font is flagged.
+
+Each case runs once to warm up and is then timed --repeat times; the
+baseline keeps the minimum and the median in milliseconds. Timings are
+only comparable between runs on the same machine, so baseline.json
+records the platform and library versions it was made with.
+
+After the timings the suite runs the correctness checks in CHECKS, each in
+its own process; a failing check also makes the exit status 1:
+    check_reproducible.py     reproducible PDFs are byte-identical on every render path
+    check_render_cache.py     cached and streamed renders give the same PDF
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoicing import LineStore, extend_store, load_config, render_pdf, resolve_columns, save_config  # noqa: E402
+from invoicing.core import font_setup  # noqa: E402
+from invoicing.render_cache import configure_render_cache  # noqa: E402
+from main import InvoiceManager  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+CHECKS = ('check_reproducible.py', 'check_render_cache.py')
+
+# The items of InvoiceManager.generate_test_data
+TEST_ITEMS = [
+    ("Ice skating lesson (1 hour)", 1, 25.00),
+    ("Skate rental", 1, 7.50),
+    ("Training subscription (monthly)", 1, 45.00),
+    ("Competition entry fee", 1, 15.00),
+]
+
+PDF_SIZES = (1, 10, 100, 1000)
+
+
+def synthetic_items(count):
+    """count (description, quantity, price) items cycling through TEST_ITEMS."""
+    items = []
+    for i in range(count):
+        description, quantity, price = TEST_ITEMS[i % len(TEST_ITEMS)]
+        items.append((f"{description} #{i + 1}", quantity + i % 3, price))
+    return items
+
+
+def manager_with(count):
+    manager = InvoiceManager(autoload_config=False)
+    manager.invoice_lines.extend(synthetic_items(count))
+    return manager
+
+
+def web_app():
+    """webapp.py imported in bare mode; its session state is st.session_state."""
+    from streamlit import config, logger
+
+    # Imported outside `streamlit run`, which warns on every session state
+    # access; parse the config first, or its log level overrides this one
+    config.get_config_options()
+    logger.set_log_level('error')
+    import webapp
+
+    return webapp
+
+
+def web_session(count):
+    import streamlit as st
+
+    app = web_app()
+    st.session_state.invoice_lines = LineStore(synthetic_items(count))
+    return app
+
+
+def build_cases(workdir):
+    """{name: (setup, run)}; setup() makes fresh state, run(state) is the timed part."""
+    config_path = os.path.join(workdir, 'invoice_config.json')
+    pdf_path = os.path.join(workdir, 'invoice.pdf')
+    csv_path = os.path.join(workdir, 'invoice.csv')
+
+    def add_lines(state):
+        manager, items = state
+        for item in items:
+            manager.add_line(*item)
+
+    def import_frame(state):
+        import pandas as pd
+
+        store, rows = state
+        df = pd.DataFrame(rows, columns=['Description', 'Quantity', 'Price'])
+        extend_store(store, df, resolve_columns(df.columns, positional=True))
+
+    def cached_pdf(lines):
+        render_pdf(BytesIO(), lines, "Test Customer", 1, "", 'nl', 14, "Benchmark invoice", vat_rate=0)
+
+    cases = {
+        'add_line': (lambda: (InvoiceManager(autoload_config=False), synthetic_items(1000)), add_lines),
+    }
+    for size in PDF_SIZES:
+        cases[f'generate_pdf[{size}]'] = (
+            lambda size=size: manager_with(size),
+            lambda manager: manager.generate_pdf("Test Customer", "", pdf_path, 1),
+        )
+    cases.update({
+        'save_to_csv': (lambda: manager_with(1000),
+                        lambda manager: manager.save_to_csv("Test Customer", csv_path, 1)),
+        'import_frame': (lambda: (LineStore(), synthetic_items(10000)), import_frame),
+        'config_load': (lambda: None, lambda _: load_config(config_path)),
+        'config_save': (lambda: load_config(config_path), lambda config: save_config(config, config_path)),
+        'web_generate_pdf': (lambda: web_session(10), lambda app: app.generate_pdf("Test Customer", "")),
+        'cached_pdf[100]': (lambda: LineStore(synthetic_items(100)), cached_pdf),
+    })
+    return cases
+
+
+def time_case(name, setup, run, repeat):
+    """Times in ms of repeat runs, each on fresh state, after one warm-up run."""
+    if name.startswith('cached_'):
+        configure_render_cache(disk_dir=None)
+    else:
+        configure_render_cache(memory_bytes=0, disk_dir=None)
+    run(setup())
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def environment():
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except Exception:
+            return None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(), 'platform': platform.platform(),
+        'machine': platform.machine(), 'cpus': os.cpu_count(), 'commit': commit,
+        'fpdf': version('fpdf'), 'pandas': version('pandas'), 'numpy': version('numpy'),
+        'font': font_setup()[0], 'currency': font_setup()[2],
+    }
+
+
+def run_checks():
+    """Run every script in CHECKS; returns the names of those that failed."""
+    failed = []
+    for name in CHECKS:
+        result = subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', name)],
+                                capture_output=True, text=True)
+        print(f"{name:26} {'ok' if result.returncode == 0 else 'FAILED'}")
+        if result.returncode != 0:
+            print(result.stdout + result.stderr)
+            failed.append(name)
+    return failed
+
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline; return the names that regressed beyond tolerance."""
+    regressions = []
+    print(f"{'case':22} {'min ms':>10} {'median ms':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:22} {result['min_ms']:10.2f} {result['median_ms']:10.2f} {'-':>10} {'new':>8}")
+            continue
+        change = result['min_ms'] / base['min_ms'] - 1 if base['min_ms'] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  SLOWER"
+        print(f"{name:22} {result['min_ms']:10.2f} {result['median_ms']:10.2f} "
+              f"{base['min_ms']:10.2f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the invoice generation hot paths.")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per case (default: 10)")
+    parser.add_argument("--only", nargs="+", default=[], help="Only run cases whose name starts with one of these")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--json", help="Also write this run's results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown of the minimum time against the baseline (default: 0.2)")
+    parser.add_argument("--no-checks", action="store_true", help="Skip the correctness checks in CHECKS")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # The web app reads and writes its config, ledger and artefacts relative to here
+        os.environ['INVOICE_ARTEFACT_DIR'] = os.path.join(workdir, 'artefacts')
+        os.chdir(workdir)
+        try:
+            results = {}
+            for name, (setup, run) in build_cases(workdir).items():
+                if args.only and not name.startswith(tuple(args.only)):
+                    continue
+                times = time_case(name, setup, run, args.repeat)
+                results[name] = {'min_ms': round(min(times), 3), 'median_ms': round(statistics.median(times), 3),
+                                 'repeat': args.repeat}
+        finally:
+            os.chdir(ROOT)
+
+    report = {'environment': environment(), 'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved['results']
+        font = saved['environment'].get('font')
+        if font != report['environment']['font']:
+            print(f"The baseline was rendered with {font or 'an unrecorded font'}, this run with "
+                  f"{report['environment']['font']}; the PDF cases are not comparable")
+    regressions = compare(results, baseline, args.tolerance)
+    failed = [] if args.no_checks else run_checks()
+
+    status = 1 if failed else 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
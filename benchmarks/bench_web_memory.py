@@ -0,0 +1,94 @@
+"""
+Per-session memory of the web app's PDF downloads.
+
+Usage (from the repository root):
+    python benchmarks/bench_web_memory.py
+    python benchmarks/bench_web_memory.py --sessions 50
+
+Runs webapp.py in --sessions Streamlit test sessions (streamlit.testing's
+AppTest), each of which clicks "Generate Test PDF". It then prints:
+    the pickled size of each session's state, and its largest entry
+    the PDFs on disk under the artefact directory
+After that, the store sweeps with a max_age of 0, as it would an hour after
+the sessions went away, and the directory must be empty. A session state
+that holds a PDF-sized entry, or a sweep that leaves files behind, makes the
+exit status 1. Runs in a throw-away working and artefact directory.
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoicing.artefacts import ArtefactStore  # noqa: E402
+
+# Session entries this large can only be a copy of a document
+DOCUMENT_BYTES = 16 * 1024
+
+
+def state_sizes(app):
+    """{key: pickled size} of the session state entries the script set."""
+    sizes = {}
+    for key, value in app.session_state._state.filtered_state.items():
+        try:
+            sizes[key] = len(pickle.dumps(value))
+        except Exception:
+            sizes[key] = 0  # locks and other unpicklables; none of them hold documents
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure what the web app keeps per session for PDF downloads.")
+    parser.add_argument("--sessions", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    from streamlit.testing.v1 import AppTest
+
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        artefact_dir = os.path.join(workdir, "artefacts")
+        os.environ['INVOICE_ARTEFACT_DIR'] = artefact_dir
+        os.chdir(workdir)
+        try:
+            largest = (0, "")
+            totals = []
+            start = time.perf_counter()
+            for _ in range(args.sessions):
+                app = AppTest.from_file(os.path.join(ROOT, "webapp.py"), default_timeout=120)
+                app.run()
+                next(button for button in app.button if button.label == "Generate Test PDF").click().run()
+                if app.exception:
+                    print(app.exception[0].value)
+                    return 1
+                sizes = state_sizes(app)
+                totals.append(sum(sizes.values()))
+                key = max(sizes, key=sizes.get)
+                largest = max(largest, (sizes[key], key))
+            seconds = time.perf_counter() - start
+
+            store = ArtefactStore(artefact_dir)
+            sessions, size = store.usage()
+            print(f"{args.sessions} sessions in {seconds:.1f}s")
+            print(f"session state: {sum(totals) / len(totals) / 1024:8.1f} KB on average, "
+                  f"largest entry {largest[1]!r} at {largest[0] / 1024:.1f} KB")
+            print(f"on disk:       {sessions} session directories, {size / 1024:8.1f} KB of PDFs")
+            if largest[0] >= DOCUMENT_BYTES:
+                print("  a session keeps a copy of a document")
+                status = 1
+
+            removed = ArtefactStore(artefact_dir, max_age=0).sweep(now=time.time() + 1, force=True)
+            left = store.usage()
+            print(f"after sweep:   {removed} removed, {left[0]} left")
+            if left[0]:
+                status = 1
+        finally:
+            os.chdir(ROOT)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+"""
+Check that the render cache never changes what render_pdf produces.
+
+Usage (from the repository root):
+    python benchmarks/check_render_cache.py
+    python benchmarks/check_render_cache.py --lines 500
+
+Renders one invoice with a fixed creation date (so renders are comparable
+byte for byte) from a list of lines, from an iterator over the same lines
+and from a generator, in this order:
+    iterator    cache empty
+    list        cache miss, stores the PDF
+    generator   after the list's PDF was stored
+    list        memory cache hit
+    iterator    after the hit
+    list        disk cache hit, memory emptied as in a new process
+Every render must give the same bytes and return the same total, and the
+cache must have served exactly the two list repeats. Runs against a
+throw-away disk cache. Exits non-zero on any mismatch.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timezone
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line, render_pdf  # noqa: E402
+from invoicing.render_cache import configure_render_cache, reset_render_cache  # noqa: E402
+
+CREATED = datetime(2025, 9, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def render(lines):
+    output = BytesIO()
+    total = render_pdf(output, lines, "Cache Check", 7, "", "nl", 14, "Check",
+                       date(2025, 9, 1), creation_date=CREATED)
+    return output.getvalue(), total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that cached and streamed renders are identical.")
+    parser.add_argument("--lines", type=int, default=25)
+    args = parser.parse_args(argv)
+
+    lines = [make_line(f"Participant {i}", 1 + i % 3, 7.5 + i % 10) for i in range(args.lines)]
+    status = 0
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = configure_render_cache(disk_dir=cache_dir)
+        renders = [("iterator", render(iter(lines)))]
+        renders.append(("list", render(lines)))
+        renders.append(("generator", render(line for line in lines)))
+        renders.append(("list hit", render(lines)))
+        renders.append(("iterator", render(iter(lines))))
+        reset_render_cache()
+        renders.append(("disk hit", render(lines)))
+
+        reference, expected = renders[1][1]
+        for name, (data, total) in renders:
+            same = data == reference and total == expected
+            print(f"{name:10} {len(data):7d} bytes  total {total}  {'ok' if same else 'DIFFERS'}")
+            if not same:
+                status = 1
+        print(f"cache: {cache.hits} hits, {cache.misses} misses")
+        if (cache.hits, cache.misses) != (2, 1):
+            print("  expected the two list repeats to be the only hits")
+            status = 1
+    print("Cached and streamed renders are identical" if status == 0 else "FAILED")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
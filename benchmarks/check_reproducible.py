@@ -0,0 +1,192 @@
+"""
+Check that reproducible renders are byte-identical on every render path.
+
+Usage (from the repository root):
+    python benchmarks/check_reproducible.py
+    python benchmarks/check_reproducible.py --language en --vat-rate 21
+
+Renders one invoice with an explicit invoice date, due date and PDF
+creation date through:
+    desktop     main.InvoiceManager.generate_pdf
+    web         webapp.generate_pdf (the Streamlit script, imported in bare mode)
+    service     batch.render_invoice on an invoice_spec, as the background service does
+    epoch       render_pdf with the creation date taken from $SOURCE_DATE_EPOCH
+and with only the invoice date chosen, as the front ends' reproducible
+mode does (reproducible_dates):
+    desktop mode    InvoiceManager.reproducible_date, the "Reproducible PDFs" checkbox
+    web mode        st.session_state.reproducible_date, the "Reproducible PDFs" sidebar option
+each twice, more than a second apart, with the render cache off. All
+renders must give the same bytes. As a control, two renders without a
+creation date must differ, and with the render cache on a second creation
+date must not be served the first one's PDF. Runs in a throw-away working
+directory, so the config and ledger the front ends touch are not the real
+ones. Exits non-zero on any mismatch.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from invoicing.batch import render_invoice  # noqa: E402
+from invoicing.core import render_pdf  # noqa: E402
+from invoicing.lines import LineStore  # noqa: E402
+from invoicing.render_cache import configure_render_cache  # noqa: E402
+from invoicing.service import invoice_spec  # noqa: E402
+
+ITEMS = [
+    ("Ice skating lesson (1 hour)", 1, 25.00),
+    ("Skate rental", 2, 7.50),
+    ("Training subscription (monthly)", 1, 45.00),
+]
+RECIPIENT = "Test Customer"
+INVOICE_NUMBER = 42
+INVOICE_DATE = date(2025, 9, 1)
+DUE_DATE = date(2025, 9, 15)
+# Midnight of the invoice date, which is what the reproducible mode stamps
+CREATED = datetime(2025, 9, 1, tzinfo=timezone.utc)
+
+
+def desktop_manager(options):
+    from main import InvoiceManager
+
+    manager = InvoiceManager(autoload_config=False)
+    manager.language = options.language
+    manager.vat_rate = options.vat_rate
+    manager.invoice_lines.extend(ITEMS)
+    return manager
+
+
+def render_desktop(workdir, options, creation_date=CREATED):
+    path = os.path.join(workdir, "desktop.pdf")
+    desktop_manager(options).generate_pdf(RECIPIENT, "", path, INVOICE_NUMBER, INVOICE_DATE, DUE_DATE, creation_date)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def render_desktop_mode(workdir, options):
+    manager = desktop_manager(options)
+    manager.reproducible_date = INVOICE_DATE
+    path = os.path.join(workdir, "desktop_mode.pdf")
+    manager.generate_pdf(RECIPIENT, "", path, INVOICE_NUMBER)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def web_session(options):
+    import streamlit as st
+    from streamlit import config, logger
+
+    # Imported outside `streamlit run`, which warns on every session state
+    # access; parse the config first, or its log level overrides this one
+    config.get_config_options()
+    logger.set_log_level('error')
+    import webapp
+
+    st.session_state.invoice_lines = LineStore(ITEMS)
+    st.session_state.invoice_number = INVOICE_NUMBER
+    st.session_state.language = options.language
+    st.session_state.payment_terms_days = 14
+    st.session_state.description = webapp.invoicing.DEFAULT_DESCRIPTION
+    st.session_state.vat_rate = options.vat_rate
+    st.session_state.reproducible_date = None
+    return webapp, st.session_state
+
+
+def render_web(options, mode=False):
+    webapp, session = web_session(options)
+    if mode:
+        session.reproducible_date = INVOICE_DATE
+        path = webapp.generate_pdf(RECIPIENT, "")
+    else:
+        path = webapp.generate_pdf(RECIPIENT, "", INVOICE_DATE, DUE_DATE, CREATED)
+    with open(path, 'rb') as f:
+        data = f.read()
+    webapp.artefact_store().discard(session.session_id)
+    return data
+
+
+def render_service(workdir, options):
+    spec = invoice_spec(INVOICE_NUMBER, RECIPIENT, LineStore(ITEMS), "", options.language, 14,
+                        vat_rate=options.vat_rate, output_dir=workdir,
+                        invoice_date=INVOICE_DATE, due_date=DUE_DATE, creation_date=CREATED)
+    render_invoice(spec)
+    with open(spec.pdf_path, 'rb') as f:
+        return f.read()
+
+
+def render_epoch(options):
+    os.environ['SOURCE_DATE_EPOCH'] = str(int(CREATED.timestamp()))
+    try:
+        pdf = BytesIO()
+        render_pdf(pdf, LineStore(ITEMS), RECIPIENT, INVOICE_NUMBER, "", options.language,
+                   invoice_date=INVOICE_DATE, due_date=DUE_DATE, vat_rate=options.vat_rate)
+        return pdf.getvalue()
+    finally:
+        del os.environ['SOURCE_DATE_EPOCH']
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that reproducible invoice PDFs are byte-identical.")
+    parser.add_argument("--language", default="nl", choices=["nl", "en"])
+    parser.add_argument("--vat-rate", type=float, default=0)
+    args = parser.parse_args(argv)
+
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            configure_render_cache(memory_bytes=0, disk_dir=None)
+            renders = []
+            for attempt in range(2):
+                if attempt:
+                    time.sleep(1.1)  # PDF timestamps have a resolution of one second
+                renders += [
+                    ("desktop", render_desktop(workdir, args)),
+                    ("web", render_web(args)),
+                    ("service", render_service(workdir, args)),
+                    ("epoch", render_epoch(args)),
+                    ("desktop mode", render_desktop_mode(workdir, args)),
+                    ("web mode", render_web(args, mode=True)),
+                ]
+            reference = renders[0][1]
+            for name, data in renders:
+                same = data == reference
+                print(f"{name:12} {len(data):7d} bytes  sha256 {digest(data)}  {'ok' if same else 'DIFFERS'}")
+                if not same:
+                    status = 1
+
+            control = render_desktop(workdir, args, creation_date=None)
+            time.sleep(1.1)
+            if control == render_desktop(workdir, args, creation_date=None):
+                print("control: two renders without a creation date are identical; the check proves nothing")
+                status = 1
+            else:
+                print("control: renders without a creation date differ, as expected")
+
+            configure_render_cache(disk_dir=None)
+            cached = render_desktop(workdir, args)
+            later = render_desktop(workdir, args, creation_date=datetime(2026, 1, 1, tzinfo=timezone.utc))
+            if cached != reference or later == reference:
+                print("render cache: a creation date was served another creation date's PDF")
+                status = 1
+            else:
+                print("render cache: keyed by the creation date")
+        finally:
+            os.chdir(ROOT)
+    print("All reproducible renders are identical" if status == 0 else "FAILED")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
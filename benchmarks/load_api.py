@@ -0,0 +1,166 @@
+"""
+Load test for the invoice HTTP API (invoicing.api).
+
+Usage (from the repository root):
+    python benchmarks/load_api.py                               # starts its own server
+    python benchmarks/load_api.py --workers 4 --clients 8 --requests 400 --lines 20
+    python benchmarks/load_api.py --url http://127.0.0.1:8765   # an already running server
+    python benchmarks/load_api.py --batch 50                    # also time one 50-invoice ZIP
+
+Every client thread keeps one HTTP/1.1 connection open and sends preview
+requests (nothing is numbered, written or recorded) to POST /invoice until
+the total number of requests is reached. Reports requests/sec and the
+p50/p90/p99/max latency. Without --url a server is started on a free
+localhost port with --workers render processes and stopped afterwards;
+its start-up (including pre-warming the workers) is reported separately.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers):
+    """Start python -m invoicing.api on a free port; returns (process, url, start-up seconds)."""
+    port = free_port()
+    start = time.perf_counter()
+    # Every request is a different invoice, so the render cache could only add overhead
+    env = dict(os.environ, INVOICE_RENDER_CACHE='0')
+    process = subprocess.Popen([sys.executable, '-m', 'invoicing.api', '--port', str(port),
+                                '--workers', str(workers)], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    # The server prints its address once the workers are warm and it is listening
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError("the API server did not start")
+    return process, f"http://127.0.0.1:{port}", time.perf_counter() - start
+
+
+def invoice_payload(lines, number):
+    return {
+        'recipient': f"Load Test {number}",
+        'lines': [[f"Ice skating lesson #{i + 1}", 1 + i % 3, 25.0] for i in range(lines)],
+        'preview': True,
+        'invoice_number': number,
+    }
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_clients(host, port, clients, total, lines):
+    """Send total requests over clients keep-alive connections; returns (latencies, errors, seconds)."""
+    latencies = []
+    errors = []
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection(host, port, timeout=120)
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                break
+            body = json.dumps(invoice_payload(lines, number))
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/invoice', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response_body = response.read()
+                elapsed = time.perf_counter() - start
+                if response.status != 200 or not response_body.startswith(b'%PDF'):
+                    raise RuntimeError(f"HTTP {response.status}: {response_body[:200]!r}")
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=120)
+                continue
+            with lock:
+                latencies.append(elapsed)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def time_batch(host, port, count, lines):
+    """Seconds and ZIP size of one POST /batch of count preview invoices."""
+    body = json.dumps({'preview': True, 'invoices': [invoice_payload(lines, n) for n in range(count)]})
+    connection = http.client.HTTPConnection(host, port, timeout=600)
+    start = time.perf_counter()
+    connection.request('POST', '/batch', body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    size = len(response.read())
+    elapsed = time.perf_counter() - start
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f"batch failed with HTTP {response.status}")
+    return elapsed, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the invoice HTTP API.")
+    parser.add_argument("--url", help="Server to test (default: start one)")
+    parser.add_argument("--workers", type=int, default=2, help="Render processes of the started server (default: 2)")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent keep-alive connections (default: 4)")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests (default: 200)")
+    parser.add_argument("--lines", type=int, default=10, help="Lines per invoice (default: 10)")
+    parser.add_argument("--batch", type=int, default=0, help="Also time one batch of this many invoices")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url, startup = start_server(args.workers)
+        print(f"Server with {args.workers} worker(s) ready in {startup:.2f}s")
+    parts = urlsplit(url)
+    try:
+        latencies, errors, seconds = run_clients(parts.hostname, parts.port or 80, args.clients,
+                                                 args.requests, args.lines)
+        if latencies:
+            latencies.sort()
+            print(f"{len(latencies)} requests ({args.lines} lines each) over {args.clients} connection(s) "
+                  f"in {seconds:.2f}s: {len(latencies) / seconds:.1f} req/s")
+            print("latency ms: " + "  ".join(
+                f"{label} {value * 1000:.1f}" for label, value in (
+                    ("p50", percentile(latencies, 0.50)), ("p90", percentile(latencies, 0.90)),
+                    ("p99", percentile(latencies, 0.99)), ("max", latencies[-1]),
+                    ("mean", statistics.fmean(latencies)))))
+        if errors:
+            print(f"{len(errors)} failed request(s), first: {errors[0]}")
+        if args.batch:
+            elapsed, size = time_batch(parts.hostname, parts.port or 80, args.batch, args.lines)
+            print(f"batch of {args.batch}: {elapsed:.2f}s ({args.batch / elapsed:.1f} invoices/s), "
+                  f"ZIP {size / 1e6:.2f} MB")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
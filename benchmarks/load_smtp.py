@@ -0,0 +1,214 @@
+"""
+Mail throughput of invoicing.dispatch against a local SMTP stand-in.
+
+Usage (from the repository root):
+    python benchmarks/load_smtp.py                                  # 300 mails over 1, 2 and 4 connections
+    python benchmarks/load_smtp.py --invoices 1000 --connections 4 --latency 20 --handshake 200
+    python benchmarks/load_smtp.py --fail-every 7 --drop-every 11   # exercise the retries
+    python benchmarks/load_smtp.py --serve --port 8025              # only run the stand-in
+
+The stand-in is a small asyncio SMTP server that, like aiosmtpd's Sink
+handler, accepts and discards every message. --handshake delays its
+greeting (what connecting, STARTTLS and login cost on a real server) and
+--latency delays the reply to every message. --fail-every N answers every
+Nth message with a temporary 451 and --drop-every N hangs up on it instead.
+
+A temporary ledger is filled with --invoices invoices that all attach the
+same rendered PDF. The run is sent once per --connections value, plus once
+with a new connection per mail for comparison, and each line reports
+mails/minute and the connections opened. The mail count received by the
+stand-in is checked against the sent count. With --serve the stand-in
+runs until interrupted, e.g. for
+    python -m invoicing.batch members.csv --send --host 127.0.0.1 --port 8025
+"""
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.core import make_line, render_pdf  # noqa: E402
+from invoicing.dispatch import SMTPPool, build_message, dispatch  # noqa: E402
+from invoicing.ledger import Ledger  # noqa: E402
+
+
+class SinkServer:
+    """SMTP server on a background thread that accepts every message and keeps count."""
+
+    def __init__(self, host='127.0.0.1', port=0, handshake=0.0, latency=0.0, fail_every=0, drop_every=0):
+        self.host = host
+        self.port = port
+        self.handshake = handshake
+        self.latency = latency
+        self.fail_every = fail_every
+        self.drop_every = drop_every
+        self.connections = 0
+        self.received = 0
+        self.refused = 0
+        self.dropped = 0
+        self._data_count = 0
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            server = self._loop.run_until_complete(asyncio.start_server(self._session, self.host, self.port))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                server.close()
+                self._loop.run_until_complete(server.wait_closed())
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="smtp-sink", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    async def _session(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        writer.write(b"220 sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b'EHLO':
+                    writer.write(b"250-sink\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+                elif command in (b'HELO', b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                    writer.write(b"250 OK\r\n")
+                elif command == b'DATA':
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    await asyncio.sleep(self.latency)
+                    self._data_count += 1
+                    if self.drop_every and self._data_count % self.drop_every == 0:
+                        self.dropped += 1
+                        break
+                    if self.fail_every and self._data_count % self.fail_every == 0:
+                        self.refused += 1
+                        writer.write(b"451 Try again later\r\n")
+                    else:
+                        self.received += 1
+                        writer.write(b"250 OK queued\r\n")
+                elif command == b'QUIT':
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"502 Command not implemented\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def fill_ledger(path, count, pdf_path):
+    lines = [make_line("Ice skating lesson (1 hour)", 1, 25.0), make_line("Skate rental", 1, 7.5)]
+    with Ledger(path) as ledger:
+        ledger.record_many(dict(
+            invoice_number=number, customer_name=f"Member {number}", lines=lines, invoice_date=date.today(),
+            language='nl', pdf_path=pdf_path, email=f"member{number}@example.org",
+        ) for number in range(1, count + 1))
+
+
+def send_unpooled(ledger_path, host, port, sender):
+    """The run with a new SMTP connection per mail; returns (mails, seconds)."""
+    with Ledger(ledger_path) as ledger:
+        invoices = ledger.unsent_invoices(0, 2 ** 62)
+    start = time.perf_counter()
+    for invoice in invoices:
+        with smtplib.SMTP(host, port) as connection:
+            connection.send_message(build_message(invoice, sender))
+    return len(invoices), time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure invoice mail throughput against a local SMTP stand-in.")
+    parser.add_argument("--invoices", type=int, default=300)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--handshake", type=float, default=50, help="Greeting delay in ms (default: 50)")
+    parser.add_argument("--latency", type=float, default=5, help="Reply delay per mail in ms (default: 5)")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth mail with 451")
+    parser.add_argument("--drop-every", type=int, default=0, help="Hang up on every Nth mail")
+    parser.add_argument("--serve", action="store_true", help="Only run the stand-in until interrupted")
+    parser.add_argument("--port", type=int, default=0, help="Port of the stand-in (default: a free one)")
+    args = parser.parse_args(argv)
+
+    sink = SinkServer(port=args.port, handshake=args.handshake / 1000, latency=args.latency / 1000,
+                      fail_every=args.fail_every, drop_every=args.drop_every)
+    if args.serve:
+        with sink:
+            print(f"SMTP stand-in listening on {sink.host}:{sink.port}; Ctrl+C to stop")
+            try:
+                while True:
+                    time.sleep(5)
+                    print(f"{sink.received} received, {sink.refused} refused, {sink.dropped} dropped "
+                          f"over {sink.connections} connection(s)")
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    sender = "penningmeester@example.org"
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir, sink:
+        pdf_path = os.path.join(workdir, "invoice.pdf")
+        render_pdf(BytesIO(), [make_line("Warm-up", 1, 1.0)], "Benchmark", 1)
+        render_pdf(pdf_path, [make_line("Ice skating lesson (1 hour)", 1, 25.0)], "Benchmark", 1)
+        print(f"{args.invoices} mails with a {os.path.getsize(pdf_path) / 1024:.0f} KB PDF, "
+              f"handshake {args.handshake:g} ms, latency {args.latency:g} ms")
+
+        if not args.fail_every and not args.drop_every:
+            ledger_path = os.path.join(workdir, "unpooled.sqlite3")
+            fill_ledger(ledger_path, args.invoices, pdf_path)
+            connections = sink.connections
+            sent, seconds = send_unpooled(ledger_path, sink.host, sink.port, sender)
+            print(f"{'new connection per mail':>24}: {sent / seconds * 60:8.0f} mails/minute "
+                  f"({sink.connections - connections} connections)")
+
+        for size in args.connections:
+            ledger_path = os.path.join(workdir, f"pool{size}.sqlite3")
+            fill_ledger(ledger_path, args.invoices, pdf_path)
+            received = sink.received
+            with Ledger(ledger_path) as ledger, SMTPPool(sink.host, sink.port, size=size) as pool:
+                result = dispatch(ledger, ledger.unsent_invoices(0, 2 ** 62), pool, sender, backoff=0.05)
+            print(f"{f'pool of {size}':>24}: {result.per_minute:8.0f} mails/minute "
+                  f"({result.connects} connections, {result.failed} failed)")
+            if sink.received - received != result.sent or result.failed:
+                print(f"  the stand-in received {sink.received - received} mails, dispatch reported {result.sent}")
+                status = 1
+        if args.fail_every or args.drop_every:
+            print(f"stand-in: {sink.refused} refused with 451 and {sink.dropped} dropped, all retried")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+"""
+Stress test for invoicing.config.allocate_invoice_numbers.
+
+Usage (from the repository root):
+    python benchmarks/stress_allocator.py
+    python benchmarks/stress_allocator.py --processes 16 --allocations 500 --max-block 20
+
+Many processes reserve single numbers and blocks of random size from one
+throw-away config file as fast as they can, while another process keeps
+saving settings with a stale counter (like a front end changing the
+language). Afterwards every reserved number must be unique, together they
+must cover one contiguous range, and the config must point at the number
+right after it. Exits non-zero on any duplicate or gap.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoicing.config import allocate_invoice_numbers, load_config, save_config  # noqa: E402
+
+
+def allocate_worker(path, allocations, max_block, seed, results):
+    rng = random.Random(seed)
+    blocks = []
+    for _ in range(allocations):
+        count = rng.randint(1, max_block)
+        blocks.append((allocate_invoice_numbers(count, path), count))
+    results.put(blocks)
+
+
+def settings_worker(path, stop):
+    # Saves with last_invoice_number=1; the counter must never move back
+    while not stop.is_set():
+        save_config({'last_invoice_number': 1, 'payment_terms_days': 14,
+                     'language': 'en', 'description': 'stress'}, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hammer the invoice number allocator from many processes.")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--allocations", type=int, default=200, help="allocations per process")
+    parser.add_argument("--max-block", type=int, default=10, help="largest block one allocation reserves")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'invoice_config.json')
+        first_number = load_config(path)['last_invoice_number']
+
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        saver = multiprocessing.Process(target=settings_worker, args=(path, stop))
+        workers = [
+            multiprocessing.Process(target=allocate_worker,
+                                    args=(path, args.allocations, args.max_block, seed, results))
+            for seed in range(args.processes)
+        ]
+        start = time.perf_counter()
+        saver.start()
+        for worker in workers:
+            worker.start()
+        blocks = [block for _ in workers for block in results.get()]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        saver.join()
+        next_number = load_config(path)['last_invoice_number']
+
+    numbers = [first + i for first, count in blocks for i in range(count)]
+    unique = set(numbers)
+    duplicates = len(numbers) - len(unique)
+    expected = set(range(first_number, first_number + len(numbers)))
+    gaps = len(expected - unique)
+
+    print(f"processes:        {args.processes} (+1 saving stale settings)")
+    print(f"allocations:      {len(blocks)} ({len(numbers)} numbers)")
+    print(f"elapsed:          {elapsed:.2f}s ({len(blocks) / elapsed:.0f} allocations/sec)")
+    print(f"duplicates:       {duplicates}")
+    print(f"gaps:             {gaps}")
+    print(f"config next:      {next_number} (expected {first_number + len(numbers)})")
+
+    ok = duplicates == 0 and gaps == 0 and next_number == first_number + len(numbers)
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+"""
+Invoice engine shared by the desktop app (main.py) and the web app (webapp.py).
+
+    from invoicing import load_config, make_line, render_pdf, write_csv
+
+Names are resolved on first access, so importing the package does not pull
+in fpdf; it is loaded when the first PDF is rendered.
+"""
+import importlib
+
+_EXPORTS = {
+    'CONFIG_PATH': 'config',
+    'DEFAULT_CONFIG': 'config',
+    'DEFAULT_DESCRIPTION': 'config',
+    'allocate_invoice_numbers': 'config',
+    'config_lock': 'config',
+    'load_config': 'config',
+    'save_config': 'config',
+    'HEADER_INFO': 'translations',
+    'TRANSLATIONS': 'translations',
+    'font_setup': 'core',
+    'make_line': 'core',
+    'render_pdf': 'core',
+    'reproducible_dates': 'core',
+    'sanitize_filename': 'core',
+    'write_csv': 'core',
+    'get_template': 'template',
+    'LineStore': 'lines',
+    'format_quantity': 'lines',
+    'from_cents': 'money',
+    'to_cents': 'money',
+    'vat_breakdown': 'money',
+    'RejectedRow': 'importer',
+    'describe_rejected': 'importer',
+    'extend_store': 'importer',
+    'import_lines': 'importer',
+    'iter_lines': 'importer',
+    'lines_from_frame': 'importer',
+    'read_lines': 'importer',
+    'resolve_columns': 'importer',
+    'LEDGER_PATH': 'ledger',
+    'Ledger': 'ledger',
+    'record_invoice': 'ledger',
+    'export_merged_pdf': 'export',
+    'export_zip': 'export',
+    'SMTPPool': 'dispatch',
+    'filter_history': 'reporting',
+    'load_history': 'reporting',
+    'outstanding': 'reporting',
+    'revenue_by_month': 'reporting',
+    'totals_by_description': 'reporting',
+    'InvoiceIndex': 'reconcile',
+    'read_statement': 'reconcile',
+    'Profiler': 'profiling',
+    'stage': 'profiling',
+    'reset_resource_cache': 'resources',
+    'configure_render_cache': 'render_cache',
+    'get_render_cache': 'render_cache',
+    'reset_render_cache': 'render_cache',
+    'GenerationService': 'service',
+    'invoice_spec': 'service',
+    'InvoiceServer': 'api',
+    'ArtefactStore': 'artefacts',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
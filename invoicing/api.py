@@ -0,0 +1,304 @@
+"""
+Local HTTP/JSON API for rendering invoices, for the member administration
+and other scripts. Standard library only; meant to listen on localhost.
+
+Usage:
+    python -m invoicing.api                        # http://127.0.0.1:8765, one render worker
+    python -m invoicing.api --port 9000 --workers 4
+
+Endpoints:
+    GET  /health     {"status": "ok", "workers": 2}
+    GET  /artefacts/<session>/<name>
+                     a file the web app wrote for a browser session (see
+                     invoicing.artefacts), e.g. a billing-run export, streamed
+                     from disk in chunks; INVOICE_ARTEFACT_DIR must be the same
+                     for both, and INVOICE_API_URL tells the web app this
+                     server's address as the browser reaches it
+    POST /invoice    one invoice as JSON -> the PDF (application/pdf)
+    POST /batch      {"invoices": [...], "preview": false} -> a ZIP of the PDFs, streamed
+                     (chunked) in order as they are rendered
+
+An invoice is
+    {"recipient": "Jane Doe",
+     "lines": [["Skate rental", 1, 7.5], {"description": "...", "quantity": 2, "price": "25.00"}],
+     "invoice_name": "", "language": "nl", "payment_terms_days": 14,
+     "description": "...", "vat_rate": 0, "preview": false}
+Missing settings come from the shared config. A real invoice gets the next
+number from the shared allocator, its PDF and CSV are written to the
+output folder and it is recorded in the ledger, exactly like the desktop
+and web apps do. With "preview": true nothing is allocated, written or
+recorded and an optional "invoice_number" is printed as given (default 0).
+When a batch breaks off (a failed render or a client that hangs up), the
+invoices already rendered are still recorded; the numbers of the rest
+stay unused.
+
+Connections are kept alive (HTTP/1.1). Rendering runs on a process pool
+whose workers render a throwaway invoice when they start, so fonts, logo
+and compiled template are resident before the first request arrives.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from .artefacts import ArtefactStore
+from .batch import record_specs, render_invoice
+from .config import allocate_invoice_numbers, load_config
+from .core import make_line, render_pdf, sanitize_filename
+from .lines import LineStore
+from .service import invoice_spec
+from .translations import TRANSLATIONS
+
+MAX_BODY = 16 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+CONTENT_TYPES = {'.pdf': 'application/pdf', '.zip': 'application/zip', '.csv': 'text/csv'}
+
+
+class RequestError(Exception):
+    """A request the API rejects with 400 Bad Request."""
+
+
+def _warm_worker():
+    # Parse the fonts, decode the logo and compile the template before the first request
+    render_pdf(BytesIO(), [make_line("Warm-up", 1, 1.0)], "Warm-up", 0)
+
+
+def parse_lines(lines):
+    """JSON lines ([description, quantity, price] or objects) as a LineStore."""
+    if not isinstance(lines, list) or not lines:
+        raise RequestError("'lines' must be a non-empty list")
+    try:
+        return LineStore(tuple(line) if isinstance(line, list) else line for line in lines)
+    except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+        raise RequestError(f"invalid line: {e!r}") from None
+
+
+def build_spec(payload, invoice_number, settings, output_dir):
+    if not isinstance(payload, dict):
+        raise RequestError("an invoice must be a JSON object")
+    recipient = payload.get('recipient')
+    if not isinstance(recipient, str) or not recipient:
+        raise RequestError("'recipient' is required")
+    language = payload.get('language', settings['language'])
+    if language not in TRANSLATIONS:
+        raise RequestError(f"'language' must be one of {sorted(TRANSLATIONS)}")
+    try:
+        return invoice_spec(
+            int(invoice_number), recipient, parse_lines(payload.get('lines')),
+            invoice_name=str(payload.get('invoice_name', '')),
+            language=language,
+            payment_terms_days=int(payload.get('payment_terms_days', settings['payment_terms_days'])),
+            description=str(payload.get('description', settings['description'])),
+            vat_rate=float(payload.get('vat_rate', settings['vat_rate'])),
+            output_dir=output_dir,
+        )
+    except (TypeError, ValueError) as e:
+        raise RequestError(str(e)) from None
+
+
+class _ChunkedWriter:
+    """File-like writer that sends everything as HTTP/1.1 chunks."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), bytes(data)))
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class InvoiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=1, output_dir="invoices", artefacts=None):
+        self.workers = max(1, workers)
+        self.output_dir = output_dir
+        self.artefacts = artefacts or ArtefactStore()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        # Start every worker now rather than on the first requests
+        for future in [self.pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        super().__init__(address, InvoiceHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+    def specs_for(self, payloads, preview):
+        """Specs for a list of invoice payloads, numbered from the allocator unless previewing."""
+        settings = load_config()
+        if preview:
+            return [build_spec(payload, payload.get('invoice_number', 0) if isinstance(payload, dict) else 0,
+                               settings, self.output_dir)
+                    for payload in payloads]
+        if any(isinstance(payload, dict) and 'invoice_number' in payload for payload in payloads):
+            raise RequestError("'invoice_number' can only be given with 'preview'; numbers come from the allocator")
+        # Validate everything before reserving numbers, so bad requests do not use any up
+        for payload in payloads:
+            build_spec(payload, 0, settings, self.output_dir)
+        first_number = allocate_invoice_numbers(len(payloads))
+        os.makedirs(self.output_dir, exist_ok=True)
+        return [build_spec(payload, first_number + offset, settings, self.output_dir)
+                for offset, payload in enumerate(payloads)]
+
+
+class InvoiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    server_version = 'InvoiceAPI/1.0'
+
+    def log_request(self, code='-', size='-'):
+        # No line per request (the load test alone sends thousands); errors are still logged
+        pass
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok', 'workers': self.server.workers})
+        elif self.path.startswith('/artefacts/'):
+            self.handle_artefact(self.path[len('/artefacts/'):])
+        else:
+            self.send_json(404, {'error': f"unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            if self.path == '/invoice':
+                payload = self.read_json()
+                self.handle_invoice(payload)
+            elif self.path == '/batch':
+                payload = self.read_json()
+                self.handle_batch(payload)
+            else:
+                self.read_body()
+                self.send_json(404, {'error': f"unknown path {self.path}"})
+        except RequestError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': repr(e)})
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            self.close_connection = True
+            raise RequestError(f"request body larger than {MAX_BODY} bytes")
+        return self.rfile.read(length)
+
+    def read_json(self):
+        try:
+            return json.loads(self.read_body() or b'{}')
+        except ValueError as e:
+            raise RequestError(f"invalid JSON: {e}") from None
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_artefact(self, path):
+        session_id, _, name = path.partition('/')
+        try:
+            if name != sanitize_filename(name):
+                raise ValueError(f"invalid file name: {name!r}")
+            f = open(os.path.join(self.server.artefacts.session_dir(session_id), name), 'rb')
+        except (ValueError, OSError):
+            self.send_json(404, {'error': f"no artefact {path}"})
+            return
+        with f:
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream'))
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('Content-Disposition', f'attachment; filename="{name}"')
+            self.end_headers()
+            # A whole billing run can be gigabytes; it never has to fit in memory
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def handle_invoice(self, payload):
+        preview = isinstance(payload, dict) and bool(payload.get('preview'))
+        [spec] = self.server.specs_for([payload], preview)
+        data = self.server.pool.submit(render_invoice, spec, not preview, True).result()
+        if not preview:
+            record_specs([spec])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(spec.pdf_path)}"')
+        self.send_header('X-Invoice-Number', str(spec.invoice_number))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_batch(self, payload):
+        if not isinstance(payload, dict) or not isinstance(payload.get('invoices'), list) or not payload['invoices']:
+            raise RequestError("'invoices' must be a non-empty list")
+        preview = bool(payload.get('preview'))
+        specs = self.server.specs_for(payload['invoices'], preview)
+        futures = [self.server.pool.submit(render_invoice, spec, not preview, True) for spec in specs]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Content-Disposition', 'attachment; filename="invoices.zip"')
+        self.end_headers()
+        writer = _ChunkedWriter(self.wfile)
+        failure = None
+        try:
+            # PDFs are compressed already; storing them keeps the ZIP step cheap
+            with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as archive:
+                for spec, future in zip(specs, futures):
+                    archive.writestr(os.path.basename(spec.pdf_path), future.result())
+            writer.close()
+        except Exception as e:
+            # Too late for an error status; drop the connection so the client sees a broken stream
+            failure = e
+            for future in futures:
+                future.cancel()
+            self.close_connection = True
+        if not preview:
+            # Every invoice whose PDF was written belongs in the ledger, also when the batch broke off
+            wait(futures)
+            rendered = [spec for spec, future in zip(specs, futures)
+                        if not future.cancelled() and future.exception() is None]
+            if rendered:
+                record_specs(rendered)
+        if failure is not None:
+            self.log_error("batch failed after %d of %d invoice(s): %r",
+                           sum(not f.cancelled() and f.exception() is None for f in futures), len(specs), failure)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve invoice rendering over HTTP on localhost.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Render processes; 0 means one per CPU core (default: 1)")
+    parser.add_argument("--output", default="invoices", help="Folder for the PDFs and CSVs (default: invoices)")
+    args = parser.parse_args(argv)
+
+    server = InvoiceServer((args.host, args.port), args.workers or os.cpu_count() or 1, args.output)
+    print(f"Serving invoices on http://{args.host}:{server.server_port} with {server.workers} worker(s)",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""
+Files the web app renders for one browser session, kept on disk.
+
+A PDF is written once, into a directory of its own per session, and the
+session keeps only the path; download buttons open the file when they are
+clicked, so no copy of the document stays in session state.
+
+    store = ArtefactStore()
+    store.touch(session_id)                                # on every rerun
+    render_pdf(store.path(session_id, "test_invoice.pdf"), ...)
+    store.sweep()
+
+The directory defaults to invoice_artefacts in the system's temporary
+directory; INVOICE_ARTEFACT_DIR overrides it.
+
+Closed browser tabs never say goodbye, so sweep() removes the directories
+of sessions that have not rerun for max_age seconds. It is cheap to call
+on every rerun: it only looks at the disk once per sweep_interval.
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from .core import sanitize_filename
+
+ARTEFACT_DIR = os.path.join(tempfile.gettempdir(), 'invoice_artefacts')
+MAX_AGE = 60 * 60
+SWEEP_INTERVAL = 60
+
+
+class ArtefactStore:
+    """Per-session directories under root, removed max_age seconds after their session's last rerun."""
+
+    def __init__(self, root=None, max_age=MAX_AGE, sweep_interval=SWEEP_INTERVAL):
+        self.root = root or os.environ.get('INVOICE_ARTEFACT_DIR') or ARTEFACT_DIR
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def session_dir(self, session_id):
+        # Session IDs end up in a path; anything but a plain token is refused
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', session_id):
+            raise ValueError(f"invalid session id: {session_id!r}")
+        return os.path.join(self.root, session_id)
+
+    def touch(self, session_id):
+        """Mark the session as alive, so sweep() keeps its files."""
+        try:
+            os.utime(self.session_dir(session_id))
+        except FileNotFoundError:
+            pass
+
+    def path(self, session_id, name):
+        """Where to write the session's artefact called name; replaces an earlier one of that name."""
+        directory = self.session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        os.utime(directory)
+        return os.path.join(directory, sanitize_filename(name))
+
+    def discard(self, session_id):
+        """Remove every artefact of one session."""
+        shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
+
+    def sweep(self, now=None, force=False):
+        """Remove the directories of sessions idle for over max_age seconds; returns how many."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not force and now - self._last_sweep < self.sweep_interval:
+                return 0
+            self._last_sweep = now
+        removed = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                stale = entry.is_dir() and now - entry.stat().st_mtime > self.max_age
+            except FileNotFoundError:
+                continue  # removed by a sweep in another process
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def usage(self):
+        """(sessions, bytes) currently on disk."""
+        sessions = size = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0, 0
+        for entry in entries:
+            if entry.is_dir():
+                sessions += 1
+                for name in os.listdir(entry.path):
+                    try:
+                        size += os.path.getsize(os.path.join(entry.path, name))
+                    except OSError:
+                        pass
+        return sessions, size
@@ -0,0 +1,284 @@
+"""
+Headless batch invoicing.
+
+Reads one member/line-item table (CSV, TSV or Excel), groups the lines by
+recipient and writes one PDF + CSV per recipient into the invoices folder.
+
+Usage:
+    python -m invoicing.batch members.xlsx
+    python -m invoicing.batch members.csv --output invoices --invoice-name "Season 2025/2026"
+    python -m invoicing.batch members.csv --workers 0    # one render process per CPU core
+    python -m invoicing.batch members.csv --profile cprofile --profile-json profile.json
+    python -m invoicing.batch members.csv --zip run.zip --merged-pdf run.pdf
+    python -m invoicing.batch members.csv --send --host smtp.example.org --port 587 --starttls --user ...
+
+The table needs a recipient column plus description, quantity and price
+columns. English and Dutch headers are both accepted (see
+invoicing.importer.COLUMN_ALIASES). The file is read in chunks, so very
+large exports do not have to fit in memory as one DataFrame. An optional
+e-mail column gives the address each invoice is mailed to with --send
+(see invoicing.dispatch for the SMTP settings).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from io import BytesIO
+from typing import NamedTuple
+
+from .config import allocate_invoice_numbers, load_config
+from .core import make_line, render_pdf, sanitize_filename, write_csv
+from .dispatch import add_smtp_arguments, send_run
+from .importer import CHUNK_SIZE, LINE_FIELDS, convert_frame, describe_rejected, read_chunks, resolve_columns
+from .ledger import Ledger
+from .profiling import Profiler
+
+
+def group_lines(df, columns, groups=None, rejected=None):
+    """
+    Add the lines of df to groups, a dict of recipient -> [(description,
+    quantity, price), ...] that keeps the order in which recipients first
+    appear. Returns groups. Rows that cannot be read go to rejected (see
+    importer.convert_frame).
+    """
+    groups = {} if groups is None else groups
+    df = convert_frame(df.dropna(subset=[columns['recipient']]), columns, rejected)
+    for recipient, description, quantity, price in zip(
+            df['recipient'].astype(str).tolist(), df['description'].tolist(),
+            df['quantity'].tolist(), df['price'].tolist()):
+        groups.setdefault(recipient, []).append((description, quantity, price))
+    return groups
+
+
+def collect_addresses(df, recipient_column, email_column, addresses):
+    """Add the first non-empty e-mail address of every recipient in df to addresses."""
+    df = df.dropna(subset=[recipient_column, email_column])
+    for recipient, email in zip(df[recipient_column].astype(str).tolist(), df[email_column].astype(str).tolist()):
+        if email.strip():
+            addresses.setdefault(recipient, email.strip())
+    return addresses
+
+
+def read_groups(path, chunksize=CHUNK_SIZE, addresses=None, rejected=None):
+    """
+    Stream a CSV, TSV or Excel file and group its lines by recipient.
+    Returns a list of (recipient, [(description, quantity, price), ...]).
+
+    When the file has an e-mail column and addresses (a dict) is given, it
+    is filled with recipient -> address. Rows whose quantity or price is not
+    a number are appended to rejected, when given.
+    """
+    groups = {}
+    columns = None
+    email_column = None
+    for chunk in read_chunks(path, chunksize):
+        if columns is None:
+            columns = resolve_columns(chunk.columns, ('recipient',) + LINE_FIELDS)
+            if addresses is not None:
+                try:
+                    email_column = resolve_columns(chunk.columns, ('email',))['email']
+                except ValueError:
+                    pass
+        if email_column is not None:
+            collect_addresses(chunk, columns['recipient'], email_column, addresses)
+        group_lines(chunk, columns, groups, rejected)
+    return list(groups.items())
+
+
+class InvoiceSpec(NamedTuple):
+    """
+    Everything needed to render one invoice. Plain picklable data, so specs
+    can be shipped to worker processes.
+    """
+    invoice_number: int
+    recipient: str
+    invoice_name: str
+    lines: tuple  # ((description, quantity, price), ...)
+    language: str
+    payment_terms_days: int
+    description: str
+    vat_rate: float
+    pdf_path: str
+    csv_path: str
+    email: str = ""
+    # None means today, payment_terms_days later and the time of rendering (see core.render_pdf)
+    invoice_date: object = None
+    due_date: object = None
+    creation_date: object = None
+
+
+def build_specs(config, groups, first_number, output_dir="invoices", invoice_name="", addresses=None):
+    """
+    Turn recipient groups into specs, numbered consecutively from first_number.
+    addresses optionally maps recipients to the e-mail address to send to.
+    """
+    addresses = addresses or {}
+    specs = []
+    for offset, (recipient, lines) in enumerate(groups):
+        invoice_number = first_number + offset
+        base_name = f"{invoice_number}_{sanitize_filename(recipient)}"
+        specs.append(InvoiceSpec(
+            invoice_number=invoice_number,
+            recipient=recipient,
+            invoice_name=invoice_name,
+            lines=tuple(lines),
+            language=config['language'],
+            payment_terms_days=config['payment_terms_days'],
+            description=config['description'],
+            vat_rate=config['vat_rate'],
+            pdf_path=os.path.join(output_dir, base_name + ".pdf"),
+            csv_path=os.path.join(output_dir, base_name + ".csv"),
+            email=addresses.get(recipient, ""),
+        ))
+    return specs
+
+
+def render_invoice(spec, save=True, return_pdf=False):
+    """
+    Render one spec. Runs in the parent or in a pool worker. With save the
+    PDF and CSV are written to spec.pdf_path and spec.csv_path. Returns the
+    PDF's bytes with return_pdf (the API sends them), else the invoice number.
+    """
+    lines = [make_line(description, quantity, price) for description, quantity, price in spec.lines]
+    output = BytesIO() if return_pdf or not save else spec.pdf_path
+    render_pdf(output, lines, spec.recipient, spec.invoice_number, spec.invoice_name,
+               spec.language, spec.payment_terms_days, spec.description, spec.invoice_date, spec.vat_rate,
+               spec.due_date, spec.creation_date)
+    if save:
+        if output is not spec.pdf_path:
+            with open(spec.pdf_path, 'wb') as f:
+                f.write(output.getvalue())
+        write_csv(spec.csv_path, lines, spec.recipient, spec.invoice_number, spec.invoice_date)
+    return output.getvalue() if return_pdf else spec.invoice_number
+
+
+def profile_invoice(spec, options):
+    """render_invoice under a worker-local Profiler; returns its records for the parent to merge."""
+    profiler = Profiler(**options)
+    with profiler.invoice(f"#{spec.invoice_number}"):
+        render_invoice(spec)
+    return profiler.records
+
+
+def render_all(specs, workers=1, profiler=None):
+    """
+    Render specs in order. With workers > 1 the specs are spread over a
+    process pool; every worker runs the same render_invoice, so the files
+    are identical to a single-process run apart from timestamps.
+
+    With an enabled profiler every invoice is profiled where it is
+    rendered and the records end up in profiler.records.
+    """
+    profiling = profiler is not None and profiler.enabled
+    if workers <= 1 or len(specs) <= 1:
+        for spec in specs:
+            if profiling:
+                profiler.merge(profile_invoice(spec, profiler.options()))
+            else:
+                render_invoice(spec)
+        return
+    # A few chunks per worker keeps IPC overhead low while still balancing load
+    chunksize = max(1, len(specs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if profiling:
+            options = [profiler.options()] * len(specs)
+            for records in pool.map(profile_invoice, specs, options, chunksize=chunksize):
+                profiler.merge(records)
+        else:
+            for _ in pool.map(render_invoice, specs, chunksize=chunksize):
+                pass
+
+
+def run_batch(groups, output_dir="invoices", invoice_name="", workers=1, profiler=None, addresses=None):
+    """
+    Render one PDF + CSV per recipient group and record the run in the ledger.
+
+    The invoice numbers for the whole run are reserved up front as one
+    block in the shared config before rendering starts, so neither an
+    aborted run nor a concurrent generator can hand out the same number twice.
+    An enabled profiler collects one record per rendered invoice.
+    addresses (recipient -> e-mail) are stored in the ledger for dispatch.
+
+    Returns (specs, elapsed_seconds).
+    """
+    first_number = allocate_invoice_numbers(len(groups))
+    config = load_config()
+
+    os.makedirs(output_dir, exist_ok=True)
+    specs = build_specs(config, groups, first_number, output_dir, invoice_name, addresses)
+
+    start = time.perf_counter()
+    render_all(specs, workers, profiler)
+    elapsed = time.perf_counter() - start
+    record_specs(specs)
+    return specs, elapsed
+
+
+def record_specs(specs, invoice_date=None):
+    """Write every rendered invoice of a run to the ledger in one transaction."""
+    invoice_date = invoice_date or date.today()
+    with Ledger() as ledger:
+        ledger.record_many(dict(
+            invoice_number=spec.invoice_number, customer_name=spec.recipient,
+            lines=[make_line(*line) for line in spec.lines], invoice_date=spec.invoice_date or invoice_date,
+            due_date=spec.due_date or (spec.invoice_date or invoice_date) + timedelta(days=spec.payment_terms_days),
+            invoice_name=spec.invoice_name, language=spec.language, description=spec.description,
+            pdf_path=spec.pdf_path, csv_path=spec.csv_path, vat_rate=spec.vat_rate,
+            email=spec.email or None,
+        ) for spec in specs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one invoice per recipient from a line-item table.")
+    parser.add_argument("table", help="CSV, TSV or Excel file with recipient, description, quantity and price columns")
+    parser.add_argument("--output", default="invoices", help="Output folder (default: invoices)")
+    parser.add_argument("--invoice-name", default="", help="Optional title printed instead of FACTUUR/INVOICE")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Render processes to use; 0 means one per CPU core (default: 1)")
+    parser.add_argument("--profile", nargs="?", const="1", default=os.environ.get('INVOICE_PROFILE', ''),
+                        help="Time the stages of every invoice; 'cprofile' and/or 'tracemalloc' "
+                             "(comma-separated) add those captures (default: $INVOICE_PROFILE)")
+    parser.add_argument("--profile-json", default=os.environ.get('INVOICE_PROFILE_JSON'),
+                        help="Write the profile to this JSON file (default: $INVOICE_PROFILE_JSON)")
+    parser.add_argument("--zip", help="Also pack the run's PDFs and CSVs into this ZIP")
+    parser.add_argument("--merged-pdf", help="Also render the whole run into this one printable PDF")
+    parser.add_argument("--send", action="store_true", help="Mail every invoice to the address in the e-mail column")
+    add_smtp_arguments(parser)
+    args = parser.parse_args(argv)
+
+    addresses = {}
+    rejected = []
+    groups = read_groups(args.table, addresses=addresses, rejected=rejected)
+    if rejected:
+        print(describe_rejected(rejected))
+    if not groups:
+        print("No invoice lines found.")
+        return 1
+
+    workers = args.workers or os.cpu_count() or 1
+    profiler = Profiler.from_spec(args.profile, json_path=args.profile_json)
+    specs, elapsed = run_batch(groups, args.output, args.invoice_name, workers, profiler, addresses)
+
+    first, last = specs[0].invoice_number, specs[-1].invoice_number
+    rate = len(specs) / elapsed if elapsed > 0 else float('inf')
+    print(f"Generated {len(specs)} invoices (#{first}-#{last}) in {args.output} using {workers} worker(s)")
+    print(f"Elapsed: {elapsed:.2f}s ({rate:.1f} invoices/sec)")
+    profiler.report()
+    status = 0
+    if args.zip or args.merged_pdf:
+        from .export import main as export_main
+
+        export_args = ['--first', str(first), '--last', str(last)]
+        if args.zip:
+            export_args += ['--zip', args.zip]
+        if args.merged_pdf:
+            export_args += ['--pdf', args.merged_pdf]
+        status = export_main(export_args)
+    if args.send:
+        status = send_run(args, first, last) or status
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+"""
+Reading and writing invoice_config.json.
+
+The file is shared by every front end and batch run on the machine, so all
+access goes through an exclusive lock on a sibling .lock file and writes
+replace the file atomically: readers never see a half-written file and two
+generators can never hand out the same invoice number.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from .profiling import stage
+
+CONFIG_PATH = 'invoice_config.json'
+
+DEFAULT_DESCRIPTION = "Invoice for ice skating activities at DSSV ELS."
+
+DEFAULT_CONFIG = {
+    'last_invoice_number': 1,
+    'payment_terms_days': 14,
+    'language': 'nl',
+    'description': DEFAULT_DESCRIPTION,
+    'vat_rate': 0,  # percent included in the prices; 0 prints no VAT breakdown
+}
+
+
+@contextmanager
+def config_lock(path=CONFIG_PATH):
+    """Hold an exclusive, cross-process lock on the config file."""
+    with open(path + '.lock', 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK itself retries for about 10 seconds before giving up
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _read(path):
+    config = dict(DEFAULT_CONFIG)
+    with open(path, 'r') as f:
+        config.update(json.load(f))
+    return config
+
+
+def _write(config, path):
+    # Write a temporary file next to the config and rename it over the
+    # original, so the file is always either the old or the new version
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.invoice_config.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({key: config[key] for key in DEFAULT_CONFIG}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    Return the stored settings merged over DEFAULT_CONFIG. A missing file is
+    created with the defaults.
+    """
+    with stage('config'), config_lock(path):
+        try:
+            return _read(path)
+        except FileNotFoundError:
+            config = dict(DEFAULT_CONFIG)
+            _write(config, path)
+            return config
+
+
+def save_config(config, path=CONFIG_PATH):
+    """
+    Store the settings in config; settings missing from config keep their
+    stored value. The invoice counter never moves backwards: a front end
+    saving a changed setting with a stale number in memory keeps whatever
+    another generator has allocated since.
+    """
+    with stage('save_config'), config_lock(path):
+        try:
+            stored = _read(path)
+        except FileNotFoundError:
+            stored = dict(DEFAULT_CONFIG, last_invoice_number=config['last_invoice_number'])
+        merged = dict(stored, **config)
+        merged['last_invoice_number'] = max(config['last_invoice_number'], stored['last_invoice_number'])
+        _write(merged, path)
+
+
+def allocate_invoice_numbers(count=1, path=CONFIG_PATH):
+    """
+    Reserve count consecutive invoice numbers and return the first one.
+
+    'last_invoice_number' holds the next free number. It is read, advanced
+    and written back under the lock, so concurrent callers (desktop app,
+    web sessions, batch runs) always get disjoint blocks without gaps.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    with stage('allocate'), config_lock(path):
+        try:
+            config = _read(path)
+        except FileNotFoundError:
+            config = dict(DEFAULT_CONFIG)
+        first_number = config['last_invoice_number']
+        config['last_invoice_number'] = first_number + count
+        _write(config, path)
+    return first_number
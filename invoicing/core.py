@@ -0,0 +1,184 @@
+"""
+The invoice render path shared by main.py and webapp.py.
+
+fpdf is only imported when a PDF is actually rendered and CSVs are written
+with the standard library, so importing this module (or the invoicing
+package) stays cheap.
+"""
+import csv
+import os
+import re
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+
+from .config import DEFAULT_DESCRIPTION
+from .lines import LineStore, line_rows, line_total
+from .money import from_cents, line_amount_cents, to_cents
+from .profiling import stage
+from .render_cache import cache_key, get_render_cache
+from .translations import HEADER_INFO, TRANSLATIONS
+
+FONT_DIR = os.environ.get('INVOICE_FONT_DIR', r'C:\Windows\Fonts')
+
+TAHOMA_FONTS = {
+    '': os.path.join(FONT_DIR, 'tahoma.ttf'),
+    'B': os.path.join(FONT_DIR, 'tahomabd.ttf'),
+}
+
+
+def font_setup():
+    """
+    Return (font_family, font_files, currency) for the invoice text.
+
+    Tahoma when it is installed (the desktop app on Windows). Otherwise the
+    built-in Helvetica, which needs no font files but has no euro sign, so
+    amounts are printed with "EUR" instead.
+    """
+    if all(os.path.exists(path) for path in TAHOMA_FONTS.values()):
+        return 'Tahoma', TAHOMA_FONTS, '€'
+    return 'Helvetica', {}, 'EUR'
+
+
+def sanitize_filename(filename_str):
+    """
+    Sanitizes a string to be used as a filename.
+    Replaces spaces with underscores.
+    Removes characters that are not alphanumeric, underscore, hyphen, or period.
+    If the result is empty or invalid, returns a default name.
+    """
+    if not filename_str:
+        return "untitled"
+
+    s = str(filename_str).replace(" ", "_")
+    s = re.sub(r'[^\w\._-]', '', s)
+    s = s.strip('_-.') # Remove leading/trailing problematic chars
+
+    if not s or all(c in '_-.' for c in s):
+        # If empty after sanitization or only consists of separators
+        # (e.g. customer name was "...")
+        return "sanitized_recipient"
+
+    return s
+
+
+def creation_timestamp(creation_date=None):
+    """
+    The timestamp to put in a PDF's metadata as an aware datetime, or None
+    for the time of rendering. Defaults to $SOURCE_DATE_EPOCH (seconds since
+    1970, the reproducible-builds convention) when that is set. A date means
+    midnight and a naive datetime is taken as UTC, so the bytes do not depend
+    on the machine's time zone.
+    """
+    if creation_date is None:
+        epoch = os.environ.get('SOURCE_DATE_EPOCH', '').strip()
+        if not epoch:
+            return None
+        return datetime.fromtimestamp(int(epoch), timezone.utc)
+    if not isinstance(creation_date, datetime):
+        creation_date = datetime(creation_date.year, creation_date.month, creation_date.day)
+    if creation_date.tzinfo is None:
+        creation_date = creation_date.replace(tzinfo=timezone.utc)
+    return creation_date.astimezone(timezone.utc)
+
+
+def reproducible_dates(invoice_date, payment_terms_days=14):
+    """
+    (invoice_date, due_date, creation_date) for render_pdf's reproducible
+    mode, all following from the one invoice date a user picks: due
+    payment_terms_days later and created at its midnight (UTC).
+    """
+    if isinstance(invoice_date, datetime):
+        invoice_date = invoice_date.date()
+    return invoice_date, invoice_date + timedelta(days=payment_terms_days), invoice_date
+
+
+def make_line(description, quantity, price):
+    """One invoice line as a dict; price and amount are exact Decimals (see money.py)."""
+    price_cents = to_cents(price)
+    return {
+        'description': description,
+        'quantity': quantity,
+        'price': from_cents(price_cents),
+        'amount': from_cents(line_amount_cents(quantity, price_cents))
+    }
+
+
+def render_pdf(output, lines, customer_name, invoice_number, invoice_name="",
+               language='nl', payment_terms_days=14, description=DEFAULT_DESCRIPTION,
+               invoice_date=None, vat_rate=0, due_date=None, creation_date=None):
+    """
+    Render an invoice to output, a file path or a writable binary file object.
+    With a vat_rate (percent) the prices are taken to include VAT and the
+    total is broken down into net and VAT. Returns the invoice total as a Decimal.
+
+    invoice_date defaults to today and due_date to payment_terms_days after
+    it; creation_date is the timestamp in the PDF metadata (see
+    creation_timestamp). With all three given the PDF is reproducible: the
+    same inputs always give byte-identical files, so renders can be cached,
+    deduplicated and compared against golden files. The front ends offer
+    this as a mode with one chosen date (see reproducible_dates).
+
+    An invoice rendered before with exactly the same inputs is served from
+    the render cache (see render_cache.py). Lines given as an iterator or
+    generator are streamed into the PDF without the cache, since hashing
+    them for the key would use them up before they are drawn.
+    """
+    trans = TRANSLATIONS[language]
+    title = invoice_name or trans['invoice']
+    font_family, font_files, currency = font_setup()
+    invoice_date = invoice_date or datetime.now()
+    payment_due_date = due_date or invoice_date + timedelta(days=payment_terms_days)
+    creation_date = creation_timestamp(creation_date)
+
+    cache = get_render_cache() if isinstance(lines, (LineStore, Sequence)) else None
+    key = None
+    if cache is not None:
+        with stage('cache'):
+            key = cache_key(lines, customer_name, invoice_number, title, language, description,
+                            invoice_date, payment_due_date, vat_rate, font_family, currency, creation_date)
+            data = cache.get(key)
+        if data is not None:
+            _write_output(output, data)
+            return line_total(lines)
+
+    with stage('template'):
+        from . import template as invoice_template
+
+        template = invoice_template.get_template(trans, HEADER_INFO, description,
+                                                 font_family, font_files, currency)
+    with stage('fonts'):
+        pdf = template.new_document()
+    if creation_date is not None:
+        pdf.set_creation_date(creation_date)
+
+    with stage('layout'):
+        total = template.render(pdf, title, invoice_number, invoice_date, payment_due_date,
+                                customer_name, lines, vat_rate)
+    with stage('output'):
+        if key is None:
+            pdf.output(output)
+        else:
+            data = pdf.output()
+            _write_output(output, data)
+            cache.put(key, data)
+    return total
+
+
+def _write_output(output, data):
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'wb') as f:
+            f.write(data)
+    else:
+        output.write(data)
+
+
+CSV_COLUMNS = ['description', 'quantity', 'price', 'amount', 'invoice_number', 'customer_name', 'date']
+
+
+def write_csv(path, lines, customer_name, invoice_number, invoice_date=None):
+    """Write the invoice lines plus invoice number, recipient and date to a CSV file."""
+    date = (invoice_date or datetime.now()).strftime("%Y-%m-%d")
+    with stage('csv'), open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator=os.linesep)  # same line endings as pandas' to_csv
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows((*row, invoice_number, customer_name, date) for row in line_rows(lines))
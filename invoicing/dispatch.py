@@ -0,0 +1,285 @@
+"""
+Mail generated invoices to their recipients.
+
+The addresses come from an e-mail column in the batch input (see
+invoicing.batch) and are stored in the ledger with each invoice. Every
+invoice of a run that has an address and was not delivered yet is sent
+with its PDF attached, and every attempt is logged in the ledger, so an
+interrupted run can simply be started again:
+
+    with SMTPPool("smtp.example.org", 587, size=4, username=..., password=..., starttls=True) as pool:
+        with Ledger() as ledger:
+            result = dispatch(ledger, ledger.unsent_invoices(301, 1250), pool, sender)
+    print(result.summary())
+
+Messages go over a small pool of SMTP connections that stay open for the
+whole run, so connecting, TLS and login are paid once per connection
+instead of once per mail; the pool size is also the number of mails in
+flight. Temporary failures (dropped connections, 4xx replies) are retried
+with exponential backoff; permanent ones (5xx) are logged and skipped.
+
+From the command line:
+    python -m invoicing.dispatch --first 301 --last 1250
+    python -m invoicing.dispatch --first 301 --last 1250 --host localhost --port 8025 --connections 4
+
+The SMTP settings default to these environment variables:
+    INVOICE_SMTP_HOST (localhost), INVOICE_SMTP_PORT (25), INVOICE_SMTP_USER,
+    INVOICE_SMTP_PASSWORD, INVOICE_SMTP_STARTTLS=1, INVOICE_SMTP_SSL=1 and
+    INVOICE_SMTP_FROM (the address printed on the invoices).
+"""
+import argparse
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import EmailMessage
+from typing import NamedTuple
+
+from .config import DEFAULT_DESCRIPTION
+from .ledger import LEDGER_PATH, Ledger
+from .translations import HEADER_INFO, TRANSLATIONS
+
+RETRIES = 3
+BACKOFF = 1.0
+
+
+class SMTPPool:
+    """
+    Up to size SMTP connections, opened on first use and reused for every
+    following message. A connection that breaks is closed and replaced on
+    the next send; one whose message was refused is kept.
+    """
+
+    def __init__(self, host='localhost', port=25, size=1, username=None, password=None,
+                 starttls=False, ssl=False, timeout=30):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.ssl = ssl
+        self.timeout = timeout
+        self.connects = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+        connection = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password or '')
+        except BaseException:
+            connection.close()
+            raise
+        with self._lock:
+            self.connects += 1
+        return connection
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def send(self, message):
+        """Send one EmailMessage, waiting while all size connections are busy."""
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self._connect()
+            reuse = False
+            try:
+                connection.send_message(message)
+                reuse = True
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The server refused this message; the session itself is still fine
+                reuse = True
+                raise
+            finally:
+                if reuse:
+                    with self._lock:
+                        self._idle.append(connection)
+                else:
+                    self._quit(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._quit(connection)
+
+
+def is_transient(error):
+    """True for failures worth retrying: lost connections, timeouts and 4xx replies."""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # smtplib's own errors are OSErrors too; the rest are network errors
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def send_with_retry(pool, message, retries=RETRIES, backoff=BACKOFF):
+    """
+    Send message through pool, retrying transient failures up to retries
+    times after backoff, 2 * backoff, 4 * backoff, ... seconds (with jitter,
+    so parallel senders do not retry in lockstep). Returns the number of
+    attempts; raises the last error when the message could not be sent.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            pool.send(message)
+            return attempt
+        except Exception as e:
+            if attempt > retries or not is_transient(e):
+                e.attempts = attempt
+                raise
+        time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def build_message(invoice, sender):
+    """The e-mail for one ledger invoice, with its PDF attached."""
+    trans = TRANSLATIONS.get(invoice['language']) or TRANSLATIONS['nl']
+    title = invoice['invoice_name'] or trans['invoice'].capitalize()
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = invoice['email']
+    message['Subject'] = f"{title} {invoice['invoice_number']} - {HEADER_INFO['Name']}"
+    message.set_content(f"{invoice['description'] or DEFAULT_DESCRIPTION}\n\n{trans['payment_instructions']}.\n")
+    with open(invoice['pdf_path'], 'rb') as f:
+        message.add_attachment(f.read(), maintype='application', subtype='pdf',
+                               filename=os.path.basename(invoice['pdf_path']))
+    return message
+
+
+def _deliver(invoice, pool, sender, retries, backoff):
+    """(attempts, error text or None) for one invoice; never raises."""
+    try:
+        message = build_message(invoice, sender)
+    except OSError as e:
+        return 0, f"cannot read {invoice['pdf_path']}: {e}"
+    try:
+        return send_with_retry(pool, message, retries, backoff), None
+    except Exception as e:
+        return getattr(e, 'attempts', 1), f"{type(e).__name__}: {e}"
+
+
+class DispatchResult(NamedTuple):
+    sent: int
+    failed: int
+    seconds: float
+    connects: int
+
+    @property
+    def per_minute(self):
+        return self.sent / self.seconds * 60 if self.seconds > 0 else float('inf')
+
+    def summary(self):
+        return (f"Sent {self.sent} invoice(s), {self.failed} failed, in {self.seconds:.1f}s "
+                f"({self.per_minute:.0f} mails/minute over {self.connects} connection(s))")
+
+
+def dispatch(ledger, invoices, pool, sender, retries=RETRIES, backoff=BACKOFF, progress=None):
+    """
+    Mail invoices (ledger header dicts with an 'email') through pool, with
+    pool.size messages in flight, and log every outcome in ledger.
+    progress(invoice, error) is called after each one. Returns a DispatchResult.
+    """
+    sent = failed = 0
+    connects = pool.connects
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = {executor.submit(_deliver, invoice, pool, sender, retries, backoff): invoice
+                   for invoice in invoices}
+        # Ledger writes stay on this thread, which owns the SQLite connection
+        for future in as_completed(futures):
+            invoice = futures[future]
+            attempts, error = future.result()
+            ledger.record_delivery(invoice['invoice_number'], invoice['email'], attempts, error)
+            if error is None:
+                sent += 1
+            else:
+                failed += 1
+            if progress is not None:
+                progress(invoice, error)
+    return DispatchResult(sent, failed, time.perf_counter() - start, pool.connects - connects)
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def add_smtp_arguments(parser):
+    """The SMTP options shared by the dispatch and batch command lines."""
+    parser.add_argument("--host", default=os.environ.get('INVOICE_SMTP_HOST', 'localhost'),
+                        help="SMTP server (default: $INVOICE_SMTP_HOST or localhost)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('INVOICE_SMTP_PORT', 25)),
+                        help="SMTP port (default: $INVOICE_SMTP_PORT or 25)")
+    parser.add_argument("--user", default=os.environ.get('INVOICE_SMTP_USER'),
+                        help="SMTP login; the password is read from $INVOICE_SMTP_PASSWORD")
+    parser.add_argument("--starttls", action="store_true", default=_env_flag('INVOICE_SMTP_STARTTLS'),
+                        help="Upgrade the connection with STARTTLS")
+    parser.add_argument("--ssl", action="store_true", default=_env_flag('INVOICE_SMTP_SSL'),
+                        help="Connect with implicit TLS (usually port 465)")
+    parser.add_argument("--sender", default=os.environ.get('INVOICE_SMTP_FROM', HEADER_INFO['Mail']),
+                        help=f"From address (default: $INVOICE_SMTP_FROM or {HEADER_INFO['Mail']})")
+    parser.add_argument("--connections", type=int, default=2,
+                        help="SMTP connections, i.e. mails in flight (default: 2)")
+    parser.add_argument("--retries", type=int, default=RETRIES,
+                        help=f"Retries of a temporary failure (default: {RETRIES})")
+    parser.add_argument("--backoff", type=float, default=BACKOFF,
+                        help=f"Seconds before the first retry, doubling after that (default: {BACKOFF})")
+
+
+def pool_from_args(args):
+    return SMTPPool(args.host, args.port, max(1, args.connections), args.user,
+                    os.environ.get('INVOICE_SMTP_PASSWORD'), args.starttls, args.ssl)
+
+
+def send_run(args, first, last, ledger_path=LEDGER_PATH):
+    """Mail the unsent invoices numbered first..last with the SMTP settings in args; returns an exit code."""
+    with Ledger(ledger_path) as ledger:
+        invoices = ledger.unsent_invoices(first, last)
+        if not invoices:
+            print("No unsent invoices with an e-mail address in this range.")
+            return 0
+        with pool_from_args(args) as pool:
+            result = dispatch(ledger, invoices, pool, args.sender, args.retries, args.backoff)
+    print(result.summary())
+    if result.failed:
+        print(f"See `python -m invoicing.ledger invoice <number>` for the errors; "
+              f"running this again retries the {result.failed} failed invoice(s)")
+    return 1 if result.failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mail the invoices of a run to their recipients.")
+    parser.add_argument("--ledger", default=LEDGER_PATH, help=f"Ledger file (default: {LEDGER_PATH})")
+    parser.add_argument("--first", type=int, default=0, help="First invoice number to send")
+    parser.add_argument("--last", type=int, default=2 ** 62, help="Last invoice number to send")
+    add_smtp_arguments(parser)
+    args = parser.parse_args(argv)
+    return send_run(args, args.first, args.last, args.ledger)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
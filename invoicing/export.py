@@ -0,0 +1,137 @@
+"""
+Export a billing run as one file instead of hundreds of loose ones.
+
+A run is a set of invoices from the ledger, e.g. one batch (a range of
+invoice numbers) or everything issued between two dates:
+
+    with Ledger() as ledger:
+        invoices = ledger.invoices_numbered(301, 1250)
+        export_zip("run.zip", invoices)                # the PDFs and CSVs as they are on disk
+        export_merged_pdf("run.pdf", ledger, invoices)  # every invoice in one printable PDF
+
+Both write incrementally. The ZIP copies one file at a time in chunks and
+stores the PDFs uncompressed (they are compressed already), so memory use
+does not grow with the run. The merged PDF is rendered again from the
+ledger into a single document that embeds the fonts and logo once. fpdf
+keeps the page contents of the document in memory until it is written,
+which is a few KB per page, instead of a full PDF per invoice.
+
+From the command line:
+    python -m invoicing.export --first 301 --last 1250 --zip run.zip --pdf run.pdf
+    python -m invoicing.export --start 2025-09-01 --end 2025-10-01 --zip september.zip
+"""
+import argparse
+import os
+import zipfile
+from datetime import date, datetime, timedelta
+
+from .config import DEFAULT_DESCRIPTION
+from .core import creation_timestamp, font_setup
+from .ledger import LEDGER_PATH, Ledger
+from .lines import LineStore
+from .translations import HEADER_INFO, TRANSLATIONS
+
+
+def export_zip(target, invoices, include_csv=True):
+    """
+    Write the PDF (and CSV) files of invoices (ledger header dicts) into a
+    ZIP at target, a path or a writable binary file. Files that are no
+    longer on disk are skipped. Returns (files written, paths missing).
+    """
+    written, missing = 0, []
+    with zipfile.ZipFile(target, 'w') as archive:
+        for invoice in invoices:
+            for key, compression in (('pdf_path', zipfile.ZIP_STORED), ('csv_path', zipfile.ZIP_DEFLATED)):
+                path = invoice.get(key)
+                if not path or (key == 'csv_path' and not include_csv):
+                    continue
+                if not os.path.exists(path):
+                    missing.append(path)
+                    continue
+                archive.write(path, os.path.basename(path), compress_type=compression)
+                written += 1
+    return written, missing
+
+
+def _date(value, default=None):
+    if not value:
+        return default
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def export_merged_pdf(target, ledger, invoices, creation_date=None):
+    """
+    Render invoices (ledger header dicts) again, one after another in a
+    single PDF at target, a path or a writable binary file. Each invoice
+    starts on a new page; creation_date is as for render_pdf. Returns the
+    number of invoices rendered.
+    """
+    from . import template as invoice_template
+
+    font_family, font_files, currency = font_setup()
+    creation_date = creation_timestamp(creation_date)
+    pdf = None
+    count = 0
+    for header in invoices:
+        invoice = ledger.get_invoice(header['invoice_number'])
+        language = invoice['language'] if invoice['language'] in TRANSLATIONS else 'nl'
+        trans = TRANSLATIONS[language]
+        template = invoice_template.get_template(trans, HEADER_INFO, invoice['description'] or DEFAULT_DESCRIPTION,
+                                                 font_family, font_files, currency)
+        if pdf is None:
+            pdf = template.new_document()
+            if creation_date is not None:
+                pdf.set_creation_date(creation_date)
+        else:
+            pdf.add_page('P', 'A4')
+        invoice_date = _date(invoice['invoice_date'])
+        due_date = _date(invoice['due_date'], invoice_date + timedelta(days=14))
+        template.render(pdf, invoice['invoice_name'] or trans['invoice'], invoice['invoice_number'],
+                        invoice_date, due_date, invoice['customer_name'], LineStore(invoice['lines']),
+                        invoice['vat_rate'])
+        count += 1
+    if pdf is not None:
+        pdf.output(target)
+    return count
+
+
+def select_invoices(ledger, first=None, last=None, start=None, end=None):
+    """Ledger headers by invoice number range (inclusive) or by date (start <= date < end)."""
+    if first is not None or last is not None:
+        return ledger.invoices_numbered(first if first is not None else 0,
+                                        last if last is not None else 2 ** 62)
+    return ledger.invoices_between(start, end)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a billing run as a ZIP and/or one merged PDF.")
+    parser.add_argument("--ledger", default=LEDGER_PATH, help=f"Ledger file (default: {LEDGER_PATH})")
+    parser.add_argument("--first", type=int, help="First invoice number of the run")
+    parser.add_argument("--last", type=int, help="Last invoice number of the run")
+    parser.add_argument("--start", type=date.fromisoformat, help="First invoice date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="First invoice date to exclude (YYYY-MM-DD)")
+    parser.add_argument("--zip", help="Write the PDFs and CSVs into this ZIP")
+    parser.add_argument("--no-csv", action="store_true", help="Leave the CSVs out of the ZIP")
+    parser.add_argument("--pdf", help="Render every invoice into this one PDF")
+    args = parser.parse_args(argv)
+    if not args.zip and not args.pdf:
+        parser.error("nothing to do: give --zip and/or --pdf")
+
+    with Ledger(args.ledger) as ledger:
+        invoices = select_invoices(ledger, args.first, args.last, args.start, args.end)
+        if not invoices:
+            print("No invoices in the ledger for this selection.")
+            return 1
+        if args.zip:
+            written, missing = export_zip(args.zip, invoices, not args.no_csv)
+            print(f"Wrote {written} files of {len(invoices)} invoices to {args.zip}")
+            if missing:
+                print(f"{len(missing)} files were missing, e.g. {missing[0]}")
+        if args.pdf:
+            count = export_merged_pdf(args.pdf, ledger, invoices)
+            print(f"Rendered {count} invoices into {args.pdf}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
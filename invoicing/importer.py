@@ -0,0 +1,243 @@
+"""
+Streaming import of invoice lines from CSV, TSV and Excel files.
+
+The column mapping is resolved once from the header row (English and Dutch
+names, see COLUMN_ALIASES) and every chunk is converted column by column,
+so full-season exports with 100k+ rows load in bounded memory:
+
+    rejected = []
+    import_lines(manager.invoice_lines, "season.xlsx", rejected=rejected)
+
+Numbers may be written the Dutch way ("7,50", "1.234,56") and CSV files may
+be separated by semicolons, as Dutch spreadsheet exports are. Rows whose
+quantity or price is still not a number are not imported; they are
+collected in rejected with their row number, for the front end to show.
+
+pandas (and openpyxl for .xlsx) are imported on first use.
+"""
+import os
+from typing import NamedTuple
+
+# Accepted headers per field, compared case-insensitively
+COLUMN_ALIASES = {
+    'recipient': ['recipient', 'ontvanger', 'customer_name', 'name', 'naam'],
+    'description': ['description', 'omschrijving'],
+    'quantity': ['quantity', 'aantal', 'qty'],
+    'price': ['price', 'prijs', 'stukprijs'],
+    'email': ['email', 'e-mail', 'mail', 'emailadres', 'e-mailadres'],
+}
+
+LINE_FIELDS = ('description', 'quantity', 'price')
+
+CHUNK_SIZE = 50_000
+
+
+class RejectedRow(NamedTuple):
+    """A row left out of an import because its quantity or price is not a number."""
+    row: int  # as numbered in the file, the header being row 1
+    description: str
+    quantity: str
+    price: str
+
+    def __str__(self):
+        return f"row {self.row}: {self.description!r}, quantity {self.quantity!r}, price {self.price!r}"
+
+
+def resolve_columns(columns, fields=LINE_FIELDS, positional=False):
+    """
+    Map each of fields to the matching entry of columns (a header row).
+
+    With positional=True a field without a recognised header falls back to
+    the column at its position in fields, like a headerless paste of
+    description, quantity, price; otherwise a missing field raises ValueError.
+    """
+    columns = list(columns)
+    by_lower = {str(col).strip().lower(): col for col in columns}
+    mapping = {}
+    for position, field in enumerate(fields):
+        for alias in COLUMN_ALIASES[field]:
+            if alias in by_lower:
+                mapping[field] = by_lower[alias]
+                break
+        else:
+            if positional and position < len(columns):
+                mapping[field] = columns[position]
+            else:
+                raise ValueError(f"No column found for '{field}' "
+                                 f"(expected one of: {', '.join(COLUMN_ALIASES[field])})")
+    return mapping
+
+
+def _file_type(source, name=None):
+    name = name or getattr(source, 'name', None) or (source if isinstance(source, str) else '')
+    return os.path.splitext(str(name))[1].lower()
+
+
+def _csv_separator(source, ext):
+    """Tab for .tsv; otherwise a semicolon when the header line has more of those than commas."""
+    if ext == '.tsv':
+        return '\t'
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            header = f.readline()
+    else:
+        position = source.tell()
+        header = source.readline()
+        source.seek(position)
+    if isinstance(header, bytes):
+        header = header.decode('utf-8', errors='replace')
+    return ';' if header.count(';') > header.count(',') else ','
+
+
+def _iter_xlsx(source, chunksize):
+    import openpyxl
+    import pandas as pd
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        chunk = []
+        start = 0  # numbered on across chunks, like read_csv does, so rejected rows keep their row number
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunksize:
+                yield pd.DataFrame(chunk, columns=header, index=range(start, start + len(chunk)))
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, index=range(start, start + len(chunk)))
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, chunksize=CHUNK_SIZE, name=None):
+    """
+    Yield DataFrames of at most chunksize rows from a CSV, TSV or Excel file.
+
+    source is a path or a binary file object (e.g. a Streamlit upload); the
+    file type comes from name, the object's name or the path. .xlsx files are
+    read row by row in openpyxl's read-only mode; legacy .xls files can only
+    be read whole. CSV files may be separated by commas or semicolons.
+    """
+    import pandas as pd
+
+    ext = _file_type(source, name)
+    if ext == '.xlsx':
+        yield from _iter_xlsx(source, chunksize)
+    elif ext == '.xls':
+        yield pd.read_excel(source)
+    else:
+        yield from pd.read_csv(source, sep=_csv_separator(source, ext), chunksize=chunksize)
+
+
+def parse_numbers(values):
+    """
+    A column of numbers as floats, NaN where a value is missing or not a
+    number. Text is read the Dutch way when its last separator is a comma,
+    so "7,50" is 7.5 and "1.234,56" is 1234.56, while "1,234.56" is still
+    1234.56. Euro signs, "EUR" and spaces are ignored.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_numeric(values, errors='coerce').astype(float)
+    text = values.astype('string').str.replace(r'(?i)[€\s]|eur', '', regex=True)
+    comma_decimal = text.str.contains(r',\d*$', na=False)
+    text = text.where(~comma_decimal, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    text = text.where(comma_decimal, text.str.replace(',', '', regex=False))
+    return pd.to_numeric(text, errors='coerce').astype(float)
+
+
+def _cell(value):
+    import pandas as pd
+
+    return '' if pd.isna(value) else str(value)
+
+
+def convert_frame(df, columns, rejected=None):
+    """
+    Normalise df to one column per mapped field (named after the field) plus
+    'price_cents' and 'amount_cents'. Quantity and price are parsed as whole
+    columns (see parse_numbers); a quantity of 0 is kept as a line of 0.
+
+    Rows where either is missing or not a number are left out. With a list
+    rejected they are appended to it as RejectedRow, apart from rows that
+    are empty altogether.
+    """
+    import pandas as pd
+
+    from .money import line_amount_cents_array, to_cents_array
+
+    quantity = parse_numbers(df[columns['quantity']])
+    price = parse_numbers(df[columns['price']])
+    valid = quantity.notna() & price.notna()
+    if rejected is not None and not valid.all():
+        line_columns = [columns[field] for field in LINE_FIELDS]
+        bad = df.loc[~valid, line_columns]
+        bad = bad[bad.notna().any(axis=1)]
+        for row, description, quantity_text, price_text in bad.itertuples(name=None):
+            rejected.append(RejectedRow(row + 2, _cell(description), _cell(quantity_text), _cell(price_text)))
+    result = pd.DataFrame({field: df[column][valid] for field, column in columns.items()})
+    result['description'] = result['description'].fillna('').astype(str)
+    result['quantity'] = quantity[valid].astype(float)
+    result['price'] = price[valid].astype(float)
+    result['price_cents'] = to_cents_array(result['price'])
+    result['amount_cents'] = line_amount_cents_array(result['quantity'], result['price_cents'])
+    return result
+
+
+def lines_from_frame(df, columns, rejected=None):
+    """Convert a DataFrame into invoice lines (dicts as made by make_line, money as Decimal)."""
+    from .money import from_cents
+
+    df = convert_frame(df, columns, rejected)
+    return [
+        {'description': d, 'quantity': q, 'price': from_cents(p), 'amount': from_cents(a)}
+        for d, q, p, a in zip(df['description'].tolist(), df['quantity'].tolist(),
+                              df['price_cents'].tolist(), df['amount_cents'].tolist())
+    ]
+
+
+def iter_lines(source, chunksize=CHUNK_SIZE, name=None, rejected=None):
+    """Yield lists of invoice lines, one list per chunk of the file."""
+    columns = None
+    for chunk in read_chunks(source, chunksize, name):
+        if columns is None:
+            columns = resolve_columns(chunk.columns)
+        yield lines_from_frame(chunk, columns, rejected)
+
+
+def extend_store(store, df, columns, rejected=None):
+    """Bulk-append the lines of df to a LineStore, column by column. Returns the number added."""
+    df = convert_frame(df, columns, rejected)
+    store.extend_columns(df['description'].tolist(), df['quantity'].tolist(),
+                         df['price_cents'].tolist(), df['amount_cents'].tolist())
+    return len(df)
+
+
+def import_lines(store, source, chunksize=CHUNK_SIZE, name=None, rejected=None):
+    """Stream a file into a LineStore chunk by chunk. Returns the number of lines added."""
+    added = 0
+    columns = None
+    for chunk in read_chunks(source, chunksize, name):
+        if columns is None:
+            columns = resolve_columns(chunk.columns)
+        added += extend_store(store, chunk, columns, rejected)
+    return added
+
+
+def read_lines(source, chunksize=CHUNK_SIZE, name=None, rejected=None):
+    """All invoice lines of a file as one list."""
+    return [line for lines in iter_lines(source, chunksize, name, rejected) for line in lines]
+
+
+def describe_rejected(rejected, limit=10):
+    """A message listing the first limit rejected rows, for a front end to show."""
+    lines = [f"{len(rejected)} row(s) not imported, their quantity or price is not a number:"]
+    lines += [str(row) for row in rejected[:limit]]
+    if len(rejected) > limit:
+        lines.append(f"... and {len(rejected) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,368 @@
+"""
+Embedded SQLite ledger of every issued invoice.
+
+The per-invoice CSVs in invoices/ stay as they are for the treasurer, but
+questions like "what has member X been billed this year" are answered from
+one indexed database instead of globbing and parsing thousands of files.
+
+    with Ledger() as ledger:
+        ledger.record_invoice(27, "Jane Doe", lines, date.today())
+        ledger.invoices_for("Jane Doe", start="2025-01-01")
+
+One-time import of the existing CSVs:
+    python -m invoicing.ledger import invoices
+Queries from the command line:
+    python -m invoicing.ledger customer "Jane Doe" --start 2025-01-01
+    python -m invoicing.ledger invoice 27
+"""
+import argparse
+import csv
+import glob
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from .lines import line_rows
+from .money import from_cents, to_cents
+from .profiling import stage
+
+LEDGER_PATH = os.path.join('invoices', 'ledger.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    invoice_number INTEGER PRIMARY KEY,
+    customer_name  TEXT NOT NULL,
+    invoice_date   TEXT NOT NULL,  -- YYYY-MM-DD
+    due_date       TEXT,
+    invoice_name   TEXT,
+    language       TEXT,
+    description    TEXT,
+    total          REAL NOT NULL,
+    pdf_path       TEXT,
+    csv_path       TEXT,
+    vat_rate       REAL NOT NULL DEFAULT 0,  -- percent included in the prices
+    email          TEXT
+);
+CREATE TABLE IF NOT EXISTS invoice_lines (
+    invoice_number INTEGER NOT NULL REFERENCES invoices(invoice_number) ON DELETE CASCADE,
+    position       INTEGER NOT NULL,
+    description    TEXT,
+    quantity       REAL,
+    price          REAL,
+    amount         REAL,
+    PRIMARY KEY (invoice_number, position)
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_customer_date ON invoices(customer_name, invoice_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(invoice_date);
+CREATE TABLE IF NOT EXISTS deliveries (
+    invoice_number INTEGER NOT NULL REFERENCES invoices(invoice_number) ON DELETE CASCADE,
+    address        TEXT NOT NULL,
+    sent_at        TEXT NOT NULL,  -- YYYY-MM-DDTHH:MM:SS, local time
+    attempts       INTEGER NOT NULL,
+    error          TEXT             -- NULL when the mail was accepted
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_invoice ON deliveries(invoice_number);
+CREATE TABLE IF NOT EXISTS payments (
+    invoice_number INTEGER NOT NULL REFERENCES invoices(invoice_number) ON DELETE CASCADE,
+    reference      TEXT NOT NULL,  -- the bank's transaction reference
+    paid_on        TEXT NOT NULL,  -- YYYY-MM-DD, booking date
+    amount         REAL NOT NULL,
+    payer          TEXT,
+    PRIMARY KEY (reference, invoice_number)
+);
+CREATE INDEX IF NOT EXISTS idx_payments_invoice ON payments(invoice_number);
+"""
+
+INVOICE_COLUMNS = ('invoice_number', 'customer_name', 'invoice_date', 'due_date', 'invoice_name',
+                   'language', 'description', 'total', 'pdf_path', 'csv_path', 'vat_rate', 'email')
+
+# Columns added after the first release, created on ledgers that predate them
+ADDED_COLUMNS = {
+    'vat_rate': "REAL NOT NULL DEFAULT 0",
+    'email': "TEXT",
+}
+
+
+def _iso(value):
+    return value.isoformat()[:10] if hasattr(value, 'isoformat') else value
+
+
+class Ledger:
+    def __init__(self, path=LEDGER_PATH):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Autocommit mode; transactions are opened explicitly with BEGIN
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        # WAL lets the web app read while the desktop app or a batch run writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {row['name'] for row in self.connection.execute("PRAGMA table_info(invoices)")}
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in columns:
+                self.connection.execute(f"ALTER TABLE invoices ADD COLUMN {name} {definition}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _transaction(self):
+        return _Transaction(self.connection)
+
+    # Writing
+
+    def record_invoice(self, invoice_number, customer_name, lines, invoice_date, due_date=None,
+                       invoice_name="", language=None, description=None, pdf_path=None, csv_path=None,
+                       vat_rate=0, email=None):
+        """Store one invoice header and its lines in a single transaction."""
+        self.record_many([dict(
+            invoice_number=invoice_number, customer_name=customer_name, lines=lines,
+            invoice_date=invoice_date, due_date=due_date, invoice_name=invoice_name,
+            language=language, description=description, pdf_path=pdf_path, csv_path=csv_path,
+            vat_rate=vat_rate, email=email,
+        )])
+
+    def record_many(self, invoices, replace=True):
+        """
+        Store several invoices (dicts with the record_invoice arguments) in one
+        transaction. With replace=False invoices already in the ledger are
+        left untouched. Returns the number of invoices written.
+        """
+        written = 0
+        with stage('ledger'), self._transaction() as cursor:
+            for invoice in invoices:
+                lines = list(line_rows(invoice['lines']))
+                row = dict(invoice)
+                row['invoice_date'] = _iso(row['invoice_date'])
+                row['due_date'] = _iso(row.get('due_date'))
+                row['vat_rate'] = row.get('vat_rate') or 0
+                row['total'] = float(from_cents(sum(to_cents(amount) for *_, amount in lines)))
+                values = [row.get(column) for column in INVOICE_COLUMNS]
+                if replace:
+                    cursor.execute("DELETE FROM invoice_lines WHERE invoice_number = ?", (row['invoice_number'],))
+                    # An upsert rather than INSERT OR REPLACE, whose delete would cascade to the
+                    # deliveries and payments of the invoice
+                    cursor.execute(f"INSERT INTO invoices ({', '.join(INVOICE_COLUMNS)}) "
+                                   f"VALUES ({', '.join('?' * len(INVOICE_COLUMNS))}) "
+                                   f"ON CONFLICT (invoice_number) DO UPDATE SET "
+                                   f"{', '.join(f'{c} = excluded.{c}' for c in INVOICE_COLUMNS[1:])}", values)
+                else:
+                    cursor.execute(f"INSERT OR IGNORE INTO invoices ({', '.join(INVOICE_COLUMNS)}) "
+                                   f"VALUES ({', '.join('?' * len(INVOICE_COLUMNS))})", values)
+                    if cursor.rowcount == 0:
+                        continue
+                cursor.executemany(
+                    "INSERT INTO invoice_lines (invoice_number, position, description, quantity, price, amount) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(row['invoice_number'], position, str(description), float(quantity), float(price), float(amount))
+                     for position, (description, quantity, price, amount) in enumerate(lines)],
+                )
+                written += 1
+        return written
+
+    def record_delivery(self, invoice_number, address, attempts, error=None, sent_at=None):
+        """Log one attempt to mail an invoice; error is None when the server accepted it."""
+        sent_at = (sent_at or datetime.now()).isoformat(timespec='seconds')
+        with self._transaction() as cursor:
+            cursor.execute("INSERT INTO deliveries (invoice_number, address, sent_at, attempts, error) "
+                           "VALUES (?, ?, ?, ?, ?)", (invoice_number, address, sent_at, attempts, error))
+
+    def record_payments(self, payments):
+        """
+        Store (invoice_number, reference, paid_on, amount_cents, payer) rows in
+        one transaction; a reference already recorded for that invoice is
+        skipped. Returns the number of payments written.
+        """
+        with self._transaction() as cursor:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO payments (invoice_number, reference, paid_on, amount, payer) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(number, reference, _iso(paid_on), float(from_cents(cents)), payer)
+                 for number, reference, paid_on, cents, payer in payments])
+            return cursor.rowcount
+
+    # Reading
+
+    def get_invoice(self, invoice_number):
+        """The invoice header as a dict with a 'lines' list, or None."""
+        row = self.connection.execute(
+            "SELECT * FROM invoices WHERE invoice_number = ?", (invoice_number,)).fetchone()
+        if row is None:
+            return None
+        invoice = dict(row)
+        invoice['lines'] = [dict(line) for line in self.connection.execute(
+            "SELECT description, quantity, price, amount FROM invoice_lines "
+            "WHERE invoice_number = ? ORDER BY position", (invoice_number,))]
+        return invoice
+
+    def invoices_for(self, customer_name, start=None, end=None):
+        """Invoice headers for one recipient, optionally limited to start <= date < end."""
+        query = "SELECT * FROM invoices WHERE customer_name = ?"
+        params = [customer_name]
+        query, params = self._date_filter(query, params, start, end)
+        return [dict(row) for row in self.connection.execute(query + " ORDER BY invoice_date, invoice_number", params)]
+
+    def invoices_numbered(self, first, last):
+        """Invoice headers with first <= invoice_number <= last, e.g. one batch run."""
+        return [dict(row) for row in self.connection.execute(
+            "SELECT * FROM invoices WHERE invoice_number BETWEEN ? AND ? ORDER BY invoice_number", (first, last))]
+
+    def unsent_invoices(self, first, last):
+        """Invoices numbered first..last with an e-mail address and no accepted delivery yet."""
+        return [dict(row) for row in self.connection.execute(
+            "SELECT * FROM invoices WHERE invoice_number BETWEEN ? AND ? AND COALESCE(email, '') != '' "
+            "AND NOT EXISTS (SELECT 1 FROM deliveries WHERE deliveries.invoice_number = invoices.invoice_number "
+            "AND deliveries.error IS NULL) ORDER BY invoice_number", (first, last))]
+
+    def deliveries(self, invoice_number):
+        """Every logged mail attempt for one invoice, oldest first."""
+        return [dict(row) for row in self.connection.execute(
+            "SELECT * FROM deliveries WHERE invoice_number = ? ORDER BY sent_at, rowid", (invoice_number,))]
+
+    def payments(self, invoice_number):
+        """Every payment booked on one invoice, oldest first."""
+        return [dict(row) for row in self.connection.execute(
+            "SELECT * FROM payments WHERE invoice_number = ? ORDER BY paid_on, rowid", (invoice_number,))]
+
+    def payment_references(self):
+        """The bank references of every recorded payment."""
+        return {row[0] for row in self.connection.execute("SELECT DISTINCT reference FROM payments")}
+
+    def open_invoices(self):
+        """
+        Number, recipient, total_cents and paid_cents of every invoice not
+        paid in full.
+        """
+        return [dict(row) for row in self.connection.execute(
+            "SELECT i.invoice_number, i.customer_name, CAST(ROUND(i.total * 100) AS INTEGER) AS total_cents, "
+            "COALESCE(p.paid_cents, 0) AS paid_cents FROM invoices i LEFT JOIN "
+            "(SELECT invoice_number, SUM(CAST(ROUND(amount * 100) AS INTEGER)) AS paid_cents FROM payments "
+            "GROUP BY invoice_number) p USING (invoice_number) "
+            "WHERE CAST(ROUND(i.total * 100) AS INTEGER) > COALESCE(p.paid_cents, 0) ORDER BY i.invoice_number")]
+
+    def invoices_between(self, start=None, end=None):
+        """Invoice headers with start <= invoice_date < end."""
+        query, params = self._date_filter("SELECT * FROM invoices WHERE 1", [], start, end)
+        return [dict(row) for row in self.connection.execute(query + " ORDER BY invoice_date, invoice_number", params)]
+
+    def total_billed(self, customer_name, start=None, end=None):
+        """Exact sum (Decimal) of the invoice totals for one recipient."""
+        # Totals are stored with two decimals; summing them as cents keeps the result exact
+        query = "SELECT COALESCE(SUM(CAST(ROUND(total * 100) AS INTEGER)), 0) FROM invoices WHERE customer_name = ?"
+        query, params = self._date_filter(query, [customer_name], start, end)
+        return from_cents(self.connection.execute(query, params).fetchone()[0])
+
+    @staticmethod
+    def _date_filter(query, params, start, end):
+        if start is not None:
+            query += " AND invoice_date >= ?"
+            params.append(_iso(start))
+        if end is not None:
+            query += " AND invoice_date < ?"
+            params.append(_iso(end))
+        return query, params
+
+    # Importing
+
+    def import_csv_dir(self, directory='invoices'):
+        """
+        Load the CSVs written by write_csv (one file per invoice) into the
+        ledger. Invoices already present are skipped, so the import can be
+        re-run safely. Test invoices (*_TEST.csv) are ignored.
+        Returns the number of invoices imported.
+        """
+        def read_invoices():
+            for csv_path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+                if csv_path.endswith('_TEST.csv'):
+                    continue
+                with open(csv_path, newline='', encoding='utf-8') as f:
+                    rows = list(csv.DictReader(f))
+                if not rows:
+                    continue
+                pdf_path = csv_path[:-4] + '.pdf'
+                yield dict(
+                    invoice_number=int(rows[0]['invoice_number']),
+                    customer_name=rows[0]['customer_name'],
+                    invoice_date=rows[0]['date'],
+                    lines=rows,
+                    pdf_path=pdf_path if os.path.exists(pdf_path) else None,
+                    csv_path=csv_path,
+                )
+        return self.record_many(read_invoices(), replace=False)
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        return self.cursor
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cursor.execute("ROLLBACK" if exc_type else "COMMIT")
+        self.cursor.close()
+
+
+def record_invoice(invoice_number, customer_name, lines, payment_terms_days=14, path=LEDGER_PATH, **details):
+    """Record one invoice issued today in the default ledger."""
+    today = date.today()
+    with Ledger(path) as ledger:
+        ledger.record_invoice(invoice_number, customer_name, lines, today,
+                              today + timedelta(days=payment_terms_days), **details)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or fill the invoice ledger.")
+    parser.add_argument("--ledger", default=LEDGER_PATH, help=f"Ledger file (default: {LEDGER_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import existing invoice CSVs")
+    import_parser.add_argument("directory", nargs="?", default="invoices")
+    customer_parser = commands.add_parser("customer", help="list invoices for a recipient")
+    customer_parser.add_argument("name")
+    customer_parser.add_argument("--start", help="first date to include (YYYY-MM-DD)")
+    customer_parser.add_argument("--end", help="first date to exclude (YYYY-MM-DD)")
+    invoice_parser = commands.add_parser("invoice", help="show one invoice")
+    invoice_parser.add_argument("number", type=int)
+    args = parser.parse_args(argv)
+
+    with Ledger(args.ledger) as ledger:
+        if args.command == "import":
+            print(f"Imported {ledger.import_csv_dir(args.directory)} invoices from {args.directory}")
+        elif args.command == "customer":
+            invoices = ledger.invoices_for(args.name, args.start, args.end)
+            for invoice in invoices:
+                print(f"#{invoice['invoice_number']:<6} {invoice['invoice_date']}  {invoice['total']:10.2f}")
+            print(f"{len(invoices)} invoices, total {sum(i['total'] for i in invoices):.2f}")
+        else:
+            invoice = ledger.get_invoice(args.number)
+            if invoice is None:
+                print(f"Invoice {args.number} not found")
+                return 1
+            print(f"#{invoice['invoice_number']} {invoice['customer_name']} {invoice['invoice_date']}")
+            for line in invoice['lines']:
+                print(f"  {line['description']:40} {line['quantity']:>6g} x {line['price']:8.2f} = {line['amount']:9.2f}")
+            print(f"  total {invoice['total']:.2f}")
+            for delivery in ledger.deliveries(args.number):
+                outcome = f"failed: {delivery['error']}" if delivery['error'] else "sent"
+                print(f"  mailed to {delivery['address']} {delivery['sent_at']} "
+                      f"({delivery['attempts']} attempt(s)) {outcome}")
+            for payment in ledger.payments(args.number):
+                print(f"  paid {payment['amount']:.2f} on {payment['paid_on']} by {payment['payer'] or '?'} "
+                      f"({payment['reference']})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,213 @@
+"""
+Compact, column-oriented store for invoice lines.
+
+Descriptions live in a list, quantities in an array('d') column and prices
+and amounts in array('q') columns of integer cents (see money.py), so an
+invoice with thousands of participant lines costs a few dozen bytes per
+line instead of a dict per line. The running total is kept up to date on
+every change as an exact integer, so reading it is O(1). Every line also
+gets an ID that stays the same while lines before it are removed and is
+never reused, so a front end can refer to a row without stale indices.
+
+Existing callers that treat the lines as a list of dicts keep working:
+
+    lines = LineStore()
+    lines.append("Skate rental", 2, 7.5)
+    lines[0]['amount']          # Decimal('15.00'), through a read-only dict-like view
+    lines.total                 # Decimal('15.00')
+    lines.index_of(lines.ids[0])  # 0
+    for description, quantity, price, amount in lines.rows(): ...
+"""
+from array import array
+from collections.abc import Mapping
+
+from .money import from_cents, line_amount_cents, to_cents
+
+LINE_FIELDS = ('description', 'quantity', 'price', 'amount')
+
+
+class LineView(Mapping):
+    """Read-only dict-like view of one line in a LineStore."""
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key):
+        store, index = self._store, self._index
+        if key == 'description':
+            return store.descriptions[index]
+        if key == 'quantity':
+            return store.quantities[index]
+        if key == 'price':
+            return from_cents(store.price_cents[index])
+        if key == 'amount':
+            return from_cents(store.amount_cents[index])
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(LINE_FIELDS)
+
+    def __len__(self):
+        return len(LINE_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class LineStore:
+    __slots__ = ('descriptions', 'quantities', 'price_cents', 'amount_cents', 'ids', '_total_cents', '_next_id')
+
+    def __init__(self, lines=()):
+        self.descriptions = []
+        self.quantities = array('d')
+        self.price_cents = array('q')
+        self.amount_cents = array('q')
+        self.ids = array('q')
+        self._total_cents = 0
+        self._next_id = 1
+        self.extend(lines)
+
+    # Adding
+
+    def append(self, description, quantity, price):
+        """Add one line and return its index."""
+        price_cents = to_cents(price)
+        amount_cents = line_amount_cents(quantity, price_cents)
+        self.descriptions.append(str(description))
+        self.quantities.append(float(quantity))
+        self.price_cents.append(price_cents)
+        self.amount_cents.append(amount_cents)
+        self.ids.append(self._next_id)
+        self._next_id += 1
+        self._total_cents += amount_cents
+        return len(self.descriptions) - 1
+
+    def extend(self, lines):
+        """Add lines given as dicts (like make_line returns) or (description, quantity, price) tuples."""
+        descriptions, quantities, price_cents = [], [], []
+        for line in lines:
+            if not isinstance(line, tuple):
+                line = (line['description'], line['quantity'], line['price'])
+            description, quantity, price = line
+            descriptions.append(description)
+            quantities.append(float(quantity))
+            price_cents.append(to_cents(price))
+        self.extend_columns(descriptions, quantities, price_cents)
+
+    def extend_columns(self, descriptions, quantities, price_cents, amount_cents=None):
+        """
+        Bulk-append whole columns, e.g. straight from a DataFrame chunk.
+        Prices (and amounts, when they were already computed column-wise)
+        are integer cents.
+        """
+        if amount_cents is None:
+            quantities = list(quantities)
+            price_cents = list(price_cents)
+            amount_cents = list(map(line_amount_cents, quantities, price_cents))
+        start = len(self.amount_cents)
+        self.descriptions.extend(map(str, descriptions))
+        self.quantities.extend(quantities)
+        self.price_cents.extend(price_cents)
+        self.amount_cents.extend(amount_cents)
+        added = len(self.amount_cents) - start
+        self.ids.extend(range(self._next_id, self._next_id + added))
+        self._next_id += added
+        self._total_cents += sum(self.amount_cents[start:])
+
+    # Removing
+
+    def pop(self, index=-1):
+        """Remove one line and return it as a dict."""
+        line = dict(self[index])
+        self._total_cents -= self.amount_cents[index]
+        for column in (self.descriptions, self.quantities, self.price_cents, self.amount_cents, self.ids):
+            column.pop(index)
+        return line
+
+    def remove_many(self, indices):
+        """Remove the lines at indices in one pass over the columns."""
+        drop = {i + len(self) if i < 0 else i for i in indices}
+        if not drop:
+            return
+        keep = [i for i in range(len(self)) if i not in drop]
+        self.descriptions = [self.descriptions[i] for i in keep]
+        self.quantities = array('d', (self.quantities[i] for i in keep))
+        self.price_cents = array('q', (self.price_cents[i] for i in keep))
+        self.amount_cents = array('q', (self.amount_cents[i] for i in keep))
+        self.ids = array('q', (self.ids[i] for i in keep))
+        self._total_cents = sum(self.amount_cents)
+
+    def clear(self):
+        del self.descriptions[:], self.quantities[:], self.price_cents[:], self.amount_cents[:], self.ids[:]
+        self._total_cents = 0
+
+    # Reading
+
+    @property
+    def total_cents(self):
+        return self._total_cents
+
+    @property
+    def total(self):
+        return from_cents(self._total_cents)
+
+    def index_of(self, line_id):
+        """Current index of the line with this ID; ValueError once it was removed."""
+        return self.ids.index(line_id)
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [LineView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        return LineView(self, index)
+
+    def __iter__(self):
+        return (LineView(self, i) for i in range(len(self)))
+
+    def rows(self):
+        """(description, quantity, price, amount) tuples read from the columns, money as Decimal."""
+        return zip(self.descriptions, self.quantities,
+                   map(from_cents, self.price_cents), map(from_cents, self.amount_cents))
+
+    def columns(self, start=0, stop=None):
+        """
+        Columns of lines start to stop keyed by field name, for display
+        (e.g. st.dataframe), with price and amount in currency units. Only
+        that slice is read, so showing one page of a long invoice costs the
+        same as showing a short one.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return {'description': self.descriptions[start:stop], 'quantity': self.quantities[start:stop],
+                'price': array('d', (cents / 100 for cents in self.price_cents[start:stop])),
+                'amount': array('d', (cents / 100 for cents in self.amount_cents[start:stop]))}
+
+    def __repr__(self):
+        return f"LineStore({len(self)} lines, total={self.total})"
+
+
+def format_quantity(quantity):
+    """Whole quantities without a trailing .0, others as entered."""
+    quantity = float(quantity)
+    return str(int(quantity)) if quantity.is_integer() else str(quantity)
+
+
+def line_rows(lines):
+    """(description, quantity, price, amount) tuples from a LineStore or a list of line dicts."""
+    if isinstance(lines, LineStore):
+        return lines.rows()
+    return ((line['description'], line['quantity'], line['price'], line['amount']) for line in lines)
+
+
+def line_total(lines):
+    """Exact total (Decimal) of a LineStore or a list of line dicts."""
+    if isinstance(lines, LineStore):
+        return lines.total
+    return from_cents(sum(to_cents(line['amount']) for line in lines))
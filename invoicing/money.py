@@ -0,0 +1,77 @@
+"""
+Exact money arithmetic in integer cents.
+
+Prices and line amounts are rounded to whole cents once, half away from
+zero (after discarding float noise beyond six decimals, so 1.005 is 101
+cents), and from then on only added as integers, so a total is always the
+exact sum of the printed line amounts. Values leave this module as
+Decimal, which formats with :.2f like the floats it replaces.
+
+The *_array functions do the same on whole numpy columns for the importer.
+"""
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+_HUNDRED = Decimal(100)
+
+
+def _round_half_up(value):
+    return int(value.to_integral_value(ROUND_HALF_UP))
+
+
+def _round_float_half_up(value):
+    if value.is_integer():
+        return int(value)
+    # Round away float noise (1.005 * 100 == 100.49999...) before rounding half away from zero
+    value = round(value, 6)
+    return int(math.copysign(math.floor(abs(value) + 0.5), value))
+
+
+def to_cents(value):
+    """An amount in currency units (number, numeric string or Decimal) as integer cents."""
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        return _round_float_half_up(value * 100)
+    return _round_half_up(Decimal(str(value)) * _HUNDRED)
+
+
+def from_cents(cents):
+    """Integer cents as a Decimal amount with two decimals."""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def line_amount_cents(quantity, price_cents):
+    """quantity x price, rounded to whole cents."""
+    return _round_float_half_up(float(quantity) * price_cents)
+
+
+def vat_breakdown(gross_cents, rate):
+    """
+    Split a VAT-inclusive amount into (net_cents, vat_cents) for a rate in
+    percent. The VAT is rounded once on the total, so net + VAT == gross.
+    """
+    net_cents = _round_half_up(Decimal(gross_cents) * _HUNDRED / (_HUNDRED + Decimal(str(rate))))
+    return net_cents, gross_cents - net_cents
+
+
+def _round_half_up_array(values):
+    import numpy as np
+
+    # Same rounding as _round_float_half_up, a whole column at a time
+    values = np.round(values, 6)
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+def to_cents_array(values):
+    """to_cents for a whole numpy array or pandas Series of amounts."""
+    import numpy as np
+
+    return _round_half_up_array(np.asarray(values, dtype=float) * 100)
+
+
+def line_amount_cents_array(quantities, price_cents):
+    """line_amount_cents for whole columns."""
+    import numpy as np
+
+    return _round_half_up_array(np.asarray(quantities, dtype=float) * np.asarray(price_cents, dtype=float))
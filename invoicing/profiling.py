@@ -0,0 +1,195 @@
+"""
+Per-invoice stage timers with optional cProfile and tracemalloc capture.
+
+The invoice pipeline marks its stages with stage(name). Outside a profiled
+invoice that returns a shared do-nothing context manager, so the markers
+cost one context variable lookup when profiling is off.
+
+    profiler = Profiler(cprofile=True)
+    with profiler.invoice("#27"):
+        render_pdf(...)                  # records template, fonts, layout, image, output
+        with stage("csv"):
+            write_csv(...)
+    print(profiler.summary())
+    profiler.write_json("profile.json")
+
+Stages can nest; a nested stage's time is also part of its parent's
+(e.g. 'image' is drawn during 'layout').
+
+Front ends build their profiler with Profiler.from_env():
+    INVOICE_PROFILE=1                      stage timers only
+    INVOICE_PROFILE=cprofile,tracemalloc   timers plus the optional captures
+    INVOICE_PROFILE_JSON=profile.json      where to write the results
+"""
+import json
+import os
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+_NULL = nullcontext()
+
+# Record of the invoice being profiled in the current thread/task, if any
+_current = ContextVar('invoice_profile', default=None)
+
+
+class _Stage:
+    __slots__ = ('record', 'name', 'start')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        stages = self.record['stages']
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def stage(name):
+    """Time the enclosed block as stage name of the invoice being profiled, if any."""
+    record = _current.get()
+    if record is None:
+        return _NULL
+    return _Stage(record, name)
+
+
+class _Invoice:
+    """Context manager profiling one invoice into profiler.records."""
+
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.record = {'label': str(label), 'stages': {}, 'wall': None}
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.tracemalloc:
+            import tracemalloc
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if profiler.cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._token = _current.set(self.record)
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        record = self.record
+        record['wall'] = time.perf_counter() - self._start
+        _current.reset(self._token)
+        profiler = self.profiler
+        if profiler.cprofile:
+            import io
+            import pstats
+            self._profile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(profiler.cprofile_limit)
+            record['profile'] = out.getvalue()
+        if profiler.tracemalloc:
+            import tracemalloc
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        if exc_type is not None:
+            record['error'] = repr(exc)
+        profiler.records.append(record)
+
+
+class Profiler:
+    """
+    Collects one record per profiled invoice: the wall time, the time per
+    stage and, when enabled, the tracemalloc peak and a cProfile listing.
+    A disabled profiler records nothing and its invoice() is a no-op.
+    """
+
+    def __init__(self, enabled=True, cprofile=False, tracemalloc=False, cprofile_limit=25, json_path=None):
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.cprofile_limit = cprofile_limit
+        self.json_path = json_path
+        self.records = []
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        return cls.from_spec(environ.get('INVOICE_PROFILE', ''), json_path=environ.get('INVOICE_PROFILE_JSON'))
+
+    @classmethod
+    def from_spec(cls, spec, json_path=None):
+        """A profiler from a flag string like INVOICE_PROFILE: '', '1', 'cprofile,tracemalloc'."""
+        spec = (spec or '').strip().lower()
+        flags = {flag.strip() for flag in spec.split(',')}
+        return cls(enabled=spec not in ('', '0', 'false', 'no'), cprofile='cprofile' in flags,
+                   tracemalloc='tracemalloc' in flags, json_path=json_path)
+
+    def options(self):
+        """Keyword arguments that recreate this profiler's settings, e.g. in a worker process."""
+        return {'enabled': self.enabled, 'cprofile': self.cprofile, 'tracemalloc': self.tracemalloc,
+                'cprofile_limit': self.cprofile_limit}
+
+    def invoice(self, label):
+        """Profile the enclosed block as one invoice."""
+        if not self.enabled:
+            return _NULL
+        return _Invoice(self, label)
+
+    def merge(self, records):
+        """Add records profiled elsewhere, e.g. in batch worker processes."""
+        self.records.extend(records)
+
+    def clear(self):
+        self.records.clear()
+
+    def stage_stats(self):
+        """{stage: {'count', 'total', 'mean', 'max'}} in seconds over all records, plus 'wall'."""
+        samples = {}
+        for record in self.records:
+            samples.setdefault('wall', []).append(record['wall'])
+            for name, seconds in record['stages'].items():
+                samples.setdefault(name, []).append(seconds)
+        return {
+            name: {'count': len(values), 'total': sum(values),
+                   'mean': sum(values) / len(values), 'max': max(values)}
+            for name, values in samples.items()
+        }
+
+    def to_dict(self):
+        return {'invoices': self.records, 'stages': self.stage_stats()}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def write_json(self, path=None):
+        with open(path or self.json_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+
+    def report(self):
+        """Print the summary table and write the JSON file, if one is configured."""
+        if not self.enabled:
+            return
+        print(self.summary())
+        if self.json_path:
+            self.write_json()
+
+    def summary(self):
+        """The stage statistics as a plain-text table (milliseconds)."""
+        stats = self.stage_stats()
+        if not stats:
+            return "No invoices profiled."
+        rows = [f"{'stage':14} {'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+        # Stages in order of total time, the whole invoice last
+        wall = stats.pop('wall')
+        for name, s in sorted(stats.items(), key=lambda item: -item[1]['total']) + [('wall', wall)]:
+            rows.append(f"{name:14} {s['count']:6d} {s['total'] * 1000:10.1f} "
+                        f"{s['mean'] * 1000:9.2f} {s['max'] * 1000:9.2f}")
+        peaks = [record['peak_bytes'] for record in self.records if 'peak_bytes' in record]
+        if peaks:
+            rows.append(f"peak memory    {max(peaks) / 1e6:.1f} MB (largest invoice)")
+        return "\n".join(rows)
@@ -0,0 +1,537 @@
+"""
+Match bank statement transactions to issued invoices.
+
+The payment instructions ask payers to mention the invoice number, so most
+incoming transfers match on that. The rest are matched on the payer's
+name and the amount:
+
+    with Ledger() as ledger:
+        index = InvoiceIndex.from_ledger(ledger)
+        for match in reconcile(read_statement("2025.xml"), index):
+            print(match.status, match.invoices, match.transaction.text)
+
+Statement files are read as a stream, one transaction at a time, and only
+money received is considered:
+    CAMT.053 XML     every entry is cleared once it has been read
+    MT940            :61: statement lines with their :86: details (ABN AMRO .STA files)
+    CSV              with a header row (English or Dutch names), or ABN AMRO's
+                     headerless tab-separated export
+
+Every open invoice (its total minus the payments recorded so far) is
+indexed by number, by open amount and by recipient name, so finding the
+candidates for a transaction is a few dict lookups, not a scan of all
+invoices. For each transaction, in this order:
+  1. Invoice numbers in the remittance text. Common typing slips such as
+     O for 0 are corrected. A number counts when it follows a word like
+     "factuur" or "invoice", or when the amount is exactly what is still
+     open. One transfer may settle several listed invoices if it pays
+     exactly their sum.
+  2. The payer's open invoices, by normalised name.
+  3. Open invoices of exactly the transferred amount, narrowed down by a
+     fuzzy comparison of the payer's name with the recipient.
+A transaction is then matched (the invoice is paid in full, or more),
+partial (less than the open amount) or unmatched. Transactions already
+recorded in the ledger are reported as such and skipped.
+
+From the command line:
+    python -m invoicing.reconcile statement.xml --report reconciliation.csv
+    python -m invoicing.reconcile 2025/*.sta --apply      # also record the payments in the ledger
+"""
+import argparse
+import csv
+import hashlib
+import re
+import time
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import chain
+from typing import NamedTuple
+
+from .ledger import LEDGER_PATH, Ledger
+from .money import from_cents, to_cents
+
+# Minimum difflib ratio for a payer name to count as the recipient's
+NAME_THRESHOLD = 0.75
+# Amount candidates beyond this many are too ambiguous to pick by fuzzy name alone
+FUZZY_CANDIDATES = 50
+
+
+class Transaction(NamedTuple):
+    booked: date
+    amount_cents: int  # money received
+    name: str          # payer
+    iban: str          # payer's account
+    text: str          # remittance information
+    reference: str     # the bank's reference, or a digest of the fields when there is none
+
+
+def _transaction(booked, amount_cents, name, iban, text, reference=""):
+    text = " ".join(text.split())
+    name = " ".join((name or "").split())
+    if not reference or reference.upper() in ('NONREF', 'NOTPROVIDED'):
+        digest = hashlib.sha1(f"{booked}|{amount_cents}|{name}|{iban}|{text}".encode())
+        reference = digest.hexdigest()[:20]
+    return Transaction(booked, amount_cents, name, iban or "", text, reference)
+
+
+def parse_amount(text):
+    """Cents from '1.234,56', '1,234.56', '-12,50', '12.50' or 'EUR 12,50'."""
+    text = re.sub(r"[^\d,.\-+]", "", text)
+    if ',' in text and '.' in text:
+        decimal_mark = ',' if text.rfind(',') > text.rfind('.') else '.'
+    else:
+        decimal_mark = ',' if ',' in text else '.'
+    thousands = '.' if decimal_mark == ',' else ','
+    try:
+        return to_cents(Decimal(text.replace(thousands, '').replace(decimal_mark, '.')))
+    except InvalidOperation:
+        raise ValueError(f"not an amount: {text!r}") from None
+
+
+def parse_date(text):
+    text = text.strip()[:10]
+    if len(text) == 10 and text[4] == '-':
+        return date.fromisoformat(text)
+    for pattern in ('%Y%m%d', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(text, pattern).date()
+        except ValueError:
+            continue
+    raise ValueError(f"not a date: {text!r}")
+
+
+# Structured details as ABN AMRO writes them in MT940 :86: fields and CSV descriptions
+_DETAIL_KEYS = re.compile(r"/(TRTP|IBAN|BIC|NAME|REMI|EREF|MARF|CSID|ORDP|BENM|ADDR|ISDT|ID|USTD|STRD)/")
+_LABELLED = re.compile(r"\b(IBAN|BIC|Naam|Name|Omschrijving|Description|Kenmerk):\s*", re.IGNORECASE)
+
+
+def parse_details(info):
+    """(name, iban, remittance text) from a bank's description field."""
+    if _DETAIL_KEYS.search(info):
+        parts = _DETAIL_KEYS.split(info)
+        fields = {}
+        for key, value in zip(parts[1::2], parts[2::2]):
+            fields.setdefault(key, value.strip(' /'))
+        text = " ".join(fields[key] for key in ('REMI', 'USTD', 'STRD', 'EREF')
+                        if fields.get(key) and fields[key].upper() != 'NOTPROVIDED')
+        return fields.get('NAME', ''), fields.get('IBAN', ''), text or info
+    if _LABELLED.search(info):
+        parts = _LABELLED.split(info)
+        fields = {key.lower(): value.strip() for key, value in zip(parts[1::2], parts[2::2])}
+        text = fields.get('omschrijving') or fields.get('description') or fields.get('kenmerk') or info
+        return fields.get('naam') or fields.get('name', ''), fields.get('iban', ''), text
+    return '', '', info
+
+
+# CAMT.053
+
+@lru_cache(maxsize=None)
+def _qualified(path, namespace):
+    """path (local names separated by /) in ElementTree's {namespace}name form."""
+    return "/".join(f"{{{namespace}}}{name}" for name in path.split('/')) if namespace else path
+
+
+def _text(element, path, namespace):
+    found = element.find(_qualified(path, namespace)) if element is not None else None
+    return (found.text or '').strip() if found is not None and found.text else ''
+
+
+def read_camt053(source):
+    """Incoming transactions of a CAMT.053 file (path or binary file), one entry at a time."""
+    for _, element in ET.iterparse(source, events=('end',)):
+        tag = element.tag
+        if tag != 'Ntry' and not tag.endswith('}Ntry'):
+            continue
+        ns = tag[1:-len('}Ntry')] if tag.startswith('{') else ''
+
+        def text(element, path):
+            return _text(element, path, ns)
+
+        if text(element, 'CdtDbtInd') == 'CRDT' and text(element, 'RvslInd').lower() != 'true':
+            booked = parse_date(text(element, 'BookgDt/Dt') or text(element, 'BookgDt/DtTm')
+                                or text(element, 'ValDt/Dt'))
+            transactions = element.findall(_qualified('NtryDtls/TxDtls', ns))
+            for tx in transactions or [None]:
+                # A batch entry lists every transaction with its own amount
+                amount = (text(tx, 'AmtDtls/TxAmt/Amt') or text(tx, 'Amt')) if len(transactions) > 1 else ''
+                texts = [ustrd.text.strip() for ustrd in tx.iterfind(_qualified('RmtInf/Ustrd', ns)) if ustrd.text] \
+                    if tx is not None else []
+                texts.append(text(tx, 'RmtInf/Strd/CdtrRefInf/Ref'))
+                texts.append(text(element, 'AddtlNtryInf'))
+                yield _transaction(
+                    booked, parse_amount(amount or text(element, 'Amt')),
+                    text(tx, 'RltdPties/Dbtr/Nm') or text(tx, 'RltdPties/Dbtr/Pty/Nm'),
+                    text(tx, 'RltdPties/DbtrAcct/Id/IBAN'),
+                    " ".join(part for part in texts if part),
+                    text(tx, 'Refs/AcctSvcrRef') or text(tx, 'Refs/EndToEndId') if len(transactions) > 1
+                    else text(element, 'AcctSvcrRef') or text(element, 'NtryRef'),
+                )
+        element.clear()
+
+
+# MT940
+
+_MT940_TAG = re.compile(r":(\d{2}[A-Z]?):")
+# :61: value date, optional entry date, debit/credit mark, funds code, amount, type, references
+_MT940_LINE = re.compile(r"(\d{6})(\d{4})?(RC|RD|C|D)[A-Z]?(\d+,\d*)[A-Z]\w{3}([^/\n]*)(?://(\S*))?")
+
+
+def _mt940_fields(lines):
+    """(tag, value) per field; continuation lines are joined as MT940 wraps them at 65 characters."""
+    tag, value = None, []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        match = _MT940_TAG.match(line)
+        if match:
+            if tag:
+                yield tag, value
+            tag, value = match.group(1), [line[match.end():]]
+        elif line.startswith(('-', '{')) or not line.strip():
+            if tag:
+                yield tag, value
+            tag, value = None, []
+        elif tag:
+            value.append(line)
+    if tag:
+        yield tag, value
+
+
+def _mt940_transaction(statement_line, info):
+    match = _MT940_LINE.match(statement_line[0])
+    if match is None or match.group(3) != 'C':
+        return None
+    value_date, _, _, amount, customer_reference, bank_reference = match.groups()
+    booked = datetime.strptime(value_date, '%y%m%d').date()
+    name, iban, text = parse_details("".join(info))
+    reference = bank_reference or customer_reference.strip()
+    return _transaction(booked, parse_amount(amount), name, iban, text, reference)
+
+
+def read_mt940(lines):
+    """Incoming transactions of an MT940 file, given as an iterable of text lines."""
+    statement_line = None
+    for tag, value in _mt940_fields(lines):
+        if tag == '86' and statement_line is not None:
+            transaction = _mt940_transaction(statement_line, value)
+            statement_line = None
+        else:
+            transaction = _mt940_transaction(statement_line, []) if statement_line is not None else None
+            statement_line = value if tag == '61' else None
+        if transaction is not None:
+            yield transaction
+    if statement_line is not None:
+        transaction = _mt940_transaction(statement_line, [])
+        if transaction is not None:
+            yield transaction
+
+
+# CSV
+
+# Accepted headers per field, compared case-insensitively (see importer.COLUMN_ALIASES)
+STATEMENT_COLUMNS = {
+    'date': ['date', 'datum', 'transactiedatum', 'boekdatum', 'booking date', 'rentedatum'],
+    'amount': ['amount', 'bedrag', 'transactiebedrag', 'bedrag (eur)', 'amount (eur)'],
+    'name': ['name', 'naam', 'naam tegenpartij', 'tegenrekeninghouder', 'counterparty', 'naam / omschrijving'],
+    'iban': ['iban', 'tegenrekening', 'tegenrekening iban/bban', 'counterparty iban', 'counterparty account'],
+    'text': ['description', 'omschrijving', 'mededelingen', 'remittance', 'omschrijving-1'],
+    'direction': ['af bij', 'af/bij', 'debit/credit', 'credit/debit'],
+}
+
+# ABN AMRO's tab-separated export: account, currency, date, opening and closing balance,
+# interest date, amount, description; no header row
+ABN_TAB_COLUMNS = ('account', 'currency', 'date', 'opening', 'closing', 'interest_date', 'amount', 'text')
+
+
+def read_csv_statement(lines):
+    """Incoming transactions of a CSV/TSV statement, given as an iterable of text lines."""
+    lines = iter(lines)
+    first = next(lines, '')
+    delimiter = '\t' if first.count('\t') >= max(first.count(';'), first.count(','), 1) else \
+        ';' if first.count(';') > first.count(',') else ','
+    rows = csv.reader(_chain(first, lines), delimiter=delimiter)
+    header = next(rows, None)
+    if header is None:
+        return
+    if len(header) == len(ABN_TAB_COLUMNS) and header[2].strip().isdigit():
+        for row in _chain(header, rows):
+            amount = parse_amount(row[6])
+            if amount > 0:
+                name, iban, text = parse_details(row[7])
+                yield _transaction(parse_date(row[2]), amount, name, iban, text)
+        return
+    by_lower = {column.strip().lower(): position for position, column in enumerate(header)}
+    columns = {field: next((by_lower[alias] for alias in aliases if alias in by_lower), None)
+               for field, aliases in STATEMENT_COLUMNS.items()}
+    if columns['date'] is None or columns['amount'] is None:
+        raise ValueError("statement CSV needs a date and an amount column")
+    for row in rows:
+        if len(row) <= max(position for position in columns.values() if position is not None):
+            continue
+
+        def field(name):
+            return row[columns[name]].strip() if columns[name] is not None else ''
+
+        amount = parse_amount(field('amount'))
+        if field('direction').lower() in ('af', 'debit', 'd'):
+            amount = -amount
+        if amount <= 0:
+            continue
+        name, iban, text = parse_details(field('text'))
+        yield _transaction(parse_date(field('date')), amount, field('name') or name, field('iban') or iban, text)
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def read_statement(path):
+    """Incoming transactions of a statement file of any supported format, read lazily."""
+    with open(path, 'rb') as f:
+        head = f.read(1024).lstrip(b'\xef\xbb\xbf \r\n\t')
+    if head.startswith(b'<'):
+        yield from read_camt053(path)
+        return
+    with open(path, encoding='utf-8', errors='replace', newline='') as f:
+        if head.startswith((b':20:', b'{1:', b'ABNANL')) or b'\n:20:' in head or b'\n:61:' in head:
+            yield from read_mt940(f)
+        else:
+            yield from read_csv_statement(f)
+
+
+# Matching
+
+class OpenInvoice:
+    __slots__ = ('number', 'customer_name', 'open_cents')
+
+    def __init__(self, number, customer_name, open_cents):
+        self.number = number
+        self.customer_name = customer_name
+        self.open_cents = open_cents
+
+
+def name_key(name):
+    """Lowercase name words in sorted order, so 'Jansen, J.' and 'J Jansen' compare equal."""
+    return " ".join(sorted(re.findall(r"\w+", name.lower())))
+
+
+class InvoiceIndex:
+    """Open invoices by number, by open amount and by recipient name."""
+
+    def __init__(self, invoices=()):
+        self.by_number = {}
+        self.by_amount = {}
+        self.by_name = {}
+        # Every recipient name (as name_key) a word appears in, to find the names close to a misspelt one
+        self.names_by_word = {}
+        for number, customer_name, open_cents in invoices:
+            self.add(OpenInvoice(number, customer_name, open_cents))
+
+    @classmethod
+    def from_ledger(cls, ledger):
+        return cls((row['invoice_number'], row['customer_name'], row['total_cents'] - row['paid_cents'])
+                   for row in ledger.open_invoices())
+
+    def __len__(self):
+        return len(self.by_number)
+
+    def add(self, invoice):
+        self.by_number[invoice.number] = invoice
+        self.by_amount.setdefault(invoice.open_cents, {})[invoice.number] = invoice
+        key = name_key(invoice.customer_name)
+        if key not in self.by_name:
+            for word in key.split():
+                self.names_by_word.setdefault(word, set()).add(key)
+        self.by_name.setdefault(key, {})[invoice.number] = invoice
+
+    def settle(self, invoice, cents):
+        """Book a payment of cents; a fully paid invoice leaves the index."""
+        bucket = self.by_amount[invoice.open_cents]
+        del bucket[invoice.number]
+        if not bucket:
+            del self.by_amount[invoice.open_cents]
+        invoice.open_cents -= cents
+        if invoice.open_cents > 0:
+            self.by_amount.setdefault(invoice.open_cents, {})[invoice.number] = invoice
+        else:
+            del self.by_number[invoice.number]
+            names = self.by_name[name_key(invoice.customer_name)]
+            del names[invoice.number]
+            if not names:
+                del self.by_name[name_key(invoice.customer_name)]
+
+
+class Match(NamedTuple):
+    transaction: Transaction
+    status: str        # 'matched', 'partial', 'unmatched' or 'recorded' (already in the ledger)
+    allocations: tuple  # ((invoice_number, cents), ...)
+    method: str        # 'reference', 'name' or 'amount'; '' when unmatched
+    difference_cents: int  # paid minus what was open: > 0 overpaid, < 0 still open
+
+    @property
+    def invoices(self):
+        return tuple(number for number, _ in self.allocations)
+
+
+# A number, or a number with letters commonly typed for digits; never part of a longer word
+_NUMBER_TOKEN = re.compile(r"(?<![\w])([0-9OoIl]{1,9})(?![\w])")
+_INVOICE_WORD = re.compile(r"(?:\b(?:fact\w*|invoices?|inv|nr|nummer|no|number)|#)\W*$", re.IGNORECASE)
+# What separates the numbers in "facturen 12, 13 en 14"
+_LIST_SEPARATOR = re.compile(r"\s*(?:[,&/+]|\ben\b|\band\b)?\s*$", re.IGNORECASE)
+_DIGIT_FIXES = str.maketrans('OoIl', '0011')
+
+
+def referenced_numbers(text):
+    """
+    (invoice number, follows an invoice word) for every number-like token in
+    text, in order; numbers listed after an invoice word count as following it.
+    """
+    previous_end, listed = 0, False
+    for match in _NUMBER_TOKEN.finditer(text):
+        token = match.group(1)
+        if not any(ch.isdigit() for ch in token):
+            continue
+        listed = bool(_INVOICE_WORD.search(text, 0, match.start())) or \
+            (listed and bool(_LIST_SEPARATOR.match(text, previous_end, match.start())))
+        previous_end = match.end()
+        yield int(token.translate(_DIGIT_FIXES)), listed
+
+
+def _closest_by_name(transaction, index):
+    """
+    The open invoice of exactly the transferred amount whose recipient
+    resembles the payer most, or None when no name is close enough or two
+    different recipients are equally close.
+    """
+    key = name_key(transaction.name)
+    by_amount = index.by_amount.get(transaction.amount_cents, {})
+    if len(by_amount) <= FUZZY_CANDIDATES:
+        candidates = by_amount.values()
+    else:
+        # Too many to compare one by one: only recipients who share a distinctive word with the payer
+        names = set()
+        for word in key.split():
+            sharing = index.names_by_word.get(word, ())
+            if len(sharing) <= FUZZY_CANDIDATES:
+                names.update(sharing)
+        candidates = [invoice for name in names for invoice in index.by_name.get(name, {}).values()
+                      if invoice.open_cents == transaction.amount_cents]
+    by_recipient = {}
+    for invoice in candidates:
+        by_recipient.setdefault(name_key(invoice.customer_name), []).append(invoice)
+    scores = sorted(((SequenceMatcher(None, key, name).ratio(), name) for name in by_recipient), reverse=True)
+    if not scores or scores[0][0] < NAME_THRESHOLD or (len(scores) > 1 and scores[1][0] == scores[0][0]):
+        return None
+    return min(by_recipient[scores[0][1]], key=lambda invoice: invoice.number)
+
+
+def match_transaction(transaction, index):
+    """The Match for one transaction; settles the matched invoices in index."""
+    amount = transaction.amount_cents
+    referenced = {}
+    for number, keyword in referenced_numbers(transaction.text):
+        invoice = index.by_number.get(number)
+        if invoice is not None and (keyword or invoice.open_cents == amount):
+            referenced.setdefault(number, invoice)
+    candidates = list(referenced.values())
+    method = 'reference'
+    if len(candidates) > 1 and sum(invoice.open_cents for invoice in candidates) == amount:
+        allocations = tuple((invoice.number, invoice.open_cents) for invoice in candidates)
+        for invoice in candidates:
+            index.settle(invoice, invoice.open_cents)
+        return Match(transaction, 'matched', allocations, method, 0)
+    if candidates:
+        # Prefer the listed invoice the amount pays exactly, then the first one mentioned
+        invoice = next((i for i in candidates if i.open_cents == amount), candidates[0])
+    else:
+        invoice = None
+        by_name = index.by_name.get(name_key(transaction.name)) if transaction.name else None
+        if by_name:
+            method = 'name'
+            exact = [i for i in by_name.values() if i.open_cents == amount]
+            if exact or len(by_name) == 1:
+                invoice = min(exact or by_name.values(), key=lambda i: i.number)
+        if invoice is None and transaction.name:
+            method = 'amount'
+            invoice = _closest_by_name(transaction, index)
+    if invoice is None:
+        return Match(transaction, 'unmatched', (), '', 0)
+    difference = amount - invoice.open_cents
+    index.settle(invoice, amount)
+    return Match(transaction, 'matched' if difference >= 0 else 'partial', ((invoice.number, amount),),
+                 method, difference)
+
+
+def reconcile(transactions, index, recorded=()):
+    """
+    Yield a Match per transaction. A reference in recorded, or seen before in
+    transactions (overlapping statement exports), is reported and skipped.
+    """
+    seen = set(recorded)
+    for transaction in transactions:
+        if transaction.reference in seen:
+            yield Match(transaction, 'recorded', (), '', 0)
+        else:
+            seen.add(transaction.reference)
+            yield match_transaction(transaction, index)
+
+
+REPORT_COLUMNS = ('booked', 'amount', 'name', 'iban', 'text', 'status', 'invoices', 'method', 'difference', 'reference')
+
+
+def report_row(match):
+    tx = match.transaction
+    return (tx.booked.isoformat(), f"{from_cents(tx.amount_cents):.2f}", tx.name, tx.iban, tx.text, match.status,
+            " ".join(map(str, match.invoices)), match.method,
+            f"{from_cents(match.difference_cents):.2f}" if match.allocations else "", tx.reference)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match bank statements (CAMT.053, MT940, CSV) to invoices.")
+    parser.add_argument("statements", nargs="+", help="Statement files")
+    parser.add_argument("--ledger", default=LEDGER_PATH, help=f"Ledger file (default: {LEDGER_PATH})")
+    parser.add_argument("--report", help="Write every transaction with its match to this CSV")
+    parser.add_argument("--apply", action="store_true", help="Record the matched and partial payments in the ledger")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counts, cents = {}, {}
+    payments = []
+    with Ledger(args.ledger) as ledger:
+        index = InvoiceIndex.from_ledger(ledger)
+        open_invoices = len(index)
+        report = open(args.report, 'w', newline='', encoding='utf-8') if args.report else None
+        try:
+            writer = csv.writer(report) if report else None
+            if writer:
+                writer.writerow(REPORT_COLUMNS)
+            transactions = chain.from_iterable(map(read_statement, args.statements))
+            for match in reconcile(transactions, index, ledger.payment_references()):
+                counts[match.status] = counts.get(match.status, 0) + 1
+                cents[match.status] = cents.get(match.status, 0) + match.transaction.amount_cents
+                if writer:
+                    writer.writerow(report_row(match))
+                tx = match.transaction
+                payments.extend((number, tx.reference, tx.booked, amount, tx.name)
+                                for number, amount in match.allocations)
+        finally:
+            if report:
+                report.close()
+        written = ledger.record_payments(payments) if args.apply and payments else 0
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    print(f"{total} incoming transaction(s) against {open_invoices} open invoice(s) in {elapsed:.2f}s")
+    for status in ('matched', 'partial', 'unmatched', 'recorded'):
+        if counts.get(status):
+            print(f"  {status:10} {counts[status]:7d}  {from_cents(cents[status]):12.2f}")
+    if args.apply:
+        print(f"Recorded {written} payment(s) in {args.ledger}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
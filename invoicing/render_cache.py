@@ -0,0 +1,300 @@
+"""
+Content-addressed cache of rendered invoice PDFs.
+
+Re-sending an invoice, "Generate Test PDF" and toggling the language back
+and forth render the same invoice again. render_pdf first hashes everything
+that ends up in the PDF (lines, recipient, number, title, dates, language,
+description, VAT, fonts) together with a fingerprint of the template:
+the source of the modules that draw the invoice, the fpdf version and the
+size and modification time of the font and logo files. An identical
+request then returns the stored bytes; any change in the inputs gives a
+different key, so entries never need explicit invalidation. Only a
+LineStore or a list of lines is cached: an iterator can be read once, so it
+streams straight into the PDF.
+
+Entries live in an LRU dict in memory and as files on disk (shared by all
+processes that render, e.g. batch and API workers); both are bounded in
+bytes and drop the least recently used entries first.
+
+    INVOICE_RENDER_CACHE=0       disable the cache
+    configure_render_cache(memory_bytes=..., disk_dir=..., disk_bytes=...)
+    reset_render_cache()         empty the memory cache and re-read the fingerprint
+
+The PDFs contain their creation time, so a cached copy carries the time it
+was first rendered; the printed invoice and due dates are part of the key,
+and so is an explicit creation date (render_pdf's reproducible mode).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+
+from .lines import LineStore, line_rows
+from .money import to_cents
+
+RENDER_CACHE_DIR = os.path.join('invoices', 'render_cache')
+MEMORY_BYTES = 64 * 1024 * 1024
+DISK_BYTES = 256 * 1024 * 1024
+
+# Modules whose code decides what an invoice looks like
+_TEMPLATE_MODULES = ('core.py', 'template.py', 'translations.py', 'lines.py', 'money.py', 'resources.py')
+
+
+class MemoryCache:
+    """LRU dict of key -> bytes, bounded by the total size of the values."""
+
+    def __init__(self, max_bytes=MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    One file per key in directory, bounded by max_bytes. A hit refreshes
+    the file's modification time, which is what eviction orders by, so
+    the disk cache is LRU across processes too. Files are written to a
+    temporary name and renamed, so readers never see half a PDF.
+    """
+
+    def __init__(self, directory=RENDER_CACHE_DIR, max_bytes=DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # this process's estimate; recounted when it passes max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pdf')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()[0]
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _disk_usage(self):
+        """(total bytes, [(mtime, size, path), ...]) of the cached files."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return sum(size for _, size, _ in files), files
+
+    def _evict(self):
+        # Down to 90% of the limit, so a full cache does not rescan on every put
+        total, files = self._disk_usage()
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+    def clear(self):
+        for _, _, path in self._disk_usage()[1]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._size = 0
+
+
+class RenderCache:
+    """Memory in front of disk; either may be None."""
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.memory.get(key) if self.memory is not None else None
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None and self.memory is not None:
+                self.memory.put(key, data)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        data = bytes(data)
+        if self.memory is not None:
+            self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def clear(self):
+        for layer in (self.memory, self.disk):
+            if layer is not None:
+                layer.clear()
+
+
+_cache = None
+_cache_configured = False
+_fingerprint = None
+_config_lock = threading.Lock()
+
+
+def configure_render_cache(memory_bytes=MEMORY_BYTES, disk_dir=RENDER_CACHE_DIR, disk_bytes=DISK_BYTES):
+    """
+    Set up the cache render_pdf uses. A size of 0 (or no disk_dir) leaves
+    that layer out; with neither layer the cache is off.
+    """
+    global _cache, _cache_configured
+    memory = MemoryCache(memory_bytes) if memory_bytes else None
+    disk = DiskCache(disk_dir, disk_bytes) if disk_dir and disk_bytes else None
+    with _config_lock:
+        _cache = RenderCache(memory, disk) if memory is not None or disk is not None else None
+        _cache_configured = True
+    return _cache
+
+
+def get_render_cache():
+    """The process-wide RenderCache, or None when caching is off (INVOICE_RENDER_CACHE=0)."""
+    if not _cache_configured:
+        if os.environ.get('INVOICE_RENDER_CACHE', '1').strip().lower() in ('0', 'false', 'no', 'off'):
+            configure_render_cache(memory_bytes=0, disk_dir=None)
+        else:
+            configure_render_cache()
+    return _cache
+
+
+def reset_render_cache():
+    """Empty the memory cache and recompute the template fingerprint (disk entries stay)."""
+    global _fingerprint
+    _fingerprint = None
+    if _cache is not None and _cache.memory is not None:
+        _cache.memory.clear()
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, None)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def template_fingerprint():
+    """Digest of everything besides the invoice itself that shapes the PDF; computed once per process."""
+    global _fingerprint
+    if _fingerprint is None:
+        import fpdf
+
+        from .core import TAHOMA_FONTS
+        from .template import LOGO_PATH
+
+        digest = hashlib.sha256(fpdf.__version__.encode())
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in _TEMPLATE_MODULES:
+            with open(os.path.join(package_dir, name), 'rb') as f:
+                digest.update(f.read())
+        for path in (*sorted(TAHOMA_FONTS.values()), LOGO_PATH):
+            digest.update(repr(_file_state(path)).encode())
+        _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+def cache_key(lines, customer_name, invoice_number, title, language, description, invoice_date,
+              due_date, vat_rate, font_family, currency, creation_date=None):
+    """Hex digest identifying one rendered invoice."""
+    digest = hashlib.sha256(template_fingerprint().encode())
+    digest.update(repr((
+        str(customer_name), str(invoice_number), str(title), language, str(description),
+        invoice_date.strftime('%Y-%m-%d'), due_date.strftime('%Y-%m-%d'), to_cents(vat_rate),
+        font_family, currency, creation_date.isoformat() if creation_date is not None else None,
+    )).encode())
+    if isinstance(lines, LineStore):
+        digest.update(b'store')
+        digest.update(repr(lines.descriptions).encode())
+        for column in (lines.quantities, lines.price_cents, lines.amount_cents):
+            digest.update(column.tobytes())
+    else:
+        descriptions, quantities, cents = [], array('d'), array('q')
+        for text, quantity, price, amount in line_rows(lines):
+            descriptions.append(str(text))
+            quantities.append(float(quantity))
+            cents.append(to_cents(price))
+            cents.append(to_cents(amount))
+        digest.update(b'rows')
+        digest.update(repr(descriptions).encode())
+        digest.update(quantities.tobytes())
+        digest.update(cents.tobytes())
+    return digest.hexdigest()
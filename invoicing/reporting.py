@@ -0,0 +1,269 @@
+"""
+Treasurer reports over every invoice in the ledger.
+
+The ledger's invoices and lines are loaded into two pandas frames, and
+the reports are plain vectorised group-bys over them:
+
+    history = load_history()
+    revenue_by_month(history.invoices)
+    outstanding(history.invoices)               # overdue invoices per age bucket, and the invoices
+    totals_by_description(history.lines)
+
+Both frames are cached as Parquet files next to the ledger
+(invoices/report_cache/). A later load reads only the invoice headers
+from SQLite, which is cheap, and compares them with the cached ones. Only
+the lines of invoices that are new or changed (recipient, dates or
+total) are read again. Without pyarrow nothing is cached and every
+load reads the whole ledger.
+
+Money is kept in integer cents (total_cents, amount_cents) and only
+turned into currency units in the report frames.
+
+From the command line:
+    python -m invoicing.reporting months --start 2025-01-01
+    python -m invoicing.reporting outstanding
+    python -m invoicing.reporting descriptions --top 20
+"""
+import argparse
+import json
+import os
+from datetime import date
+from typing import NamedTuple
+
+from .ledger import LEDGER_PATH, Ledger
+
+# Compared with the cached headers to find the invoices whose lines must be read again
+SIGNATURE = ('customer_name', 'invoice_date', 'due_date', 'total')
+
+HEADER_QUERY = """
+SELECT invoice_number, customer_name, invoice_date, COALESCE(due_date, '') AS due_date, total,
+       COALESCE(paid_cents, 0) AS paid_cents
+FROM invoices LEFT JOIN (
+    SELECT invoice_number, SUM(CAST(ROUND(amount * 100) AS INTEGER)) AS paid_cents FROM payments GROUP BY invoice_number
+) USING (invoice_number)
+"""
+
+LINE_QUERY = "SELECT invoice_number, position, description, quantity, price, amount FROM invoice_lines"
+
+AGE_BUCKETS = (0, 30, 60, 90, float('inf'))
+AGE_LABELS = ('1-30 days', '31-60 days', '61-90 days', 'over 90 days')
+
+
+class History(NamedTuple):
+    invoices: object  # DataFrame, one row per invoice
+    lines: object     # DataFrame, one row per invoice line
+
+
+def _read_lines(connection, numbers=None):
+    import pandas as pd
+
+    if numbers is None:
+        return pd.read_sql_query(LINE_QUERY, connection)
+    return pd.read_sql_query(LINE_QUERY + " WHERE invoice_number IN (SELECT value FROM json_each(?))",
+                             connection, params=(json.dumps([int(n) for n in numbers]),))
+
+
+def report_cache_dir(ledger_path=LEDGER_PATH):
+    return os.path.join(os.path.dirname(os.path.abspath(ledger_path)), 'report_cache')
+
+
+def _cache_paths(cache_dir):
+    return os.path.join(cache_dir, 'invoices.parquet'), os.path.join(cache_dir, 'lines.parquet')
+
+
+def _read_cache(cache_dir):
+    import pandas as pd
+
+    invoices_path, lines_path = _cache_paths(cache_dir)
+    try:
+        return pd.read_parquet(invoices_path), pd.read_parquet(lines_path)
+    except (ImportError, OSError, ValueError):
+        return None
+
+
+def _write_cache(cache_dir, headers, lines):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for frame, path in zip((headers, lines), _cache_paths(cache_dir)):
+            # Written aside and renamed, so a concurrent reader never sees half a file
+            frame.to_parquet(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+    except (ImportError, OSError):
+        pass
+
+
+def load_history(ledger_path=LEDGER_PATH, cache=True):
+    """
+    All invoices and lines of the ledger as a History of two DataFrames,
+    refreshing the Parquet cache next to the ledger as needed (cache=False
+    reads the whole ledger and leaves the cache alone).
+
+    invoices: invoice_number, customer_name, invoice_date, due_date
+              (datetime64; due_date NaT when unknown), total_cents,
+              paid_cents (recorded payments, see invoicing.reconcile)
+    lines:    invoice_number, position, description (categorical),
+              quantity, price_cents, amount_cents
+    """
+    import pandas as pd
+
+    cache_dir = report_cache_dir(ledger_path) if cache else None
+    with Ledger(ledger_path) as ledger:
+        headers = pd.read_sql_query(HEADER_QUERY, ledger.connection)
+        cached = _read_cache(cache_dir) if cache_dir else None
+        if cached is None:
+            lines = _line_frame(_read_lines(ledger.connection))
+            changed = True
+        else:
+            cached_headers, cached_lines = cached
+            merged = headers.merge(cached_headers, on='invoice_number', how='left', suffixes=('', '_cached'))
+            same = pd.Series(True, index=merged.index)
+            for column in SIGNATURE:
+                same &= merged[column] == merged[column + '_cached']
+            stale = merged.loc[~same, 'invoice_number']
+            changed = not stale.empty or len(cached_headers) != len(headers)
+            if changed:
+                kept = cached_lines[cached_lines['invoice_number'].isin(merged.loc[same, 'invoice_number'])]
+                lines = _line_frame(pd.concat([kept, _line_frame(_read_lines(ledger.connection, stale))],
+                                              ignore_index=True))
+            else:
+                lines = cached_lines
+    # The cache keeps the headers as read, for the comparison, and the lines ready to use
+    if changed and cache_dir:
+        _write_cache(cache_dir, headers, lines)
+    return History(_invoice_frame(headers), lines)
+
+
+def _invoice_frame(headers):
+    import pandas as pd
+
+    return pd.DataFrame({
+        'invoice_number': headers['invoice_number'].astype('int64'),
+        'customer_name': headers['customer_name'],
+        'invoice_date': pd.to_datetime(headers['invoice_date'], format='%Y-%m-%d', errors='coerce'),
+        'due_date': pd.to_datetime(headers['due_date'], format='%Y-%m-%d', errors='coerce'),
+        'total_cents': (headers['total'] * 100).round().astype('int64'),
+        'paid_cents': headers['paid_cents'].astype('int64'),
+    })
+
+
+def _line_frame(lines):
+    """Typed lines from a ledger query (money in currency units) or from concatenated typed frames."""
+    import pandas as pd
+
+    if 'amount_cents' not in lines:
+        lines = lines.assign(price_cents=(lines['price'] * 100).round(), amount_cents=(lines['amount'] * 100).round())
+    description = lines['description']
+    if not isinstance(description.dtype, pd.CategoricalDtype):
+        description = description.fillna('').astype(str).astype('category')
+    return pd.DataFrame({
+        'invoice_number': lines['invoice_number'].astype('int64'),
+        'position': lines['position'].astype('int64'),
+        'description': description,
+        'quantity': lines['quantity'].astype(float),
+        'price_cents': lines['price_cents'].astype('int64'),
+        'amount_cents': lines['amount_cents'].astype('int64'),
+    })
+
+
+def filter_history(history, start=None, end=None):
+    """The invoices (and their lines) dated start <= invoice_date < end."""
+    import pandas as pd
+
+    invoices = history.invoices
+    keep = pd.Series(True, index=invoices.index)
+    if start is not None:
+        keep &= invoices['invoice_date'] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= invoices['invoice_date'] < pd.Timestamp(end)
+    if keep.all():
+        return history
+    invoices = invoices[keep]
+    return History(invoices, history.lines[history.lines['invoice_number'].isin(invoices['invoice_number'])])
+
+
+def revenue_by_month(invoices):
+    """Invoiced amount and number of invoices per calendar month."""
+    import pandas as pd
+
+    grouped = invoices.groupby(invoices['invoice_date'].dt.to_period('M'))['total_cents'].agg(['sum', 'count'])
+    return pd.DataFrame({
+        'month': grouped.index.astype(str),
+        'invoices': grouped['count'].to_numpy(),
+        'revenue': grouped['sum'].to_numpy() / 100,
+    })
+
+
+def outstanding(invoices, today=None, payment_terms_days=14):
+    """
+    Invoices past their due date and not paid in full, as (summary per age
+    bucket, the invoices most overdue first), with the amount still open.
+    Invoices without a due date are due payment_terms_days after their date.
+    """
+    import pandas as pd
+
+    today = pd.Timestamp(today or date.today())
+    due = invoices['due_date'].fillna(invoices['invoice_date'] + pd.Timedelta(days=payment_terms_days))
+    open_cents = invoices['total_cents'] - invoices['paid_cents']
+    late = (due < today) & (open_cents > 0)
+    overdue = invoices[late]
+    open_cents = open_cents[late]
+    days = (today - due[late]).dt.days
+    bucket = pd.cut(days, AGE_BUCKETS, labels=AGE_LABELS)
+    details = pd.DataFrame({
+        'invoice_number': overdue['invoice_number'],
+        'customer_name': overdue['customer_name'],
+        'due_date': due[late].dt.date,
+        'days_overdue': days,
+        'age': bucket,
+        'amount': open_cents / 100,
+    }).sort_values(['days_overdue', 'invoice_number'], ascending=[False, True], ignore_index=True)
+    grouped = open_cents.groupby(bucket, observed=False).agg(['sum', 'count'])
+    summary = pd.DataFrame({
+        'age': grouped.index.astype(str),
+        'invoices': grouped['count'].to_numpy(),
+        'amount': grouped['sum'].to_numpy() / 100,
+    })
+    return summary, details
+
+
+def totals_by_description(lines, top=None):
+    """Quantity, amount and number of invoices per line description, largest amount first."""
+    import pandas as pd
+
+    grouped = lines.groupby('description', observed=True).agg(
+        quantity=('quantity', 'sum'), amount_cents=('amount_cents', 'sum'), invoices=('invoice_number', 'nunique'))
+    grouped = grouped.sort_values('amount_cents', ascending=False)
+    if top:
+        grouped = grouped.head(top)
+    return pd.DataFrame({
+        'description': grouped.index.astype(str),
+        'quantity': grouped['quantity'].to_numpy(),
+        'invoices': grouped['invoices'].to_numpy(),
+        'amount': grouped['amount_cents'].to_numpy() / 100,
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revenue, overdue and per-item reports over the invoice ledger.")
+    parser.add_argument("report", choices=["months", "outstanding", "descriptions"])
+    parser.add_argument("--ledger", default=LEDGER_PATH, help=f"Ledger file (default: {LEDGER_PATH})")
+    parser.add_argument("--start", type=date.fromisoformat, help="First invoice date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="First invoice date to exclude (YYYY-MM-DD)")
+    parser.add_argument("--top", type=int, help="Only the largest descriptions")
+    args = parser.parse_args(argv)
+
+    history = filter_history(load_history(args.ledger), args.start, args.end)
+    if args.report == "months":
+        report = revenue_by_month(history.invoices)
+    elif args.report == "descriptions":
+        report = totals_by_description(history.lines, args.top)
+    else:
+        summary, report = outstanding(history.invoices)
+        print(summary.to_string(index=False))
+        print(f"Total overdue: {summary['amount'].sum():.2f}\n")
+    print(report.to_string(index=False) if len(report) else "Nothing to report.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
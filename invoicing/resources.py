@@ -0,0 +1,118 @@
+"""
+Process-wide cache for the fonts and images every invoice embeds.
+
+Registering Tahoma with FPDF.add_font() parses the TTF file and walks its
+whole character map, and FPDF.image() decodes and re-compresses the
+2022x1630 logo. Both produce the same result for every invoice, so they are
+done once per process here and handed to each new document:
+
+    pdf = FPDF()
+    resources.add_font(pdf, 'Tahoma', '', r'C:\\Windows\\Fonts\\tahoma.ttf')
+    ...
+    resources.image(pdf, 'elslogo.png', x=90, y=250, w=30)
+
+Call reset_resource_cache() after replacing a font or the logo on disk.
+"""
+import copy
+import os
+import threading
+from io import BytesIO
+
+from fpdf import FPDF
+
+
+class ResourceCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fonts = {}   # (path, family, style) -> (fontkey, prototype font, raw file bytes)
+        self._images = {}  # path -> (image info, icc profiles)
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+            self._images.clear()
+
+    def add_font(self, pdf, family, style, fname):
+        """Equivalent of pdf.add_font(family, style, fname), parsing the file only once."""
+        key = (os.path.abspath(fname), family, style)
+        with self._lock:
+            entry = self._fonts.get(key)
+            if entry is None:
+                entry = self._fonts[key] = self._load_font(family, style, fname)
+        try:
+            self._install_font(pdf, *entry)
+        except (AttributeError, TypeError):
+            # Layout of fpdf's font objects changed; fall back to a normal parse
+            pdf.add_font(family, style, fname)
+
+    def image(self, pdf, name, **kwargs):
+        """Equivalent of pdf.image(name, **kwargs), decoding the file only once."""
+        key = os.path.abspath(name)
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is None:
+                entry = self._images[key] = self._load_image(name)
+        info, icc_profiles = entry
+        doc_cache = pdf.image_cache
+        if name not in doc_cache.images and (not icc_profiles or not doc_cache.icc_profiles):
+            # Seed the document's own image cache; fpdf then finds the decoded
+            # data there and only records the placement.
+            doc_info = copy.copy(info)
+            doc_info['i'] = len(doc_cache.images) + 1
+            doc_info['usages'] = 0
+            doc_cache.images[name] = doc_info
+            doc_cache.icc_profiles.update(icc_profiles)
+        return pdf.image(name, **kwargs)
+
+    @staticmethod
+    def _load_font(family, style, fname):
+        scratch = FPDF()
+        scratch.add_font(family, style, fname)
+        fontkey, font = next(iter(scratch.fonts.items()))
+        with open(fname, 'rb') as f:
+            data = f.read()
+        return fontkey, font, data
+
+    @staticmethod
+    def _install_font(pdf, fontkey, prototype, data):
+        from fontTools import ttLib
+
+        font = copy.copy(prototype)
+        font.i = len(pdf.fonts) + 1
+        # Subsetting at pdf.output() modifies the fontTools object in place,
+        # so each document needs its own. Lazy loading from memory is cheap;
+        # the expensive metrics (widths, cmap, glyph ids) stay shared.
+        font.ttfont = ttLib.TTFont(BytesIO(data), recalcTimestamp=False, lazy=True)
+        font.missing_glyphs = []
+        font.subset = copy.deepcopy(
+            prototype.subset,
+            {id(prototype): font, id(prototype.ttfont): font.ttfont},
+        )
+        for attr, value in (('biggest_size_pt', 0), ('_hbfont', None)):
+            if hasattr(type(font), attr):
+                setattr(font, attr, value)
+        pdf.fonts[fontkey] = font
+
+    @staticmethod
+    def _load_image(name):
+        scratch = FPDF()
+        scratch.add_page()
+        scratch.image(name, x=0, y=0)
+        info = scratch.image_cache.images[name]
+        return info, dict(scratch.image_cache.icc_profiles)
+
+
+_cache = ResourceCache()
+
+
+def add_font(pdf, family, style, fname):
+    _cache.add_font(pdf, family, style, fname)
+
+
+def image(pdf, name, **kwargs):
+    return _cache.image(pdf, name, **kwargs)
+
+
+def reset_resource_cache():
+    """Drop all cached fonts and images; the next render loads them from disk again."""
+    _cache.clear()
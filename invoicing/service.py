@@ -0,0 +1,263 @@
+"""
+Background invoice generation.
+
+The front ends hand invoices to a GenerationService instead of rendering
+inside the UI callback. The service runs an asyncio event loop on its own
+thread; jobs wait in an asyncio.Queue and a few consumer tasks render them
+on a process pool (render_invoice, like the batch run), then record them
+in the ledger. The UI thread only submits and polls:
+
+    service = GenerationService(workers=2)
+    job = service.submit(invoice_spec(27, "Jane Doe", lines), callback=print)
+    ...
+    for job in service.poll():          # jobs finished since the last poll
+        print(job.invoice_number, job.state, job.error)
+    service.close()
+
+A job's callback runs on the service thread as soon as it finishes; UIs
+that must not be touched from other threads (DearPyGui, Streamlit) poll
+instead.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from .batch import InvoiceSpec, profile_invoice, record_specs, render_invoice
+from .config import DEFAULT_DESCRIPTION
+from .core import sanitize_filename
+from .lines import line_rows
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def invoice_spec(invoice_number, recipient, lines, invoice_name="", language='nl', payment_terms_days=14,
+                 description=DEFAULT_DESCRIPTION, vat_rate=0, output_dir="invoices", suffix="",
+                 invoice_date=None, due_date=None, creation_date=None):
+    """
+    An InvoiceSpec for one invoice, with a snapshot of lines (a LineStore or
+    line dicts), so the UI can clear or edit its lines while the job waits.
+    The dates are as for render_pdf.
+    """
+    base_name = f"{invoice_number}_{sanitize_filename(recipient)}{suffix}"
+    return InvoiceSpec(
+        invoice_number=invoice_number,
+        recipient=recipient,
+        invoice_name=invoice_name,
+        lines=tuple((text, quantity, price) for text, quantity, price, _ in line_rows(lines)),
+        language=language,
+        payment_terms_days=payment_terms_days,
+        description=description,
+        vat_rate=vat_rate,
+        pdf_path=os.path.join(output_dir, base_name + ".pdf"),
+        csv_path=os.path.join(output_dir, base_name + ".csv"),
+        invoice_date=invoice_date,
+        due_date=due_date,
+        creation_date=creation_date,
+    )
+
+
+class Job:
+    """One submitted invoice. state moves queued -> running -> done or failed."""
+
+    def __init__(self, job_id, spec, callback=None, record=True, profiler=None):
+        self.id = job_id
+        self.spec = spec
+        self.callback = callback
+        self.record = record
+        self.profiler = profiler
+        self.state = QUEUED
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def invoice_number(self):
+        return self.spec.invoice_number
+
+    @property
+    def pdf_path(self):
+        return self.spec.pdf_path
+
+    @property
+    def done(self):
+        return self.state in (DONE, FAILED)
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def __repr__(self):
+        return f"Job({self.id}, #{self.invoice_number}, {self.state})"
+
+
+def _warm_worker():
+    # Load fpdf and the template module once per worker instead of in its first job
+    from . import template  # noqa: F401
+
+
+class GenerationService:
+    """
+    Renders submitted invoices in the background. workers is the number of
+    render processes (and of jobs in flight). The service starts on the
+    first submit and runs until close().
+    """
+
+    def __init__(self, workers=1, executor=None):
+        self.workers = max(1, workers)
+        self.jobs = {}
+        self._executor = executor
+        self._ids = itertools.count(1)
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._queue = None
+        self._pool = None
+
+    # Lifecycle
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='invoice-generation', daemon=True)
+                self._thread.start()
+        self._ready.wait()
+        return self
+
+    def close(self, wait=True):
+        """Finish the queued jobs, then stop the loop and the worker processes."""
+        if self._thread is None:
+            return
+        for _ in range(self.workers):
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        if wait:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._pool = self._executor or self._new_pool()
+        self._ready.set()
+        try:
+            await asyncio.gather(*(self._consume() for _ in range(self.workers)))
+        finally:
+            if self._executor is None:
+                self._pool.shutdown()
+
+    def _new_pool(self):
+        # spawn, not fork: both front ends run threads of their own, which fork
+        # does not copy safely. A spawned worker first runs the parent's
+        # __main__ again as __mp_main__: main.py stops at its __main__ guard,
+        # and under streamlit run __main__ is the page script, not
+        # Streamlit's launcher, so webapp.py names this module instead (see
+        # the top of webapp.py).
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    def _replace_broken_pool(self, pool):
+        # A worker that died (e.g. killed for memory) breaks the whole pool;
+        # fail only the jobs that were on it and carry on with a fresh one
+        if self._executor is None and self._pool is pool:
+            pool.shutdown(wait=False)
+            self._pool = self._new_pool()
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                return
+            job.state = RUNNING
+            job.started = time.time()
+            pool = self._pool
+            try:
+                if job.profiler is not None and job.profiler.enabled:
+                    records = await loop.run_in_executor(pool, profile_invoice, job.spec,
+                                                         job.profiler.options())
+                    job.profiler.merge(records)
+                else:
+                    await loop.run_in_executor(pool, render_invoice, job.spec)
+                if job.record:
+                    await loop.run_in_executor(None, record_specs, [job.spec])
+                job.state = DONE
+            except BrokenExecutor as e:
+                self._replace_broken_pool(pool)
+                job.error = e
+                job.state = FAILED
+            except Exception as e:
+                job.error = e
+                job.state = FAILED
+            job.finished = time.time()
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._lock:
+            self._finished.append(job)
+        job._done.set()
+        if job.callback is not None:
+            try:
+                job.callback(job)
+            except Exception:
+                traceback.print_exc()
+
+    # Jobs
+
+    def submit(self, spec, callback=None, record=True, profiler=None):
+        """
+        Queue one InvoiceSpec and return its Job. With record the invoice
+        goes into the ledger once rendered; an enabled profiler gets the
+        job's stage timings.
+        """
+        self.start()
+        job = Job(next(self._ids), spec, callback, record, profiler)
+        with self._lock:
+            self.jobs[job.id] = job
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job
+
+    def submit_many(self, specs, callback=None, record=True, profiler=None):
+        return [self.submit(spec, callback, record, profiler) for spec in specs]
+
+    def status(self, job_id):
+        return self.jobs[job_id].state
+
+    def counts(self):
+        """{state: number of jobs} over all jobs still known to the service."""
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+        with self._lock:
+            for job in self.jobs.values():
+                counts[job.state] += 1
+        return counts
+
+    def poll(self):
+        """The jobs that finished since the last poll, in completion order."""
+        with self._lock:
+            finished = list(self._finished)
+            self._finished.clear()
+        return finished
+
+    def forget_finished(self):
+        """Drop finished jobs from self.jobs, so a long-running service does not grow."""
+        with self._lock:
+            self.jobs = {job_id: job for job_id, job in self.jobs.items() if not job.done}
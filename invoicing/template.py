@@ -0,0 +1,285 @@
+"""
+Compiled invoice page layout.
+
+The top bar, company block, table header, description, payment
+instructions and logo are identical on every invoice of a given language.
+An InvoiceTemplate lays them out once: labels are translated and formatted,
+multi-line texts are wrapped into fixed lines and every element gets its
+final position. Rendering an invoice then replays that prepared list of
+drawing calls and only lays out the variable fields (title, number, dates,
+recipient, line items, total).
+
+Line items are streamed from an iterator and paginated as they are drawn:
+when a page is full the running subtotal is printed, a new page starts with
+the table header and the amount carried forward, and the totals, texts and
+logo go on the last page. Only the current row and the running subtotal are
+held, however many lines an invoice has.
+
+    font_family, font_files, currency = core.font_setup()
+    template = get_template(trans, HEADER_INFO, description, font_family, font_files, currency)
+    pdf = template.new_document()
+    template.render(pdf, title, number, invoice_date, due_date, customer_name, lines)
+    pdf.output(path)
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from fpdf import FPDF
+from fpdf.enums import MethodReturnValue
+
+from . import resources
+from .lines import format_quantity, line_rows
+from .money import from_cents, to_cents, vat_breakdown
+from .profiling import stage
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'elslogo.png')
+
+# Page geometry (mm, A4 portrait)
+RIGHT_COLUMN_X = 120
+DETAILS_Y = 45
+TABLE_Y = 87  # four 8 mm detail rows below DETAILS_Y plus a 10 mm gap
+CONTINUATION_TABLE_Y = 25  # table start on the following pages
+COLUMN_WIDTHS = (80, 30, 40, 40)
+ROW_HEIGHT = 10
+PAGE_BOTTOM = 277  # A4 height minus a 20 mm bottom margin
+LOGO_Y = 250  # the logo sits below everything else on the last page
+
+# Compiled templates kept at once; every distinct description (free text in
+# the web app) compiles one, so the least recently used are dropped
+MAX_TEMPLATES = 16
+
+
+class _Recorder:
+    """Stands in for an FPDF while compiling: records the calls instead of drawing."""
+
+    def __init__(self):
+        self.ops = []
+
+    def __getattr__(self, name):
+        method = getattr(FPDF, name)
+
+        def record(*args):
+            self.ops.append((method, args))
+        return record
+
+
+def _draw_logo(pdf):
+    # Add logo at the bottom of the page (footer) without distortion and at a visible position
+    try:
+        with stage('image'):
+            resources.image(pdf, LOGO_PATH, x=90, y=LOGO_Y, w=30)
+    except Exception:
+        pass
+
+
+def replay(pdf, ops):
+    for method, args in ops:
+        method(pdf, *args)
+
+
+class InvoiceTemplate:
+    def __init__(self, trans, header_info, description, font_family='Tahoma', font_files=None, currency='€'):
+        self.trans = trans
+        self.font_family = font_family
+        self.font_files = font_files or {}
+        self.currency = currency
+        self.page_ops = self._compile_page(header_info)
+        self.table_header_ops = self._compile_table_header()
+        self.continuation_ops = self._compile_continuation()
+        self.footer_ops = self._compile_footer(description)
+
+    def new_document(self):
+        """A fresh A4 document with the template's fonts registered and one page added."""
+        pdf = FPDF()
+        # Page breaks are placed by render(), which repeats the table header
+        pdf.set_auto_page_break(False)
+        for style, path in self.font_files.items():
+            resources.add_font(pdf, self.font_family, style, path)
+        pdf.add_page('P', 'A4')
+        return pdf
+
+    def _compile_page(self, header_info):
+        rec = _Recorder()
+        # Colored bar at the top
+        rec.set_fill_color(172, 202, 38)  # #acca26
+        rec.rect(0, 0, 210, 10, 'F')
+
+        # Company info in light grey at top right
+        rec.set_text_color(169, 169, 169)
+        rec.set_font(self.font_family, '', 8)
+        for row, (key, value) in enumerate(header_info.items()):
+            rec.set_xy(RIGHT_COLUMN_X, DETAILS_Y + 6 * row)
+            rec.cell(30, 6, f"{key}:", 0, 0, 'R')
+            rec.cell(0, 6, value, 0, 1, 'L')
+        return rec.ops
+
+    def _compile_continuation(self):
+        rec = _Recorder()
+        rec.set_fill_color(172, 202, 38)  # #acca26
+        rec.rect(0, 0, 210, 10, 'F')
+        return rec.ops
+
+    def _compile_table_header(self):
+        rec = _Recorder()
+        trans = self.trans
+        rec.set_text_color(0, 0, 0)
+        rec.set_font(self.font_family, 'B', 11)
+        rec.set_fill_color(240, 240, 240)
+        labels = (trans['description'], trans['quantity'], trans['price'], trans['amount'])
+        for i, (width, label) in enumerate(zip(COLUMN_WIDTHS, labels)):
+            rec.cell(width, 10, label, 0, 1 if i == len(labels) - 1 else 0, 'L', 1)
+        return rec.ops
+
+    def _compile_footer(self, description):
+        # Wrap the multi-line texts once with the real font metrics
+        measure = self.new_document()
+        measure.set_font(self.font_family, '', 10)
+        description_lines = measure.multi_cell(190, 6, description, 0, 'L',
+                                               dry_run=True, output=MethodReturnValue.LINES)
+        instruction_lines = measure.multi_cell(190, 6, self.trans['payment_instructions'], 0, 'L',
+                                               dry_run=True, output=MethodReturnValue.LINES)
+
+        rec = _Recorder()
+        # Description block
+        rec.ln(5)
+        rec.set_font(self.font_family, '', 10)
+        rec.set_text_color(169, 169, 169)
+        for line in description_lines:
+            rec.cell(190, 6, line, 0, 1, 'L')
+
+        # Payment instructions
+        rec.ln(5)
+        rec.set_text_color(0, 0, 0)
+        for line in instruction_lines:
+            rec.cell(190, 6, line, 0, 1, 'L')
+        rec.ops.append((_draw_logo, ()))
+        # Height of everything from the end of the table down to the last text line
+        self.footer_height = 5 + 6 * len(description_lines) + 5 + 6 * len(instruction_lines)
+        return rec.ops
+
+    def _new_page(self, pdf, invoice_number):
+        """Start a following page: top bar plus the invoice number in the details style."""
+        pdf.add_page('P', 'A4')
+        replay(pdf, self.continuation_ops)
+        pdf.set_text_color(169, 169, 169)
+        pdf.set_font(self.font_family, '', 8)
+        pdf.set_xy(10, 14)
+        pdf.cell(95, 8, f"{self.trans['invoice_number']}: {invoice_number}", 0, 1)
+        pdf.set_xy(10, CONTINUATION_TABLE_Y)
+        pdf.set_text_color(0, 0, 0)
+
+    def _subtotal_row(self, pdf, label, subtotal_cents):
+        pdf.set_text_color(105, 105, 105)
+        pdf.set_font(self.font_family, '', 10)
+        pdf.cell(150, ROW_HEIGHT, f"{label}:", 0, 0, 'L')
+        pdf.cell(40, ROW_HEIGHT, f"{self.currency} {from_cents(subtotal_cents):.2f}", 0, 1, 'L')
+        pdf.set_text_color(0, 0, 0)
+
+    def _break_table(self, pdf, invoice_number, subtotal_cents):
+        """Close the full page with the subtotal and continue the table on a new one."""
+        self._subtotal_row(pdf, self.trans['subtotal'], subtotal_cents)
+        self._new_page(pdf, invoice_number)
+        replay(pdf, self.table_header_ops)
+        self._subtotal_row(pdf, self.trans['carried_forward'], subtotal_cents)
+        pdf.set_font(self.font_family, '', 10)
+
+    def render(self, pdf, title, invoice_number, invoice_date, due_date, customer_name, lines, vat_rate=0):
+        """
+        Draw one invoice starting on the current page of pdf and return its
+        total. lines is a LineStore or any iterable of line dicts, consumed once.
+        """
+        trans = self.trans
+        family = self.font_family
+        currency = self.currency
+
+        replay(pdf, self.page_ops)
+
+        # Header title (FACTUUR/INVOICE)
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_y(35)
+        pdf.set_font(family, 'B', 16)
+        pdf.cell(190, 10, title, 0, 1, 'C')
+
+        # Invoice details block
+        pdf.set_text_color(169, 169, 169)
+        pdf.set_font(family, '', 8)
+        pdf.set_xy(10, DETAILS_Y)
+        pdf.cell(95, 8, f"{trans['invoice_number']}: {invoice_number}", 0, 2)
+        pdf.cell(95, 8, f"{trans['date']}: {invoice_date.strftime('%Y-%m-%d')}", 0, 2)
+        pdf.cell(95, 8, f"{trans['customer']}: {customer_name}", 0, 2)
+        pdf.cell(95, 8, f"{trans['due_date']}: {due_date.strftime('%Y-%m-%d')}", 0, 1)
+
+        pdf.set_xy(10, TABLE_Y)
+        replay(pdf, self.table_header_ops)
+
+        # Table content
+        pdf.set_font(family, '', 10)
+        subtotal_cents = 0
+        for i, (line_description, quantity, price, amount) in enumerate(line_rows(lines)):
+            # Keep room below each row for the subtotal row of a full page
+            if pdf.get_y() + 2 * ROW_HEIGHT > PAGE_BOTTOM:
+                self._break_table(pdf, invoice_number, subtotal_cents)
+
+            # Alternate row colors
+            fill = i % 2 == 1
+            pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
+
+            pdf.cell(80, 10, str(line_description), 0, 0, 'L', fill)
+            pdf.cell(30, 10, format_quantity(quantity), 0, 0, 'L', fill)
+            pdf.cell(40, 10, f"{currency} {price:.2f}", 0, 0, 'L', fill)
+            pdf.cell(40, 10, f"{currency} {amount:.2f}", 0, 1, 'L', fill)
+            subtotal_cents += to_cents(amount)
+        total = from_cents(subtotal_cents)
+
+        # Totals and texts go on a new page if they would run into the logo
+        totals_height = 14 + (16 if vat_rate else 0)
+        if pdf.get_y() + totals_height + self.footer_height > LOGO_Y:
+            self._new_page(pdf, invoice_number)
+
+        # Total line
+        pdf.ln(2)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(2)
+        if vat_rate:
+            net_cents, vat_cents = vat_breakdown(subtotal_cents, vat_rate)
+            pdf.set_font(family, '', 10)
+            pdf.cell(150, 8, f"{trans['subtotal_excl_vat']}:", 0, 0)
+            pdf.cell(40, 8, f"{currency} {from_cents(net_cents):.2f}", 0, 1, 'R')
+            pdf.cell(150, 8, f"{trans['vat']} {vat_rate:g}%:", 0, 0)
+            pdf.cell(40, 8, f"{currency} {from_cents(vat_cents):.2f}", 0, 1, 'R')
+        pdf.set_font(family, 'B', 11)
+        pdf.cell(150, 10, f"{trans['total']}:", 0, 0)
+        pdf.cell(40, 10, f"{currency} {total:.2f}", 0, 1, 'R')
+
+        replay(pdf, self.footer_ops)
+        return total
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+def get_template(trans, header_info, description, font_family='Tahoma', font_files=None, currency='€'):
+    """
+    Return the compiled template for these static inputs, compiling it on
+    first use. The MAX_TEMPLATES most recently used stay compiled.
+    """
+    key = (tuple(trans.items()), tuple(header_info.items()), description,
+           font_family, tuple(sorted((font_files or {}).items())), currency)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    template = InvoiceTemplate(trans, header_info, description, font_family, font_files, currency)
+    with _templates_lock:
+        _templates[key] = template
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def clear_templates():
+    with _templates_lock:
+        _templates.clear()
@@ -0,0 +1,48 @@
+"""Texts printed on the invoice, shared by the desktop and web front ends."""
+
+TRANSLATIONS = {
+    'nl': {
+        'invoice': 'FACTUUR',
+        'invoice_number': 'Factuurnummer',
+        'date': 'Datum',
+        'customer': 'Ontvanger',
+        'due_date': 'Vervaldatum',
+        'description': 'Omschrijving',
+        'quantity': 'Aantal',
+        'price': 'Stukprijs',
+        'amount': 'Bedrag',
+        'total': 'Totaal',
+        'subtotal': 'Subtotaal',
+        'carried_forward': 'Transport',
+        'subtotal_excl_vat': 'Subtotaal excl. btw',
+        'vat': 'btw',
+        'payment_instructions': 'Gelieve binnen de termijn over te maken op NL51 ABNA 0552 4048 45 t.n.v DSSV ELS en onder vermelding van het factuurnummer'
+    },
+    'en': {
+        'invoice': 'INVOICE',
+        'invoice_number': 'Invoice #',
+        'date': 'Date',
+        'customer': 'Recipient',
+        'due_date': 'Due Date',
+        'description': 'Description',
+        'quantity': 'Quantity',
+        'price': 'Price',
+        'amount': 'Amount',
+        'total': 'Total',
+        'subtotal': 'Subtotal',
+        'carried_forward': 'Carried forward',
+        'subtotal_excl_vat': 'Subtotal excl. VAT',
+        'vat': 'VAT',
+        'payment_instructions': 'Please transfer the amount within the payment term to NL51 ABNA 0552 4048 45 in name of DSSV ELS, stating the invoice number'
+    }
+}
+
+# Company info printed in light grey at the top right of every invoice
+HEADER_INFO = {
+    "Name": "DSSV ELS",
+    "Web": "www.effelekkerschaatsen.com",
+    "Address": "Mekelweg 8 2628CD Delft",
+    "Mail": "penningmeester@dssvels.com",
+    "IBAN": "NL51 ABNA 0552 4048 45",
+    "KVK nr": "27183125"
+}
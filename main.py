@@ -1,214 +1,103 @@
 import dearpygui.dearpygui as dpg
-from fpdf import FPDF
-import pandas as pd
-from datetime import datetime
 import os
-import json
-import re # Added for filename sanitization
+from datetime import date
+from invoicing import (DEFAULT_DESCRIPTION, TRANSLATIONS, GenerationService, LineStore, Profiler,
+                       allocate_invoice_numbers, describe_rejected, extend_store, format_quantity, import_lines,
+                       invoice_spec, load_config, render_pdf, reproducible_dates, resolve_columns,
+                       sanitize_filename, save_config, write_csv)
 
 class InvoiceManager:    
-    def __init__(self):
-        self.invoice_lines = []
+    def __init__(self, autoload_config=True):
+        self.invoice_lines = LineStore()
         self.invoice_number = 1
         self.payment_terms_days = 14
         self.language = 'nl'  # Default to Dutch
-        self.description = "Invoice for ice skating activities at DSSV ELS."
-        self.translations = {
-            'nl': {
-                'invoice': 'FACTUUR',
-                'invoice_number': 'Factuurnummer',
-                'date': 'Datum',
-                'customer': 'Ontvanger',
-                'due_date': 'Vervaldatum',
-                'description': 'Omschrijving',
-                'quantity': 'Aantal',
-                'price': 'Stukprijs',
-                'amount': 'Bedrag',
-                'total': 'Totaal',
-                'payment_instructions': 'Gelieve binnen de termijn over te maken op NL51 ABNA 0552 4048 45 t.n.v DSSV ELS en onder vermelding van het factuurnummer'
-            },
-            'en': {
-                'invoice': 'INVOICE',
-                'invoice_number': 'Invoice #',
-                'date': 'Date',
-                'customer': 'Recipient',
-                'due_date': 'Due Date',
-                'description': 'Description',
-                'quantity': 'Quantity',
-                'price': 'Price',
-                'amount': 'Amount',
-                'total': 'Total',
-                'payment_instructions': 'Please transfer the amount within the payment term to NL51 ABNA 0552 4048 45 in name of DSSV ELS, stating the invoice number'
-            }
-        }
-        self.load_config()
+        self.description = DEFAULT_DESCRIPTION
+        self.vat_rate = 0
+        # A date switches on reproducible PDFs: printed with this date and stamped with it
+        self.reproducible_date = None
+        self.translations = TRANSLATIONS
+        # Set INVOICE_PROFILE=1 to print stage timings after every generated invoice
+        self.profiler = Profiler.from_env()
+        if autoload_config:
+            self.load_config()
         
     def load_config(self):
-        try:
-            with open('invoice_config.json', 'r') as f:
-                config = json.load(f)
-                self.invoice_number = config.get('last_invoice_number', 1)
-                self.payment_terms_days = config.get('payment_terms_days', 14)
-                self.language = config.get('language', 'nl')
-                self.description = config.get('description', self.description)
-        except FileNotFoundError:
-            self.save_config()
+        config = load_config()
+        self.invoice_number = config['last_invoice_number']
+        self.payment_terms_days = config['payment_terms_days']
+        self.language = config['language']
+        self.description = config['description']
+        self.vat_rate = config['vat_rate']
     
     def save_config(self):
-        with open('invoice_config.json', 'w') as f:
-            json.dump({
-                'last_invoice_number': self.invoice_number,
-                'payment_terms_days': self.payment_terms_days,
-                'language': self.language,
-                'description': self.description
-            }, f)
+        save_config({
+            'last_invoice_number': self.invoice_number,
+            'payment_terms_days': self.payment_terms_days,
+            'language': self.language,
+            'description': self.description,
+            'vat_rate': self.vat_rate
+        })
+
+    def allocate_invoice_number(self):
+        """Reserve the next invoice number in the shared config file."""
+        invoice_number = allocate_invoice_numbers()
+        self.invoice_number = invoice_number + 1
+        return invoice_number
 
     def add_line(self, description, quantity, price):
-        amount = float(quantity) * float(price)
-        self.invoice_lines.append({
-            'description': description,
-            'quantity': quantity,
-            'price': price,
-            'amount': amount
-        })
-        return len(self.invoice_lines) - 1
+        return self.invoice_lines.append(description, quantity, price)
 
     def remove_line(self, index):
         if 0 <= index < len(self.invoice_lines):
             self.invoice_lines.pop(index)
 
+    def remove_lines(self, indices):
+        self.invoice_lines.remove_many(indices)
+
     def clear_lines(self):
         self.invoice_lines.clear()    
     
-    def generate_pdf(self, customer_name, invoice_name, save_path, invoice_number_to_display):
-        pdf = FPDF()
-        # Add Tahoma font
-        pdf.add_font('Tahoma', '', r'C:\Windows\Fonts\tahoma.ttf', uni=True)
-        pdf.add_font('Tahoma', 'B', r'C:\Windows\Fonts\tahomabd.ttf', uni=True)
-        pdf.add_page('P', 'A4')
-    
-        # Initialize translations and dates
-        trans = self.translations[self.language]
-        invoice_date = datetime.now()
-        payment_due_date = invoice_date + pd.Timedelta(days=self.payment_terms_days)
-
-        # Add colored bar at the top
-        pdf.set_fill_color(172, 202, 38)  # #acca26
-        pdf.rect(0, 0, 210, 10, 'F')
-
-        # Header title (FACTUUR/INVOICE)
-        pdf.set_y(35)  # Moved down to avoid collision
-        pdf.set_font('Tahoma', 'B', 16)
-        pdf.cell(190, 10, invoice_name or trans['invoice'], 0, 1, 'C')
-
-        # Company info in light grey at top right
-        pdf.set_text_color(169, 169, 169)
-        pdf.set_font('Tahoma', '', 8)
-        header_info = {
-            "Name": "DSSV ELS",
-            "Web": "www.effelekkerschaatsen.com",
-            "Address": "Mekelweg 8 2628CD Delft",
-            "Mail": "penningmeester@dssvels.com",
-            "IBAN": "NL51 ABNA 0552 4048 45",
-            "KVK nr": "27183125"
-        }
-
-        # Position header info on the right side
-        right_column_x = 120
-        pdf.set_xy(right_column_x, 45)
-        for key, value in header_info.items():
-            x_pos = pdf.get_x()
-            pdf.set_x(right_column_x)
-            pdf.cell(30, 6, f"{key}:", 0, 0, 'R')
-            pdf.cell(0, 6, value, 0, 1, 'L')
-
-        # Customer and invoice details on the left
-        pdf.set_text_color(169, 169, 169)
-        pdf.set_font('Tahoma', '', 8)
-        pdf.set_xy(10, 45)
-        
-        
-        # Invoice details block
-        pdf.cell(95, 8, f"{trans['invoice_number']}: {invoice_number_to_display}", 0, 2)
-        pdf.cell(95, 8, f"{trans['date']}: {invoice_date.strftime('%Y-%m-%d')}", 0, 2)
-        pdf.cell(95, 8, f"{trans['customer']}: {customer_name}", 0, 2)
-        pdf.cell(95, 8, f"{trans['due_date']}: {payment_due_date.strftime('%Y-%m-%d')}", 0, 1)
-        
-        # Move to position for table
-        pdf.ln(10)
-        pdf.set_text_color(0,0,0)
-        # Table header
-        pdf.set_font('Tahoma', 'B', 11)
-        pdf.set_fill_color(240, 240, 240)
-        pdf.cell(80, 10, trans['description'], 0, 0, 'L', 1)
-        pdf.cell(30, 10, trans['quantity'], 0, 0, 'L', 1)
-        pdf.cell(40, 10, trans['price'], 0, 0, 'L', 1)
-        pdf.cell(40, 10, trans['amount'], 0, 1, 'L', 1)
-
-        # Table content
-        pdf.set_font('Tahoma', '', 10)
-        total = 0
-        for i, line in enumerate(self.invoice_lines):
-            # Alternate row colors
-            fill = i % 2 == 1
-            pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
-            
-            pdf.cell(80, 10, str(line['description']), 0, 0, 'L', fill)
-            pdf.cell(30, 10, str(line['quantity']), 0, 0, 'L', fill)
-            pdf.cell(40, 10, f"€ {line['price']:.2f}", 0, 0, 'L', fill)
-            pdf.cell(40, 10, f"€ {line['amount']:.2f}", 0, 1, 'L', fill)
-            total += line['amount']
-
-        # Total line
-        pdf.ln(2)
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(2)
-        pdf.set_font('Tahoma', 'B', 11)        
-        pdf.cell(150, 10, f"{trans['total']}:", 0, 0)
-        pdf.cell(40, 10, f"€ {total:.2f}", 0, 1, 'R')
-
-        # Description block
-        pdf.ln(5)
-        pdf.set_font('Tahoma', '', 10)
-        pdf.set_text_color(169, 169, 169)
-        pdf.multi_cell(190, 6, self.description, 0, 'L')
-        
-        # Payment instructions
-        pdf.ln(5)
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font('Tahoma', '', 10)
-        pdf.multi_cell(190, 6, trans['payment_instructions'], 0, 'L')
-
-        # Add logo at the bottom of the page (footer) without distortion and at a visible position
-        try:
-            pdf.image('elslogo.png', x=90, y=250, w=30)
-        except Exception:
-            pass
+    def invoice_dates(self):
+        """(invoice_date, due_date, creation_date) for render_pdf; all None unless reproducible."""
+        if self.reproducible_date is None:
+            return None, None, None
+        return reproducible_dates(self.reproducible_date, self.payment_terms_days)
 
-        # Save PDF
-        pdf.output(save_path)
+    def generate_pdf(self, customer_name, invoice_name, save_path, invoice_number_to_display,
+                     invoice_date=None, due_date=None, creation_date=None):
+        if invoice_date is None and due_date is None and creation_date is None:
+            invoice_date, due_date, creation_date = self.invoice_dates()
+        render_pdf(save_path, self.invoice_lines, customer_name, invoice_number_to_display, invoice_name,
+                   self.language, self.payment_terms_days, self.description, invoice_date, self.vat_rate,
+                   due_date, creation_date)
         # Note: Invoice number increment and config save moved to GUI layer
 
+    def invoice_spec(self, customer_name, invoice_name, invoice_number, suffix=""):
+        """A snapshot of the current invoice for the generation service."""
+        invoice_date, due_date, creation_date = self.invoice_dates()
+        return invoice_spec(invoice_number, customer_name, self.invoice_lines, invoice_name, self.language,
+                            self.payment_terms_days, self.description, self.vat_rate, suffix=suffix,
+                            invoice_date=invoice_date, due_date=due_date, creation_date=creation_date)
+
     def save_to_csv(self, customer_name, save_path, invoice_number_to_use):
-        df = pd.DataFrame(self.invoice_lines)
-        df['invoice_number'] = invoice_number_to_use
-        df['customer_name'] = customer_name
-        df['date'] = datetime.now().strftime("%Y-%m-%d")
-        df.to_csv(save_path, index=False)
+        write_csv(save_path, self.invoice_lines, customer_name, invoice_number_to_use)
 
-    def add_lines_from_clipboard(self):
+    def add_lines_from_clipboard(self, rejected=None):
         import pandas as pd
         try:
             df = pd.read_clipboard()
-            for _, row in df.iterrows():
-                # Try to find columns for description, quantity, price
-                desc = row.get('Description') or row.get('Omschrijving') or str(row.iloc[0])
-                qty = row.get('Quantity') or row.get('Aantal') or row.get('Qty') or row.get('Aantal') or row.iloc[1]
-                price = row.get('Price') or row.get('Prijs') or row.iloc[2]
-                self.add_line(desc, qty, price)
+            extend_store(self.invoice_lines, df, resolve_columns(df.columns, positional=True), rejected)
         except Exception as e:
             print(f"Failed to read clipboard: {e}")
 
+    def add_lines_from_file(self, path, rejected=None):
+        """
+        Import a CSV, TSV or Excel file in chunks; returns the number of lines
+        added. Rows that could not be read are appended to rejected.
+        """
+        return import_lines(self.invoice_lines, path, rejected=rejected)
+
     def generate_test_data(self):
         """Generate dummy data for testing"""
         self.clear_lines()
@@ -218,13 +107,108 @@ class InvoiceManager:
             ("Training subscription (monthly)", 1, 45.00),
             ("Competition entry fee", 1, 15.00)
         ]
-        for desc, qty, price in test_items:
-            self.add_line(desc, qty, price)
+        self.invoice_lines.extend(test_items)
         return "Test Customer"
 
+class LineTable:
+    """
+    Rows of invoice_table for one page of a LineStore, keyed by line ID.
+
+    An edit only creates or deletes the rows it affects, and at most
+    PAGE_SIZE rows exist at a time, so adding, deleting or pasting lines
+    costs about the same for a 10-line invoice as for a 10,000-line one.
+    """
+    PAGE_SIZE = 100
+
+    def __init__(self, lines, table, pager_text, on_delete):
+        self.lines = lines
+        self.table = table
+        self.pager_text = pager_text
+        self.on_delete = on_delete
+        self.page = 0
+        self.shown = []  # line IDs of the rows in the table, top to bottom
+
+    @staticmethod
+    def row_tag(line_id):
+        return f"line_row_{line_id}"
+
+    def page_count(self):
+        return max(1, -(-len(self.lines) // self.PAGE_SIZE))
+
+    def _page_end(self):
+        return min(len(self.lines), (self.page + 1) * self.PAGE_SIZE)
+
+    def _add_row(self, index):
+        line_id = self.lines.ids[index]
+        line = self.lines[index]
+        with dpg.table_row(parent=self.table, tag=self.row_tag(line_id)):
+            dpg.add_text(line['description'])
+            dpg.add_text(format_quantity(line['quantity']))
+            dpg.add_text(f"{line['price']:.2f}")
+            dpg.add_text(f"{line['amount']:.2f}")
+            dpg.add_button(label="Delete", callback=self.on_delete, user_data=line_id)
+        self.shown.append(line_id)
+
+    def _fill(self):
+        """Add rows for lines that belong on this page but are not shown yet."""
+        first = self.page * self.PAGE_SIZE
+        for index in range(first + len(self.shown), self._page_end()):
+            self._add_row(index)
+
+    def _update_pager(self):
+        first = self.page * self.PAGE_SIZE
+        if len(self.lines) <= self.PAGE_SIZE:
+            dpg.set_value(self.pager_text, f"{len(self.lines)} line(s)")
+        else:
+            dpg.set_value(self.pager_text, f"Lines {first + 1}-{self._page_end()} of {len(self.lines)} "
+                                           f"(page {self.page + 1}/{self.page_count()})")
+
+    def show_page(self, page):
+        page = min(max(page, 0), self.page_count() - 1)
+        for line_id in self.shown:
+            dpg.delete_item(self.row_tag(line_id))
+        self.shown = []
+        self.page = page
+        self._fill()
+        self._update_pager()
+
+    def refresh(self):
+        """
+        Bring the table up to date after lines were added, or the store was
+        cleared or replaced. Rows still showing the right lines are kept.
+        """
+        first = self.page * self.PAGE_SIZE
+        if list(self.lines.ids[first:first + len(self.shown)]) != self.shown:
+            self.show_page(self.page)
+            return
+        self._fill()
+        self._update_pager()
+
+    def line_added(self):
+        """Show the last line appended to the store, turning to the last page if needed."""
+        if self.page != self.page_count() - 1:
+            self.show_page(self.page_count() - 1)
+        else:
+            self.refresh()
+
+    def line_removed(self, line_id):
+        """Drop the row of a line just removed from the store; the next line moves up into the page."""
+        if line_id not in self.shown:
+            self.refresh()
+            return
+        dpg.delete_item(self.row_tag(line_id))
+        self.shown.remove(line_id)
+        if not self.shown and self.page > 0:
+            self.show_page(self.page - 1)
+        else:
+            self.refresh()
+
+
 class InvoiceGUI:
     def __init__(self):
         self.invoice_manager = InvoiceManager()
+        # Renders in worker processes so the window keeps drawing while invoices are written
+        self.service = GenerationService()
         self.setup_gui()
         
     def setup_gui(self):
@@ -235,7 +219,17 @@ class InvoiceGUI:
         with dpg.window(label="Error", modal=True, show=False, tag="error_popup", width=300, height=100, pos=[250, 250]):
             dpg.add_text("Please fill in all required fields!")
             dpg.add_button(label="OK", callback=lambda: dpg.hide_item("error_popup"), width=75)
+
+        # Rows an import or paste left out, so they are not lost silently
+        with dpg.window(label="Import", modal=True, show=False, tag="import_popup", width=500, height=250, pos=[150, 175]):
+            dpg.add_text("", tag="import_popup_text", wrap=480)
+            dpg.add_button(label="OK", callback=lambda: dpg.hide_item("import_popup"), width=75)
         
+        with dpg.file_dialog(show=False, tag="import_dialog", callback=self.import_file_callback,
+                             width=600, height=400):
+            dpg.add_file_extension("Line tables (*.csv *.tsv *.xlsx *.xls){.csv,.tsv,.xlsx,.xls}")
+            dpg.add_file_extension(".*")
+
         with dpg.window(label="Invoice Generator", tag="primary_window"):            # Customer Information
             dpg.add_text("Recipient Information")
             dpg.add_input_text(label="Recipient Name", tag="customer_name")
@@ -249,22 +243,37 @@ class InvoiceGUI:
             dpg.add_input_float(label="Price", tag="price", default_value=0.00)
             dpg.add_button(label="Add Line", callback=self.add_line_callback)
             
-            # Invoice Lines Table
-            with dpg.table(header_row=True, tag="invoice_table"):
+            # Invoice Lines Table; long invoices are shown one page at a time
+            with dpg.table(header_row=True, tag="invoice_table", clipper=True):
                 dpg.add_table_column(label="Description")
                 dpg.add_table_column(label="Quantity")
                 dpg.add_table_column(label="Price")
                 dpg.add_table_column(label="Amount")
                 dpg.add_table_column(label="Actions")
+            with dpg.group(horizontal=True):
+                dpg.add_button(label="<", callback=lambda: self.line_table.show_page(self.line_table.page - 1))
+                dpg.add_button(label=">", callback=lambda: self.line_table.show_page(self.line_table.page + 1))
+                dpg.add_text("0 line(s)", tag="invoice_pager")
+            self.line_table = LineTable(self.invoice_manager.invoice_lines, "invoice_table", "invoice_pager",
+                                        self.delete_line_callback)
             
             # Settings
             dpg.add_text("Settings")
             dpg.add_input_int(label="Payment Terms (days)", tag="payment_terms", default_value=14, callback=self.update_payment_terms)
             dpg.add_combo(label="Language", items=["Dutch", "English"], default_value="Dutch" if self.invoice_manager.language == 'nl' else "English", 
                          callback=self.update_language, tag="language_selector")
+            dpg.add_input_float(label="VAT included in prices (%)", tag="vat_rate", default_value=self.invoice_manager.vat_rate,
+                                min_value=0, min_clamped=True, callback=self.update_vat_rate)
+            with dpg.group(horizontal=True):
+                dpg.add_checkbox(label="Reproducible PDFs, dated", tag="reproducible",
+                                 callback=self.update_reproducible_date)
+                dpg.add_input_text(tag="reproducible_date", default_value=date.today().isoformat(), width=100,
+                                   hint="YYYY-MM-DD", callback=self.update_reproducible_date)
+                dpg.add_text("", tag="reproducible_status")
               # Invoice Line Management
             with dpg.group(horizontal=True):
                 dpg.add_button(label="Paste from Clipboard", callback=self.paste_lines_callback)
+                dpg.add_button(label="Import from File", callback=lambda: dpg.show_item("import_dialog"))
                 dpg.add_button(label="Clear All Lines", callback=self.clear_all_callback)
             
             # Generate Options
@@ -273,32 +282,21 @@ class InvoiceGUI:
                 dpg.add_button(label="Generate Invoice", callback=self.generate_invoice_callback)
                 dpg.add_button(label="Generate Test PDF", callback=self.generate_test_pdf_callback)
             dpg.add_button(label="Generate Test Data", callback=self.generate_test_data_callback)
+            dpg.add_text("", tag="generation_status")
         
         dpg.setup_dearpygui()
         dpg.show_viewport()
         dpg.set_primary_window("primary_window", True)
-        dpg.start_dearpygui()
+        # Manual render loop instead of start_dearpygui(), to pick up finished invoices every frame
+        while dpg.is_dearpygui_running():
+            self.poll_generation()
+            dpg.render_dearpygui_frame()
+        # Let queued invoices finish before exiting
+        self.service.close()
+        dpg.destroy_context()
         
     def sanitize_filename(self, filename_str):
-        """
-        Sanitizes a string to be used as a filename.
-        Replaces spaces with underscores.
-        Removes characters that are not alphanumeric, underscore, hyphen, or period.
-        If the result is empty or invalid, returns a default name.
-        """
-        if not filename_str:
-            return "untitled"
-        
-        s = str(filename_str).replace(" ", "_")
-        s = re.sub(r'[^\w\._-]', '', s)
-        s = s.strip('_-.') # Remove leading/trailing problematic chars
-
-        if not s or all(c in '_-.' for c in s):
-            # If empty after sanitization or only consists of separators
-            # (e.g. customer name was "...")
-            return "sanitized_recipient" 
-            
-        return s
+        return sanitize_filename(filename_str)
 
     def clear_invoice_lines_and_inputs(self):
         """Clears only the invoice lines and their input fields."""
@@ -317,14 +315,28 @@ class InvoiceGUI:
         self.invoice_manager.payment_terms_days = app_data
         self.invoice_manager.save_config()
         
+    def update_vat_rate(self, sender, app_data):
+        self.invoice_manager.vat_rate = round(app_data, 2)
+        self.invoice_manager.save_config()
+
+    def update_reproducible_date(self, sender=None, app_data=None):
+        self.invoice_manager.reproducible_date = None
+        dpg.set_value("reproducible_status", "")
+        if not dpg.get_value("reproducible"):
+            return
+        try:
+            self.invoice_manager.reproducible_date = date.fromisoformat(dpg.get_value("reproducible_date").strip())
+        except ValueError:
+            dpg.set_value("reproducible_status", "Not a date; PDFs are dated today")
+
     def add_line_callback(self):
         description = dpg.get_value("description")
         quantity = dpg.get_value("quantity")
         price = dpg.get_value("price")
         
         if description and quantity and price:
-            index = self.invoice_manager.add_line(description, quantity, price)
-            self.update_table()
+            self.invoice_manager.add_line(description, quantity, price)
+            self.line_table.line_added()
             
             # Clear inputs
             dpg.set_value("description", "")
@@ -332,24 +344,15 @@ class InvoiceGUI:
             dpg.set_value("price", 0.00)
             
     def update_table(self):
-        # Clear existing rows
-        if dpg.does_item_exist("invoice_table"):
-            children = dpg.get_item_children("invoice_table")[1]
-            for child in children:
-                dpg.delete_item(child)
-        
-        # Add new rows
-        for i, line in enumerate(self.invoice_manager.invoice_lines):
-            with dpg.table_row(parent="invoice_table"):
-                dpg.add_text(line['description'])
-                dpg.add_text(f"{line['quantity']}")
-                dpg.add_text(f"{line['price']:.2f}")
-                dpg.add_text(f"{line['amount']:.2f}")
-                dpg.add_button(label="Delete", callback=lambda s, a, u: self.delete_line_callback(u), user_data=i)
-                
-    def delete_line_callback(self, index):
+        self.line_table.refresh()
+
+    def delete_line_callback(self, sender, app_data, line_id):
+        try:
+            index = self.invoice_manager.invoice_lines.index_of(line_id)
+        except ValueError:
+            return  # Already gone, e.g. a double click
         self.invoice_manager.remove_line(index)
-        self.update_table()
+        self.line_table.line_removed(line_id)
         
     def generate_invoice_callback(self):
         customer_name = dpg.get_value("customer_name")
@@ -367,8 +370,8 @@ class InvoiceGUI:
             dpg.show_item("error_popup")
             return
         
-        current_invoice_number = self.invoice_manager.invoice_number
-        safe_customer_name = self.sanitize_filename(customer_name)
+        # Reserved before rendering so a second generator can't print the same number
+        current_invoice_number = self.invoice_manager.allocate_invoice_number()
 
         # Create output directory if it doesn't exist
         os.makedirs("invoices", exist_ok=True)
@@ -376,22 +379,38 @@ class InvoiceGUI:
         # Update the invoice manager's description with the value from the GUI
         self.invoice_manager.description = gui_invoice_description
 
-        pdf_filename = f"{current_invoice_number}_{safe_customer_name}.pdf"
-        csv_filename = f"{current_invoice_number}_{safe_customer_name}.csv"
-        pdf_path = os.path.join("invoices", pdf_filename)
-        csv_path = os.path.join("invoices", csv_filename)
-
-        # Generate PDF
-        self.invoice_manager.generate_pdf(customer_name, invoice_name, pdf_path, current_invoice_number)
-        
-        # Save CSV
-        self.invoice_manager.save_to_csv(customer_name, csv_path, current_invoice_number)
+        # PDF, CSV and ledger entry are written in the background; poll_generation reports back
+        spec = self.invoice_manager.invoice_spec(customer_name, invoice_name, current_invoice_number)
+        self.service.submit(spec, profiler=self.invoice_manager.profiler)
+        self.show_generation_status()
         
-        # Increment invoice number and save config AFTER successful generation
-        self.invoice_manager.invoice_number += 1
+        # The description may have changed; the number was already stored by the allocator
         self.invoice_manager.save_config()
         # Clear form for next invoice
         self.clear_invoice_lines_and_inputs() # Keep customer, invoice name, and invoice description
+
+    def show_generation_status(self, message=""):
+        counts = self.service.counts()
+        pending = counts['queued'] + counts['running']
+        if pending:
+            message = f"{message}  Generating {pending} invoice(s)...".strip()
+        dpg.set_value("generation_status", message)
+
+    def poll_generation(self):
+        """Report the invoices the service finished since the last frame."""
+        finished = self.service.poll()
+        if not finished:
+            return
+        messages = []
+        for job in finished:
+            if job.error is not None:
+                print(f"Failed to generate invoice #{job.invoice_number}: {job.error!r}")
+                messages.append(f"Invoice #{job.invoice_number} failed: {job.error}")
+            else:
+                messages.append(f"Saved {job.pdf_path}")
+        self.service.forget_finished()
+        self.invoice_manager.profiler.report()
+        self.show_generation_status(messages[-1])
         
     def clear_all_callback(self):
         self.invoice_manager.clear_lines()
@@ -403,10 +422,26 @@ class InvoiceGUI:
         # Note: invoice_description field (overall invoice description) is not cleared here by default
         self.update_table()
         
+    def show_rejected(self, rejected):
+        if rejected:
+            dpg.set_value("import_popup_text", describe_rejected(rejected))
+            dpg.show_item("import_popup")
+
     def paste_lines_callback(self):
-        self.invoice_manager.add_lines_from_clipboard()
+        rejected = []
+        self.invoice_manager.add_lines_from_clipboard(rejected)
         self.update_table()
+        self.show_rejected(rejected)
         
+    def import_file_callback(self, sender, app_data):
+        rejected = []
+        try:
+            self.invoice_manager.add_lines_from_file(app_data['file_path_name'], rejected)
+        except Exception as e:
+            print(f"Failed to import {app_data['file_path_name']}: {e}")
+        self.update_table()
+        self.show_rejected(rejected)
+
     def generate_test_data_callback(self):
         customer_name = self.invoice_manager.generate_test_data()
         dpg.set_value("customer_name", customer_name)
@@ -419,26 +454,20 @@ class InvoiceGUI:
         dpg.set_value("invoice_name", "Test Invoice") # Optional: set test invoice name
         self.update_table() # Update table with test lines
 
-        current_invoice_number = self.invoice_manager.invoice_number
-        safe_customer_name = self.sanitize_filename(customer_name) # Will be "Test_Customer"
+        # Reserved before rendering so a second generator can't print the same number
+        current_invoice_number = self.invoice_manager.allocate_invoice_number()
         invoice_name_for_pdf = dpg.get_value("invoice_name") or "Test Invoice"
         
         # Create output directory if it doesn't exist
         os.makedirs("invoices", exist_ok=True)
         
-        pdf_filename = f"{current_invoice_number}_{safe_customer_name}_TEST.pdf" # Added _TEST to distinguish
-        csv_filename = f"{current_invoice_number}_{safe_customer_name}_TEST.csv" # Added _TEST
-        pdf_path = os.path.join("invoices", pdf_filename)
-        csv_path = os.path.join("invoices", csv_filename)
-
-        # Generate PDF with test data
-        self.invoice_manager.generate_pdf(customer_name, invoice_name_for_pdf, pdf_path, current_invoice_number)
-        
-        # Save CSV
-        self.invoice_manager.save_to_csv(customer_name, csv_path, current_invoice_number)
+        # _TEST in the file names to distinguish; test invoices stay out of the ledger
+        spec = self.invoice_manager.invoice_spec(customer_name, invoice_name_for_pdf, current_invoice_number,
+                                                 suffix="_TEST")
+        self.service.submit(spec, record=False, profiler=self.invoice_manager.profiler)
+        self.show_generation_status()
         
-        # Increment invoice number and save config AFTER successful generation
-        self.invoice_manager.invoice_number += 1
+        # The description may have changed; the number was already stored by the allocator
         self.invoice_manager.save_config()
 
         # Clear form for next invoice
@@ -1,16 +1,21 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+import importlib.util
 import os
-import json
-import re
-from fpdf import FPDF
-import base64
-from io import BytesIO
+import urllib.request
+import uuid
+from datetime import date, timedelta
+import invoicing
+
+# Streamlit runs this page as the process's __main__, and a spawned render
+# worker runs __main__ again before it starts: the whole page, in bare mode,
+# for every worker. Name the module the workers come from as the main module
+# instead, so they only import invoicing.
+if __name__ == '__main__':
+    __spec__ = importlib.util.find_spec('invoicing.service')
 
 # Initialize session state
 if 'invoice_lines' not in st.session_state:
-    st.session_state.invoice_lines = []
+    st.session_state.invoice_lines = invoicing.LineStore()
 if 'invoice_number' not in st.session_state:
     st.session_state.invoice_number = 1
 if 'payment_terms_days' not in st.session_state:
@@ -18,155 +23,77 @@ if 'payment_terms_days' not in st.session_state:
 if 'language' not in st.session_state:
     st.session_state.language = 'nl'
 if 'description' not in st.session_state:
-    st.session_state.description = "Invoice for ice skating activities at DSSV ELS."
+    st.session_state.description = invoicing.DEFAULT_DESCRIPTION
+if 'vat_rate' not in st.session_state:
+    st.session_state.vat_rate = 0
 if 'show_download' not in st.session_state:
     st.session_state.show_download = False
-if 'current_pdf' not in st.session_state:
-    st.session_state.current_pdf = None
+if 'current_pdf_path' not in st.session_state:
+    # Only the path: the PDF stays on disk and is read when downloaded
+    st.session_state.current_pdf_path = None
 if 'current_filename' not in st.session_state:
     st.session_state.current_filename = None
-
-# Translations
-translations = {
-    'nl': {
-        'invoice': 'FACTUUR',
-        'invoice_number': 'Factuurnummer',
-        'date': 'Datum',
-        'customer': 'Ontvanger',
-        'due_date': 'Vervaldatum',
-        'description': 'Omschrijving',
-        'quantity': 'Aantal',
-        'price': 'Prijs',
-        'amount': 'Bedrag',
-        'total': 'Totaal',
-        'payment_instructions': 'Gelieve binnen de termijn over te maken op NL51 ABNA 0552 4048 45 t.n.v DSSV ELS en onder vermelding van het factuurnummer'
-    },
-    'en': {
-        'invoice': 'INVOICE',
-        'invoice_number': 'Invoice #',
-        'date': 'Date',
-        'customer': 'Recipient',
-        'due_date': 'Due Date',
-        'description': 'Description',
-        'quantity': 'Quantity',
-        'price': 'Price',
-        'amount': 'Amount',
-        'total': 'Total',
-        'payment_instructions': 'Please transfer the amount within the payment term to NL51 ABNA 0552 4048 45 in name of DSSV ELS, stating the invoice number'
-    }
-}
-
-def generate_pdf(customer_name, invoice_name):
-    pdf = FPDF()
-    pdf.add_page('P', 'A4')
-
-    trans = translations[st.session_state.language]
-    invoice_date = datetime.now()
-    payment_due_date = invoice_date + pd.Timedelta(days=st.session_state.payment_terms_days)
-
-    # Add colored bar at the top
-    pdf.set_fill_color(172, 202, 38)  # #acca26
-    pdf.rect(0, 0, 210, 10, 'F')
-
-    # Header title (FACTUUR/INVOICE)
-    pdf.set_y(35)  # Moved lower to avoid collision
-    pdf.set_font('Helvetica', 'B', 16)
-    pdf.cell(190, 10, invoice_name or trans['invoice'], 0, 1, 'C')
-
-    # Company info in light grey at top right
-    pdf.set_text_color(169, 169, 169)
-    pdf.set_font('Helvetica', '', 8)
-    header_info = {
-        "Web": "www.effelekkerschaatsen.com",
-        "Address": "Mekelweg 8 2628CD Delft",
-        "Mail": "penningmeester@dssvels.com",
-        "IBAN": "NL51 ABNA 0552 4048 45",
-        "KVK nr": "27183125"
-    }
-
-    # Position header info on the right side
-    right_column_x = 120
-    pdf.set_xy(right_column_x, 45)  # Adjusted Y position
-    for key, value in header_info.items():
-        pdf.set_x(right_column_x)
-        pdf.cell(30, 6, f"{key}:", 0, 0, 'R')
-        pdf.cell(0, 6, value, 0, 1, 'L')
-
-    # Customer and invoice details on the left
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Helvetica', '', 12)
-    pdf.set_xy(10, 45)  # Adjusted Y position
-    
-    # Invoice details block
-    pdf.cell(95, 8, f"{trans['invoice_number']}: {st.session_state.invoice_number}", 0, 2)
-    pdf.cell(95, 8, f"{trans['date']}: {invoice_date.strftime('%Y-%m-%d')}", 0, 2)
-    pdf.cell(95, 8, f"{trans['customer']}: {customer_name}", 0, 2)
-    pdf.cell(95, 8, f"{trans['due_date']}: {payment_due_date.strftime('%Y-%m-%d')}", 0, 1)
-    
-    pdf.ln(10)
-
-    # Table header
-    pdf.set_font('Helvetica', 'B', 12)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(80, 10, trans['description'], 0, 0, 'L', 1)
-    pdf.cell(30, 10, trans['quantity'], 0, 0, 'L', 1)
-    pdf.cell(40, 10, trans['price'], 0, 0, 'L', 1)
-    pdf.cell(40, 10, trans['amount'], 0, 1, 'L', 1)
-
-    # Table content
-    pdf.set_font('Helvetica', '', 12)
-    total = 0
-    for i, line in enumerate(st.session_state.invoice_lines):
-        fill = i % 2 == 1
-        pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
-        
-        pdf.cell(80, 10, str(line['description']), 0, 0, 'L', fill)
-        pdf.cell(30, 10, str(line['quantity']), 0, 0, 'L', fill)
-        pdf.cell(40, 10, f"EUR {line['price']:.2f}", 0, 0, 'L', fill)
-        pdf.cell(40, 10, f"EUR {line['amount']:.2f}", 0, 1, 'L', fill)
-        total += line['amount']
-
-    # Total line
-    pdf.ln(2)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(2)
-    pdf.set_font('Helvetica', 'B', 12)
-    pdf.cell(150, 10, f"{trans['total']}:", 0, 0)
-    pdf.cell(40, 10, f"EUR {total:.2f}", 0, 1, 'R')
-
-    # Description block
-    pdf.ln(5)
-    pdf.set_font('Helvetica', '', 10)
-    pdf.set_text_color(169, 169, 169)
-    pdf.multi_cell(190, 6, st.session_state.description, 0, 'L')
-
-    # Payment instructions
-    pdf.ln(5)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Helvetica', '', 11)
-    pdf.multi_cell(190, 6, trans['payment_instructions'], 0, 'L')
-
-    # Add logo
-    try:
-        pdf.image('elslogo.png', x=90, y=250, w=30)
-    except Exception:
-        pass
-
-    # Save to BytesIO
-    pdf_bytes = BytesIO()
-    pdf.output(pdf_bytes)
-    pdf_bytes.seek(0)
-    
-    return pdf_bytes
+if 'generation_job' not in st.session_state:
+    st.session_state.generation_job = None
+if 'profiler' not in st.session_state:
+    # INVOICE_PROFILE switches profiling on by default; the sidebar toggles it per session
+    st.session_state.profiler = invoicing.Profiler.from_env()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'reproducible_date' not in st.session_state:
+    # A date switches on reproducible PDFs: printed with this date and stamped with it
+    st.session_state.reproducible_date = None
+if 'export_name' not in st.session_state:
+    # The billing run last exported for download, and where the API serves it
+    st.session_state.export_name = None
+    st.session_state.export_url = None
+if 'import_rejected' not in st.session_state:
+    # Rows the last import or paste left out, shown until the next one
+    st.session_state.import_rejected = []
+
+@st.cache_resource
+def artefact_store():
+    # Test PDFs of all sessions, on disk; a session only keeps their paths
+    return invoicing.ArtefactStore()
+
+# Keep this session's files and drop those of sessions gone for an hour
+artefact_store().touch(st.session_state.session_id)
+artefact_store().sweep()
+
+def file_reader(path):
+    # Deferred download data: the file is only read when the button is
+    # clicked, and closed again; Streamlit never closes a file it is handed
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+def invoice_dates():
+    # (invoice_date, due_date, creation_date) for render_pdf; all None unless reproducible
+    if st.session_state.reproducible_date is None:
+        return None, None, None
+    return invoicing.reproducible_dates(st.session_state.reproducible_date, st.session_state.payment_terms_days)
+
+def generate_pdf(customer_name, invoice_name, invoice_date=None, due_date=None, creation_date=None):
+    # Written once into this session's artefact directory; returns the path
+    if invoice_date is None and due_date is None and creation_date is None:
+        invoice_date, due_date, creation_date = invoice_dates()
+    path = artefact_store().path(st.session_state.session_id, "test_invoice.pdf")
+    invoicing.render_pdf(path, st.session_state.invoice_lines, customer_name,
+                         st.session_state.invoice_number, invoice_name,
+                         st.session_state.language, st.session_state.payment_terms_days,
+                         st.session_state.description, invoice_date, st.session_state.vat_rate,
+                         due_date, creation_date)
+    return path
 
 def add_invoice_line(description, quantity, price):
-    amount = float(quantity) * float(price)
-    st.session_state.invoice_lines.append({
-        'description': description,
-        'quantity': quantity,
-        'price': price,
-        'amount': amount
-    })
+    st.session_state.invoice_lines.append(description, quantity, price)
+
+# Rows shown per page of the line table
+LINE_PAGE_SIZE = 100
+
+def line_page_count():
+    return max(1, -(-len(st.session_state.invoice_lines) // LINE_PAGE_SIZE))
 
 def clear_invoice_lines():
     st.session_state.invoice_lines.clear()
@@ -183,29 +110,93 @@ def generate_test_data():
         add_invoice_line(desc, qty, price)
     return "Test Customer"
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def read_config(mtime_ns, size):
+    # The file's mtime and size are the cache key: every rerun reuses the
+    # parsed config until some process rewrites the file. Only the latest
+    # versions are worth keeping.
+    return invoicing.load_config()
+
 def load_config():
     try:
-        with open('invoice_config.json', 'r') as f:
-            config = json.load(f)
-            st.session_state.invoice_number = config.get('last_invoice_number', 1)
-            st.session_state.payment_terms_days = config.get('payment_terms_days', 14)
-            st.session_state.language = config.get('language', 'nl')
-            st.session_state.description = config.get('description', st.session_state.description)
+        stat = os.stat(invoicing.CONFIG_PATH)
+        config = read_config(stat.st_mtime_ns, stat.st_size)
     except FileNotFoundError:
-        save_config()
+        config = invoicing.load_config()
+    st.session_state.invoice_number = config['last_invoice_number']
+    st.session_state.payment_terms_days = config['payment_terms_days']
+    st.session_state.language = config['language']
+    st.session_state.description = config['description']
+    st.session_state.vat_rate = config['vat_rate']
 
 def save_config():
-    with open('invoice_config.json', 'w') as f:
-        json.dump({
-            'last_invoice_number': st.session_state.invoice_number,
-            'payment_terms_days': st.session_state.payment_terms_days,
-            'language': st.session_state.language,
-            'description': st.session_state.description
-        }, f)
+    invoicing.save_config({
+        'last_invoice_number': st.session_state.invoice_number,
+        'payment_terms_days': st.session_state.payment_terms_days,
+        'language': st.session_state.language,
+        'description': st.session_state.description,
+        'vat_rate': st.session_state.vat_rate
+    })
 
 # Load config at startup
 load_config()
 
+@st.cache_data(show_spinner=False, max_entries=2)
+def read_history(ledger_state):
+    # Keyed like read_config: the frames are reused until an invoice is recorded
+    return invoicing.load_history()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def count_invoices(first, last, ledger_state):
+    # Shown on every rerun; the ledger is only opened again once it changed
+    with invoicing.Ledger() as ledger:
+        return len(ledger.invoices_numbered(first, last))
+
+def ledger_state():
+    state = []
+    # Recent writes are in the WAL file until SQLite checkpoints them
+    for path in (invoicing.LEDGER_PATH, invoicing.LEDGER_PATH + "-wal"):
+        try:
+            stat = os.stat(path)
+            state.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            state.append(None)
+    return tuple(state)
+
+def reports_page():
+    st.title("Reports")
+    history = read_history(ledger_state())
+    if history.invoices.empty:
+        st.info("The ledger has no invoices yet.")
+        return
+    first = history.invoices['invoice_date'].min().date()
+    last = history.invoices['invoice_date'].max().date()
+    period = st.date_input("Invoice dates", value=(first, last), min_value=first, max_value=last)
+    if len(period) != 2:
+        return
+    history = invoicing.filter_history(history, period[0], period[1] + timedelta(days=1))
+    money = st.column_config.NumberColumn(format="€%.2f")
+
+    months_tab, outstanding_tab, items_tab = st.tabs(["Revenue per month", "Outstanding", "Per description"])
+    with months_tab:
+        revenue = invoicing.revenue_by_month(history.invoices)
+        st.bar_chart(revenue, x="month", y="revenue")
+        st.dataframe(revenue, hide_index=True, column_config={"revenue": money})
+    with outstanding_tab:
+        summary, overdue = invoicing.outstanding(history.invoices,
+                                                 payment_terms_days=st.session_state.payment_terms_days)
+        st.metric("Past due", f"€{summary['amount'].sum():,.2f}", f"{len(overdue)} invoice(s)", delta_color="off")
+        st.dataframe(summary, hide_index=True, column_config={"amount": money})
+        st.dataframe(overdue, hide_index=True, column_config={"amount": money})
+    with items_tab:
+        st.dataframe(invoicing.totals_by_description(history.lines), hide_index=True,
+                     column_config={"amount": money})
+
+# The invoice form, or the treasurer's reports over the ledger
+if st.sidebar.radio("Page", ["Invoice", "Reports"], horizontal=True) == "Reports":
+    reports_page()
+    st.stop()
+
 # Streamlit UI
 st.title("Invoice Generator")
 
@@ -225,6 +216,29 @@ with st.sidebar:
         value=st.session_state.payment_terms_days
     )
 
+    st.session_state.vat_rate = st.number_input(
+        "VAT included in prices (%)",
+        min_value=0.0,
+        value=float(st.session_state.vat_rate),
+        help="0 prints no VAT breakdown"
+    )
+
+    reproducible = st.checkbox(
+        "Reproducible PDFs",
+        value=st.session_state.reproducible_date is not None,
+        help="Date invoices with a fixed date instead of today, so the same invoice always gives the same file"
+    )
+    st.session_state.reproducible_date = st.date_input(
+        "Invoice date",
+        value=st.session_state.reproducible_date or date.today()
+    ) if reproducible else None
+
+    st.session_state.profiler.enabled = st.checkbox(
+        "Profile invoice generation",
+        value=st.session_state.profiler.enabled,
+        help="Time every stage of each generated invoice"
+    )
+
 # Main content
 st.subheader("Recipient Information")
 customer_name = st.text_input("Recipient Name")
@@ -245,56 +259,80 @@ with col4:
     if st.button("Add Line"):
         if description and quantity and price:
             add_invoice_line(description, quantity, price)
+            # Turn to the page with the new line, as the desktop table does
+            st.session_state.line_page = line_page_count()
 
-# Display invoice lines
+# Display invoice lines, one page at a time like the desktop table, so a
+# rerun sends the same few rows to the browser however long the invoice is
 if st.session_state.invoice_lines:
     st.subheader("Invoice Lines")
-    df = pd.DataFrame(st.session_state.invoice_lines)
-    edited_df = st.data_editor(
-        df,
+    line_count = len(st.session_state.invoice_lines)
+    page = 1
+    if line_count > LINE_PAGE_SIZE:
+        # Lines may have been removed since the page was picked
+        st.session_state.line_page = min(st.session_state.get('line_page', 1), line_page_count())
+        page = st.number_input("Page", min_value=1, max_value=line_page_count(), step=1, key="line_page")
+    first = (page - 1) * LINE_PAGE_SIZE
+    st.dataframe(
+        st.session_state.invoice_lines.columns(first, first + LINE_PAGE_SIZE),
         column_config={
             "price": st.column_config.NumberColumn("Price", format="€%.2f"),
             "amount": st.column_config.NumberColumn("Amount", format="€%.2f")
         },
-        hide_index=True,
-        disabled=True
+        hide_index=True
     )
+    st.caption(f"Lines {first + 1}-{min(line_count, first + LINE_PAGE_SIZE)} of {line_count}, "
+               f"total €{st.session_state.invoice_lines.total:.2f}")
+
+@st.cache_resource
+def generation_service():
+    # One background renderer shared by all sessions of this server
+    return invoicing.GenerationService(workers=2)
 
 def handle_invoice_generation():
     if not st.session_state.invoice_lines:
         st.error("Please add at least one invoice line.")
         return False
         
-    safe_customer_name = re.sub(r'[^\w\-_.]', '_', customer_name)
-    pdf_bytes = generate_pdf(customer_name, invoice_name)
-    
-    # Save to file
+    # Reserve the number in the shared config first, so concurrent sessions
+    # and the desktop app never print the same number
+    st.session_state.invoice_number = invoicing.allocate_invoice_numbers()
+
+    # PDF, CSV and ledger entry are written in the background, so this
+    # rerun returns right away; the progress fragment below picks it up
     os.makedirs("invoices", exist_ok=True)
-    pdf_filename = f"{st.session_state.invoice_number}_{safe_customer_name}.pdf"
-    pdf_path = os.path.join("invoices", pdf_filename)
+    invoice_date, due_date, creation_date = invoice_dates()
+    spec = invoicing.invoice_spec(st.session_state.invoice_number, customer_name, st.session_state.invoice_lines,
+                                  invoice_name, st.session_state.language, st.session_state.payment_terms_days,
+                                  st.session_state.description, st.session_state.vat_rate,
+                                  invoice_date=invoice_date, due_date=due_date, creation_date=creation_date)
+    st.session_state.generation_job = generation_service().submit(spec, profiler=st.session_state.profiler)
     
-    with open(pdf_path, "wb") as f:
-        f.write(pdf_bytes.getvalue())
-    
-    # Store in session state
-    st.session_state.current_pdf = pdf_bytes
-    st.session_state.current_filename = pdf_filename
-    st.session_state.show_download = True
-    
-    # Save CSV
-    csv_filename = f"{st.session_state.invoice_number}_{safe_customer_name}.csv"
-    csv_path = os.path.join("invoices", csv_filename)
-    df = pd.DataFrame(st.session_state.invoice_lines)
-    df['invoice_number'] = st.session_state.invoice_number
-    df['customer_name'] = customer_name
-    df['date'] = datetime.now().strftime("%Y-%m-%d")
-    df.to_csv(csv_path, index=False)
-    
-    # Update invoice number and save config
+    # Show the next number and store the other settings; the allocator
+    # already advanced the counter on disk
     st.session_state.invoice_number += 1
     save_config()
     return True
 
+def collect_generated_invoice():
+    job = st.session_state.generation_job
+    st.session_state.generation_job = None
+    if job.error is not None:
+        st.error(f"Generating invoice #{job.invoice_number} failed: {job.error}")
+        return
+    # The service already wrote the PDF to invoices/; the download reads it from there
+    st.session_state.current_pdf_path = job.pdf_path
+    st.session_state.current_filename = os.path.basename(job.pdf_path)
+    st.session_state.show_download = True
+
+@st.fragment(run_every=0.5)
+def generation_progress():
+    job = st.session_state.generation_job
+    if job is None or job.done:
+        # Rerun the whole page to show the download section
+        st.rerun()
+    st.info(f"Generating invoice #{job.invoice_number}...")
+
 # Action buttons
 col1, col2, col3, col4 = st.columns(4)
 with col1:
@@ -304,39 +342,56 @@ with col1:
         else:
             handle_invoice_generation()
 
+# Pick up the invoice being generated in the background
+if st.session_state.generation_job is not None:
+    if st.session_state.generation_job.done:
+        collect_generated_invoice()
+    else:
+        generation_progress()
+
 # Show download section if PDF is generated
-if st.session_state.show_download and st.session_state.current_pdf is not None:
+if st.session_state.show_download and st.session_state.current_pdf_path is not None:
     st.success(f"Invoice saved as {st.session_state.current_filename}")
-    b64_pdf = base64.b64encode(st.session_state.current_pdf.getvalue()).decode()
-    st.markdown(f'<a href="data:application/pdf;base64,{b64_pdf}" download="{st.session_state.current_filename}">Download PDF</a>', unsafe_allow_html=True)
-    st.markdown("""
-    <style>
-    .download-button {
-        display: inline-block;
-        padding: 0.5em 1em;
-        color: white;
-        background-color: #0066cc;
-        text-decoration: none;
-        border-radius: 4px;
-        margin: 1em 0;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.download_button(
+        "Download PDF",
+        data=file_reader(st.session_state.current_pdf_path),
+        file_name=st.session_state.current_filename,
+        mime="application/pdf",
+        on_click="ignore"
+    )
     
     if st.button("Continue to next invoice"):
         st.session_state.show_download = False
-        st.session_state.current_pdf = None
+        st.session_state.current_pdf_path = None
         st.session_state.current_filename = None
         clear_invoice_lines()
         st.rerun()
 
+# Stage timings of the invoices profiled in this session
+if st.session_state.profiler.enabled and st.session_state.profiler.records:
+    with st.expander("Profile"):
+        st.code(st.session_state.profiler.summary())
+        st.download_button(
+            "Download profile (JSON)",
+            data=st.session_state.profiler.to_json(),
+            file_name="invoice_profile.json",
+            mime="application/json"
+        )
+        if st.button("Reset profile"):
+            st.session_state.profiler.clear()
+            st.rerun()
+
 with col2:
     if st.button("Generate Test PDF"):
         customer_name = generate_test_data()
-        pdf_bytes = generate_pdf(customer_name, "")
-        b64_pdf = base64.b64encode(pdf_bytes.getvalue()).decode()
-        href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="test_invoice.pdf">Download Test PDF</a>'
-        st.markdown(href, unsafe_allow_html=True)
+        pdf_path = generate_pdf(customer_name, "")
+        st.download_button(
+            "Download Test PDF",
+            data=file_reader(pdf_path),
+            file_name="test_invoice.pdf",
+            mime="application/pdf",
+            on_click="ignore"
+        )
 
 with col3:
     if st.button("Clear All"):
@@ -352,12 +407,90 @@ with col4:
 st.subheader("Import from Clipboard")
 if st.button("Paste from Clipboard"):
     try:
+        import pandas as pd
         df = pd.read_clipboard()
-        for _, row in df.iterrows():
-            desc = row.get('Description') or row.get('Omschrijving') or str(row.iloc[0])
-            qty = row.get('Quantity') or row.get('Aantal') or row.get('Qty') or row.iloc[1]
-            price = row.get('Price') or row.get('Prijs') or row.iloc[2]
-            add_invoice_line(desc, float(qty), float(price))
+        st.session_state.import_rejected = []
+        invoicing.extend_store(st.session_state.invoice_lines, df,
+                               invoicing.resolve_columns(df.columns, positional=True),
+                               st.session_state.import_rejected)
+        st.rerun()
+    except Exception as e:
+        st.error(f"Failed to read clipboard: {e}")
+
+# File import, read in chunks so large season exports stay cheap
+st.subheader("Import from File")
+uploaded_file = st.file_uploader("CSV, TSV or Excel file with description, quantity and price columns",
+                                 type=["csv", "tsv", "xlsx", "xls"])
+if uploaded_file is not None and st.button("Import Lines"):
+    try:
+        st.session_state.import_rejected = []
+        invoicing.import_lines(st.session_state.invoice_lines, uploaded_file, name=uploaded_file.name,
+                               rejected=st.session_state.import_rejected)
         st.rerun()
     except Exception as e:
-        st.error(f"Failed to read clipboard: {e}")
\ No newline at end of file
+        st.error(f"Failed to import {uploaded_file.name}: {e}")
+if st.session_state.import_rejected:
+    st.warning(f"{len(st.session_state.import_rejected)} row(s) were not imported because their "
+               f"quantity or price is not a number")
+    st.dataframe([row._asdict() for row in st.session_state.import_rejected], hide_index=True)
+    if st.button("Dismiss"):
+        st.session_state.import_rejected = []
+        st.rerun()
+# Whole billing runs from the ledger as one download
+st.subheader("Export Billing Run")
+export_col1, export_col2, export_col3 = st.columns(3)
+with export_col1:
+    export_first = st.number_input("First invoice number", min_value=1, value=1, step=1)
+with export_col2:
+    export_last = st.number_input("Last invoice number", min_value=1,
+                                  value=max(1, st.session_state.invoice_number - 1), step=1)
+with export_col3:
+    export_format = st.radio("Format", ["ZIP (PDFs and CSVs)", "One printable PDF"])
+
+# Exports are written into this session's artefact directory and
+# downloaded from the invoice API, which streams them from disk in chunks,
+# so a run of thousands of invoices never passes through Streamlit's memory
+API_URL = os.environ.get('INVOICE_API_URL', 'http://127.0.0.1:8765')
+
+def build_export(first, last, merged, name):
+    # Written next to the final name and moved into place once complete,
+    # so the API never serves half an export
+    path = artefact_store().path(st.session_state.session_id, name)
+    with invoicing.Ledger() as ledger:
+        invoices = ledger.invoices_numbered(first, last)
+        with open(path + ".part", "wb") as f:
+            if merged:
+                invoicing.export_merged_pdf(f, ledger, invoices)
+            else:
+                invoicing.export_zip(f, invoices)
+    os.replace(path + ".part", path)
+    return f"{API_URL}/artefacts/{st.session_state.session_id}/{os.path.basename(path)}"
+
+def api_available():
+    try:
+        with urllib.request.urlopen(f"{API_URL}/health", timeout=2):
+            return True
+    except OSError:
+        return False
+
+export_count = count_invoices(export_first, export_last, ledger_state())
+merged_export = export_format == "One printable PDF"
+export_name = f"invoices_{export_first}-{export_last}.{'pdf' if merged_export else 'zip'}"
+st.caption(f"{export_count} invoice(s) in the ledger for #{export_first}-#{export_last}")
+if st.button("Prepare billing run", disabled=export_count == 0):
+    if not api_available():
+        st.error(f"The invoice API is not reachable at {API_URL}; start it with `python -m invoicing.api` "
+                 f"(INVOICE_API_URL sets the address)")
+    else:
+        if st.session_state.export_name not in (None, export_name):
+            # One export per session on disk; the earlier one is not offered any more
+            try:
+                os.remove(artefact_store().path(st.session_state.session_id, st.session_state.export_name))
+            except FileNotFoundError:
+                pass
+        with st.spinner(f"Exporting {export_count} invoice(s)..."):
+            st.session_state.export_url = build_export(export_first, export_last, merged_export, export_name)
+        st.session_state.export_name = export_name
+# Only offered while the range and format it was built for are selected
+if st.session_state.export_name == export_name:
+    st.link_button(f"Download {export_name}", st.session_state.export_url)